@@ -51,6 +51,48 @@ app.config['RETENTION_DAYS'] = int(os.environ.get('RETENTION_DAYS', 30))
 app.config['OMROEP_LVC_URL'] = os.environ.get('OMROEP_LVC_URL', 'https://gemist.omroeplvc.nl/')
 # FFmpeg pad
 app.config['FFMPEG_PATH'] = os.environ.get('FFMPEG_PATH', 'ffmpeg')
+# Scheduler instellingen: auto (lock file), true (dit proces) of false (alleen HTTP)
+app.config['RUN_SCHEDULER'] = os.environ.get('RUN_SCHEDULER', 'auto')
+app.config['SCHEDULER_LOCK_PATH'] = os.environ.get('SCHEDULER_LOCK_PATH', os.path.join(app.config['RECORDINGS_DIR'], '.scheduler.lock'))
+app.config['RECORDER_STATUS_PATH'] = os.environ.get('RECORDER_STATUS_PATH', os.path.join(app.config['RECORDINGS_DIR'], '.recorders.json'))
+app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR', os.path.join(app.config['RECORDINGS_DIR'], '.metrics'))
+# Token voor /metrics (Authorization: Bearer ...); zonder token alleen rechtstreeks vanaf deze machine
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN', '')
+app.config['SYSTEM_STATS_PATH'] = os.environ.get('SYSTEM_STATS_PATH', os.path.join(app.config['RECORDINGS_DIR'], '.system_stats.json'))
+app.config['SYSTEM_STATS_INTERVAL'] = int(os.environ.get('SYSTEM_STATS_INTERVAL', 5))
+app.config['RECORDER_PROGRESS_PATH'] = os.environ.get('RECORDER_PROGRESS_PATH', os.path.join(app.config['RECORDINGS_DIR'], '.recorder_progress.json'))
+# Aantal gelijktijdige HTTP verbindingen van de gedeelde S3 client
+app.config['S3_MAX_POOL_CONNECTIONS'] = int(os.environ.get('S3_MAX_POOL_CONNECTIONS', 50))
+# Upload instellingen
+app.config['UPLOAD_CONCURRENCY'] = int(os.environ.get('UPLOAD_CONCURRENCY', 4))
+app.config['UPLOAD_PART_CONCURRENCY'] = int(os.environ.get('UPLOAD_PART_CONCURRENCY', 4))
+app.config['UPLOAD_CHUNK_SIZE_MB'] = int(os.environ.get('UPLOAD_CHUNK_SIZE_MB', 16))
+app.config['UPLOAD_JOURNAL_PATH'] = os.environ.get('UPLOAD_JOURNAL_PATH', os.path.join(app.config['RECORDINGS_DIR'], '.upload_journal.db'))
+# Opnames vooraf starten: seconden vóór het hele uur en aantal ffmpeg processen per golf
+app.config['RECORDING_START_LEAD_SECONDS'] = int(os.environ.get('RECORDING_START_LEAD_SECONDS', 30))
+if not 0 <= app.config['RECORDING_START_LEAD_SECONDS'] <= 300:
+    # De cron minuut in start_scheduler gaat uit van maximaal 5 minuten aanloop
+    logger.warning(f"RECORDING_START_LEAD_SECONDS={app.config['RECORDING_START_LEAD_SECONDS']} valt buiten 0-300, begrensd")
+    app.config['RECORDING_START_LEAD_SECONDS'] = min(max(app.config['RECORDING_START_LEAD_SECONDS'], 0), 300)
+app.config['RECORDING_START_CONCURRENCY'] = int(os.environ.get('RECORDING_START_CONCURRENCY', 4))
+# Watchdog: seconden zonder groei voordat een opname als vastgelopen geldt, maximale backoff en alarmgrens
+app.config['WATCHDOG_INTERVAL'] = int(os.environ.get('WATCHDOG_INTERVAL', 10))
+app.config['WATCHDOG_STALL_SECONDS'] = int(os.environ.get('WATCHDOG_STALL_SECONDS', 60))
+app.config['WATCHDOG_BACKOFF_MAX'] = int(os.environ.get('WATCHDOG_BACKOFF_MAX', 300))
+app.config['GAP_ALERT_MINUTES'] = float(os.environ.get('GAP_ALERT_MINUTES', 5))
+# Stiltedetectie: drempel, minimale duur van een stilte, alarmgrens en of helemaal stille uren geüpload worden
+app.config['SILENCE_THRESHOLD_DB'] = float(os.environ.get('SILENCE_THRESHOLD_DB', -50))
+app.config['SILENCE_MIN_SECONDS'] = float(os.environ.get('SILENCE_MIN_SECONDS', 10))
+app.config['SILENCE_ALERT_RATIO'] = float(os.environ.get('SILENCE_ALERT_RATIO', 0.1))
+app.config['SKIP_SILENT_UPLOADS'] = os.environ.get('SKIP_SILENT_UPLOADS', 'false').lower() in ('1', 'true', 'yes')
+# Schijfruimte: meetinterval, vaste reserve en hoe lang opnames lokaal blijven staan vóór upload
+app.config['DISK_SAMPLE_TTL'] = int(os.environ.get('DISK_SAMPLE_TTL', 30))
+app.config['DISK_RESERVE_MB'] = int(os.environ.get('DISK_RESERVE_MB', 512))
+app.config['DISK_PROJECTION_HOURS'] = float(os.environ.get('DISK_PROJECTION_HOURS', 2))
+# Audio proxy: maximale grootte van één antwoord op een open Range (bytes=N-)
+app.config['AUDIO_PROXY_MAX_RANGE_MB'] = int(os.environ.get('AUDIO_PROXY_MAX_RANGE_MB', 8))
+# Health checks: seconden tussen twee achtergrondcontroles voor /health
+app.config['HEALTH_CHECK_INTERVAL'] = int(os.environ.get('HEALTH_CHECK_INTERVAL', 30))
 
 # Zorg dat de benodigde mappen bestaan
 os.makedirs(app.config['RECORDINGS_DIR'], exist_ok=True)
@@ -89,6 +131,10 @@ app.register_blueprint(player_bp)
 app.register_blueprint(station_bp)
 app.register_blueprint(api_bp)
 
+# Metrics per proces (request latency per blueprint, database, /metrics)
+import metrics
+metrics.init_app(app)
+
 # Import views
 import models
 from logger import start_scheduler
@@ -97,9 +143,9 @@ from logger import start_scheduler
 with app.app_context():
     db.create_all()
 
-# Start the background scheduler
-start_scheduler(scheduler)
-scheduler.start()
+# Start the background scheduler (slechts in één proces, zie scheduler_lock.py)
+from scheduler_lock import start_background_scheduler
+start_background_scheduler(app, scheduler, start_scheduler)
 
 # Import routes after everything else to avoid circular imports
 from routes import *
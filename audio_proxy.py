@@ -0,0 +1,225 @@
+"""
+Range-bewuste proxy voor het afspelen en downloaden van opnames.
+
+De Range header van de browser wordt doorgegeven aan S3 (of de Dennis
+server) en het antwoord gaat als 206 met de juiste Content-Range terug.
+Open ranges ("bytes=N-", wat een audio element altijd vraagt) worden
+afgekapt op AUDIO_PROXY_MAX_RANGE_MB, zodat één antwoord een worker maar
+enkele seconden bezet houdt; de browser vraagt daarna zelf het volgende
+stuk op. De body wordt in grote blokken doorgegeven zonder te bufferen.
+Volledige downloads van S3 gaan via een redirect naar een presigned URL
+met Content-Disposition, zodat daar helemaal geen worker aan vast zit.
+
+Opnames met een frame index worden afgespeeld als een virtueel bestand:
+een Xing frame met seek tabel gevolgd door de audio frames. De browser
+rekent een tijd dan via de tabel om naar een byte offset en kan met één
+range request exact zoeken, ook bij VBR.
+"""
+
+import re
+import logging
+import itertools
+import requests
+from flask import Response, stream_with_context
+from botocore.exceptions import ClientError
+from app import app
+from storage import initialize_s3_client
+from mp3_frames import trim_frames
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 256 * 1024
+PASS_HEADERS = ('Content-Length', 'Content-Range', 'ETag', 'Last-Modified')
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header):
+    """Parse a single 'bytes=start-end' range into (start, end); None when absent or unsupported"""
+    match = _RANGE_RE.match((header or '').strip())
+    if not match or match.groups() == ('', ''):
+        # Ontbrekend, meerdere ranges of ongeldig: negeren en het hele bestand leveren (RFC 7233)
+        return None
+    start, end = match.groups()
+    if start == '':
+        # Suffix range: de laatste N bytes
+        return (None, int(end))
+    return (int(start), int(end) if end else None)
+
+
+def cap_range(byte_range, max_bytes):
+    """Limit an open-ended range to max_bytes so one response never takes long"""
+    if byte_range is None:
+        # Zonder Range verwacht de client het hele bestand met 200
+        return None
+    start, end = byte_range
+    if start is not None and end is None:
+        return (start, start + max_bytes - 1)
+    return byte_range
+
+
+def range_header(byte_range):
+    start, end = byte_range
+    if start is None:
+        return f"bytes=-{end}"
+    return f"bytes={start}-{'' if end is None else end}"
+
+
+def _response(chunks, status, headers, filename=None, close=None, ranges=True):
+    headers = {name: value for name, value in headers.items() if value is not None}
+    headers['Accept-Ranges'] = 'bytes' if ranges else 'none'
+    if filename:
+        headers['Content-Disposition'] = f"attachment; filename=\"{filename}\""
+
+    def generate():
+        try:
+            for chunk in chunks:
+                yield chunk
+        finally:
+            if close:
+                close()
+
+    return Response(stream_with_context(generate()), status=status, mimetype='audio/mpeg',
+                    headers=headers, direct_passthrough=True)
+
+
+class IndexOutdated(Exception):
+    """The recording changed after its frame index was built"""
+
+
+def _get_s3_object(s3_key, byte_range, etag=None):
+    """(get_object response, None) or (None, error Response)"""
+    s3_client = initialize_s3_client()
+    params = {'Bucket': app.config['WASABI_BUCKET'], 'Key': s3_key}
+    if byte_range is not None:
+        params['Range'] = range_header(byte_range)
+    if etag:
+        # Offsets uit de index gelden alleen voor de versie waarvoor hij gebouwd is
+        params['IfMatch'] = f'"{etag}"'
+
+    try:
+        return s3_client.get_object(**params), None
+    except ClientError as e:
+        code = e.response.get('Error', {}).get('Code')
+        if code == 'InvalidRange':
+            size = e.response.get('Error', {}).get('ActualObjectSize')
+            return None, Response(status=416, headers={'Content-Range': f"bytes */{size or '*'}"})
+        if code in ('NoSuchKey', '404'):
+            return None, Response('Opname niet gevonden', status=404)
+        if code in ('PreconditionFailed', '412'):
+            raise IndexOutdated(s3_key)
+        raise
+
+
+def stream_s3_fragment(s3_key, index, start, end, filename):
+    """Download start..end seconds as a complete MP3 (Xing seek header + one ranged GET of the frames, 200)
+
+    The GET covers the indexed seconds around the fragment; the frames
+    outside start..end are dropped while streaming, so the cut is exact to
+    the frame. The length is then only known afterwards (no Content-Length).
+    """
+    first, end_byte, skip, keep = index.span(start, end)[:4]
+    obj, error = _get_s3_object(s3_key, (first, max(first, end_byte - 1)), etag=index.etag)
+    if error is not None:
+        return error
+    prefix = index.xing_frame(start, end) or b''
+    body = obj['Body']
+    frames = body.iter_chunks(CHUNK_SIZE)
+    if skip or keep is not None:
+        frames = trim_frames(frames, skip, keep)
+        headers = {}
+    else:
+        headers = {'Content-Length': len(prefix) + obj['ContentLength']}
+    chunks = itertools.chain([prefix] if prefix else [], frames)
+    return _response(chunks, 200, headers, filename, close=body.close, ranges=False)
+
+
+def stream_indexed_s3_object(s3_key, index, range_value, cap=True):
+    """Proxy a recording as <Xing frame with seek TOC> + its audio frames, so browsers seek exactly
+
+    Byte offsets in the Range header refer to this virtual file; the part
+    after the Xing frame maps onto the audio frames of the S3 object.
+    """
+    prefix = index.xing_frame()
+    if prefix is None:
+        return stream_s3_object(s3_key, range_value, cap=cap)
+    audio_start = index.audio_start
+    total = len(prefix) + index.audio_end - audio_start
+
+    byte_range = parse_range(range_value)
+    if cap:
+        byte_range = cap_range(byte_range, app.config['AUDIO_PROXY_MAX_RANGE_MB'] * 1024 * 1024)
+    if byte_range is None:
+        first, last = 0, total - 1
+    elif byte_range[0] is None:
+        first, last = max(total - byte_range[1], 0), total - 1
+    else:
+        first = byte_range[0]
+        last = total - 1 if byte_range[1] is None else min(byte_range[1], total - 1)
+    if first >= total or first > last:
+        return Response(status=416, headers={'Content-Range': f"bytes */{total}"})
+
+    chunks = [prefix[first:last + 1]] if first < len(prefix) else []
+    close = None
+    if last >= len(prefix):
+        s3_first = audio_start + max(first - len(prefix), 0)
+        s3_last = audio_start + last - len(prefix)
+        obj, error = _get_s3_object(s3_key, (s3_first, s3_last), etag=index.etag)
+        if error is not None:
+            return error
+        body = obj['Body']
+        chunks = itertools.chain(chunks, body.iter_chunks(CHUNK_SIZE))
+        close = body.close
+
+    headers = {'Content-Length': last - first + 1}
+    if byte_range is None:
+        status = 200
+    else:
+        status = 206
+        headers['Content-Range'] = f"bytes {first}-{last}/{total}"
+    if index.etag:
+        headers['ETag'] = f'"{index.etag}-x"'
+    return _response(chunks, status, headers, close=close)
+
+
+def stream_s3_object(s3_key, range_value, filename=None, cap=True):
+    """Proxy (a range of) an S3 object; 206 with Content-Range for range requests"""
+    byte_range = parse_range(range_value)
+    if cap:
+        byte_range = cap_range(byte_range, app.config['AUDIO_PROXY_MAX_RANGE_MB'] * 1024 * 1024)
+
+    obj, error = _get_s3_object(s3_key, byte_range)
+    if error is not None:
+        return error
+
+    headers = {
+        'Content-Length': obj.get('ContentLength'),
+        'Content-Range': obj.get('ContentRange'),
+        'ETag': obj.get('ETag'),
+        'Last-Modified': obj['LastModified'].strftime('%a, %d %b %Y %H:%M:%S GMT') if obj.get('LastModified') else None
+    }
+    status = 206 if obj.get('ContentRange') else 200
+    body = obj['Body']
+    return _response(body.iter_chunks(CHUNK_SIZE), status, headers, filename, close=body.close)
+
+
+def stream_http_url(url, range_value, filename=None, cap=True):
+    """Proxy (a range of) a file on another HTTP server, forwarding the Range header"""
+    byte_range = parse_range(range_value)
+    if cap:
+        byte_range = cap_range(byte_range, app.config['AUDIO_PROXY_MAX_RANGE_MB'] * 1024 * 1024)
+
+    request_headers = {'User-Agent': 'Mozilla/5.0 (compatible; RadioLogger/1.0)'}
+    if byte_range is not None:
+        request_headers['Range'] = range_header(byte_range)
+
+    upstream = requests.get(url, stream=True, timeout=(10, 30), headers=request_headers)
+    if upstream.status_code not in (200, 206):
+        status = upstream.status_code
+        headers = {'Content-Range': upstream.headers.get('Content-Range')} if status == 416 else {}
+        upstream.close()
+        return Response(status=status, headers={k: v for k, v in headers.items() if v})
+
+    headers = {name: upstream.headers.get(name) for name in PASS_HEADERS}
+    return _response(upstream.iter_content(chunk_size=CHUNK_SIZE), upstream.status_code, headers,
+                     filename, close=upstream.close)
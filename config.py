@@ -24,6 +24,8 @@ class Config:
     RECORDINGS_DIR = os.environ.get('RECORDINGS_DIR', 'recordings')
     RETENTION_DAYS = int(os.environ.get('RETENTION_DAYS', 30))
     LOCAL_FILE_RETENTION = int(os.environ.get('LOCAL_FILE_RETENTION', 0))  # Uren voordat lokale bestanden worden verwijderd (0 = direct na upload)
+    RECORDING_START_LEAD_SECONDS = min(max(int(os.environ.get('RECORDING_START_LEAD_SECONDS', 30)), 0), 300)  # Opnames zoveel seconden vóór het hele uur starten (0 = uit, maximaal 300)
+    RECORDING_START_CONCURRENCY = int(os.environ.get('RECORDING_START_CONCURRENCY', 4))  # Aantal ffmpeg processen dat tegelijk wordt gestart
     
     # Wasabi S3 instellingen
     WASABI_ACCESS_KEY = os.environ.get('WASABI_ACCESS_KEY')
@@ -32,6 +34,8 @@ class Config:
     WASABI_REGION = os.environ.get('WASABI_REGION', 'eu-central-1')
     WASABI_ENDPOINT_URL = os.environ.get('WASABI_ENDPOINT_URL', 'https://s3.eu-central-1.wasabisys.com')
     
+    S3_MAX_POOL_CONNECTIONS = int(os.environ.get('S3_MAX_POOL_CONNECTIONS', 50))  # Verbindingen van de gedeelde S3 client
+    
     # Compatibiliteit met code dat S3_ prefix gebruikt
     S3_ENDPOINT = WASABI_ENDPOINT_URL
     S3_REGION = WASABI_REGION
@@ -39,8 +43,43 @@ class Config:
     S3_ACCESS_KEY = WASABI_ACCESS_KEY
     S3_SECRET_KEY = WASABI_SECRET_KEY
     
+    # Scheduler instellingen
+    RUN_SCHEDULER = os.environ.get('RUN_SCHEDULER', 'auto')  # auto (lock file), true (dit proces) of false (alleen HTTP)
+    SCHEDULER_LOCK_PATH = os.environ.get('SCHEDULER_LOCK_PATH', os.path.join(RECORDINGS_DIR, '.scheduler.lock'))
+    RECORDER_STATUS_PATH = os.environ.get('RECORDER_STATUS_PATH', os.path.join(RECORDINGS_DIR, '.recorders.json'))
+    METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(RECORDINGS_DIR, '.metrics'))  # Metrics snapshots per proces voor /metrics
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')  # Bearer token voor /metrics; leeg = alleen rechtstreeks vanaf localhost
+    RECORDER_PROGRESS_PATH = os.environ.get('RECORDER_PROGRESS_PATH', os.path.join(RECORDINGS_DIR, '.recorder_progress.json'))  # ffmpeg voortgang per station voor de web workers
+    SYSTEM_STATS_PATH = os.environ.get('SYSTEM_STATS_PATH', os.path.join(RECORDINGS_DIR, '.system_stats.json'))  # CPU/geheugen/I/O metingen voor de statuspagina
+    SYSTEM_STATS_INTERVAL = int(os.environ.get('SYSTEM_STATS_INTERVAL', 5))  # Seconden tussen twee metingen
+    
+    # Upload instellingen
+    UPLOAD_CONCURRENCY = int(os.environ.get('UPLOAD_CONCURRENCY', 4))  # Aantal bestanden dat tegelijk wordt geüpload
+    UPLOAD_PART_CONCURRENCY = int(os.environ.get('UPLOAD_PART_CONCURRENCY', 4))  # Parallelle multipart delen per bestand
+    UPLOAD_CHUNK_SIZE_MB = int(os.environ.get('UPLOAD_CHUNK_SIZE_MB', 16))  # Grootte van multipart delen (minimaal 5 MB)
+    UPLOAD_JOURNAL_PATH = os.environ.get('UPLOAD_JOURNAL_PATH', os.path.join(RECORDINGS_DIR, '.upload_journal.db'))  # SQLite journaal met geüploade bestanden
+    
+    # Watchdog instellingen
+    WATCHDOG_INTERVAL = int(os.environ.get('WATCHDOG_INTERVAL', 10))  # Seconden tussen controles van de recorders
+    WATCHDOG_STALL_SECONDS = int(os.environ.get('WATCHDOG_STALL_SECONDS', 60))  # Seconden zonder groei voordat een opname als vastgelopen geldt
+    WATCHDOG_BACKOFF_MAX = int(os.environ.get('WATCHDOG_BACKOFF_MAX', 300))  # Maximale wachttijd tussen herstarts
+    GAP_ALERT_MINUTES = float(os.environ.get('GAP_ALERT_MINUTES', 5))  # Alarm als een station vandaag zoveel minuten kwijt is
+    
+    # Stiltedetectie instellingen
+    SILENCE_THRESHOLD_DB = float(os.environ.get('SILENCE_THRESHOLD_DB', -50))  # RMS (dBFS) waaronder een venster als stil telt
+    SILENCE_MIN_SECONDS = float(os.environ.get('SILENCE_MIN_SECONDS', 10))  # Minimale duur van een stilte
+    SILENCE_ALERT_RATIO = float(os.environ.get('SILENCE_ALERT_RATIO', 0.1))  # Alarm als een uur minstens dit aandeel stilte bevat
+    SKIP_SILENT_UPLOADS = os.environ.get('SKIP_SILENT_UPLOADS', 'false').lower() in ('1', 'true', 'yes')  # Helemaal stille uren niet uploaden
+    
+    # Schijfruimte instellingen
+    DISK_SAMPLE_TTL = int(os.environ.get('DISK_SAMPLE_TTL', 30))  # Seconden dat een meting van de vrije ruimte geldig blijft
+    DISK_RESERVE_MB = int(os.environ.get('DISK_RESERVE_MB', 512))  # Vaste reserve die nooit volgeschreven mag worden
+    DISK_PROJECTION_HOURS = float(os.environ.get('DISK_PROJECTION_HOURS', 2))  # Uren schrijfruimte die per opname vrij moet zijn (plus LOCAL_FILE_RETENTION)
+    
     # Systeem instellingen
     FFMPEG_PATH = os.environ.get('FFMPEG_PATH', '/usr/bin/ffmpeg')
+    AUDIO_PROXY_MAX_RANGE_MB = int(os.environ.get('AUDIO_PROXY_MAX_RANGE_MB', 8))  # Maximale grootte van één antwoord van de audio proxy
+    HEALTH_CHECK_INTERVAL = int(os.environ.get('HEALTH_CHECK_INTERVAL', 30))  # Seconden tussen twee achtergrondcontroles voor /health
     
     # Omroep Land van Cuijk instellingen
     OMROEP_LVC_URL = os.environ.get('OMROEP_LVC_URL', 'https://gemist.omroeplvc.nl/')
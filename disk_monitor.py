@@ -0,0 +1,126 @@
+"""
+Schijfruimte monitor voor de opnamemap.
+
+Vervangt de losse os.statvfs() aanroepen: de vrije ruimte wordt één keer per
+cyclus (of na een korte TTL) gemeten en gedeeld door alle aanroepers. Op basis
+van de huidige schrijfsnelheid van alle recorders samen wordt berekend hoe
+lang de schijf het nog volhoudt, en of er ruimte is voor extra opnames tot de
+bestanden geüpload en opgeruimd zijn.
+"""
+
+import os
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+GB = 1024 ** 3
+MB = 1024 ** 2
+
+
+class DiskMonitor:
+    """Cached free-space sampler with a time-to-full projection"""
+
+    def __init__(self, path, ttl=30, reserve_bytes=512 * MB, horizon_seconds=2 * 3600,
+                 default_stream_rate=24000, rate_source=None):
+        self.path = path
+        self.ttl = ttl
+        self.reserve_bytes = reserve_bytes
+        self.horizon_seconds = horizon_seconds
+        self.default_stream_rate = default_stream_rate  # bytes/s voor een station zonder meting (192 kbps)
+        self.rate_source = rate_source
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._sampled_at = 0
+
+    def _recorder_rates(self):
+        """Write rates (bytes/s) of the running recorders"""
+        if self.rate_source is None:
+            return []
+        try:
+            return [r.get('bytes_per_second') or 0 for r in self.rate_source()]
+        except Exception as e:
+            logger.error(f"Error reading recorder rates: {e}")
+            return []
+
+    def sample(self):
+        """Measure free space now (one statvfs call) and update the snapshot"""
+        st = os.statvfs(self.path)
+        free_bytes = st.f_bavail * st.f_frsize
+        total_bytes = st.f_blocks * st.f_frsize
+
+        rates = self._recorder_rates()
+        write_rate = sum(rates)
+        measured = [rate for rate in rates if rate > 0]
+        stream_rate = sum(measured) / len(measured) if measured else self.default_stream_rate
+
+        seconds_to_full = None
+        if write_rate > 0:
+            seconds_to_full = max(free_bytes - self.reserve_bytes, 0) / write_rate
+        needed_bytes = self.reserve_bytes + write_rate * self.horizon_seconds
+
+        snapshot = {
+            'free_bytes': free_bytes,
+            'total_bytes': total_bytes,
+            'free_gb': round(free_bytes / GB, 2),
+            'total_gb': round(total_bytes / GB, 2),
+            'used_percent': round(100 - (free_bytes / total_bytes * 100), 2) if total_bytes else 0,
+            'recorders': len(rates),
+            'write_rate': write_rate,
+            'stream_rate': stream_rate,
+            'seconds_to_full': seconds_to_full,
+            'hours_to_full': round(seconds_to_full / 3600, 1) if seconds_to_full is not None else None,
+            'needed_bytes': needed_bytes,
+            'needed_gb': round(needed_bytes / GB, 2),
+            'is_low': free_bytes < needed_bytes,
+            'sampled_at': time.time()
+        }
+        with self._lock:
+            self._snapshot = snapshot
+            self._sampled_at = time.monotonic()
+        return snapshot
+
+    def snapshot(self, force=False):
+        """Most recent sample, refreshed when older than the TTL (or when forced)"""
+        with self._lock:
+            fresh = self._snapshot is not None and time.monotonic() - self._sampled_at < self.ttl
+            snapshot = self._snapshot
+        if fresh and not force:
+            return snapshot
+        return self.sample()
+
+    def can_start(self, streams=1, pending=0, snapshot=None):
+        """Check whether `streams` extra recordings fit until their files leave the disk
+
+        `pending` counts recordings already approved in this cycle but not yet
+        reflected in the measured write rate. Returns (ok, needed_bytes, snapshot).
+        """
+        snapshot = snapshot or self.snapshot()
+        extra_rate = (streams + pending) * snapshot['stream_rate']
+        needed_bytes = snapshot['needed_bytes'] + extra_rate * self.horizon_seconds
+        return snapshot['free_bytes'] >= needed_bytes, needed_bytes, snapshot
+
+
+_monitor = None
+_monitor_lock = threading.Lock()
+
+
+def get_disk_monitor():
+    """Process-wide monitor for RECORDINGS_DIR, configured from app.config"""
+    global _monitor
+    with _monitor_lock:
+        if _monitor is None:
+            from app import app
+            from utils import get_running_recordings
+
+            # Bestanden blijven lokaal staan tot na de upload en de lokale bewaartermijn
+            horizon_hours = app.config.get('DISK_PROJECTION_HOURS', 2) + app.config.get('LOCAL_FILE_RETENTION', 0)
+            _monitor = DiskMonitor(
+                app.config['RECORDINGS_DIR'],
+                ttl=app.config.get('DISK_SAMPLE_TTL', 30),
+                reserve_bytes=app.config.get('DISK_RESERVE_MB', 512) * MB,
+                horizon_seconds=horizon_hours * 3600,
+                rate_source=get_running_recordings
+            )
+        return _monitor
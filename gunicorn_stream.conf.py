@@ -0,0 +1,19 @@
+"""
+Gunicorn instellingen voor de streaming service (radiologger-stream.service).
+
+De gevent worker patcht sockets, maar psycopg2 is een C extensie die zelf
+op de database wacht. Zonder psycogreen blokkeert elke query (login sessie,
+Recording lookup) de hele worker met al zijn luisteraars.
+"""
+
+import logging
+
+
+def post_fork(server, worker):
+    """Make psycopg2 cooperative with gevent in every worker"""
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        logging.getLogger(__name__).warning("psycogreen ontbreekt, database queries blokkeren de gevent worker")
+        return
+    patch_psycopg()
@@ -0,0 +1,197 @@
+"""
+Health checks met een gecachte momentopname.
+
+ffmpeg wordt één keer onderzocht (versie) en pas opnieuw als het bestand
+van de binary verandert (mtime). Database, schijfruimte en logmap worden
+op de achtergrond periodiek gecontroleerd; /health leest alleen de laatste
+uitkomst. Met deep=True worden alle controles direct opnieuw uitgevoerd.
+"""
+
+import os
+import re
+import time
+import shutil
+import logging
+import threading
+import subprocess
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+MTIME_CHECK_INTERVAL = 30  # seconden tussen twee stat() aanroepen op de ffmpeg binary
+
+
+class FfmpegProbe:
+    """ffmpeg version, probed once and again only when the binary changes"""
+
+    def __init__(self, ffmpeg_path):
+        self.ffmpeg_path = ffmpeg_path
+        self._lock = threading.Lock()
+        self._info = None
+        self._mtime = None
+        self._checked_at = 0
+
+    def _binary(self):
+        return shutil.which(self.ffmpeg_path) or self.ffmpeg_path
+
+    def _probe(self, binary, mtime):
+        try:
+            result = subprocess.run([binary, '-version'],
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE,
+                                    text=True,
+                                    timeout=5)
+        except Exception as e:
+            return {'status': 'error', 'version': 'Error', 'details': str(e), 'path': binary}
+
+        if result.returncode != 0:
+            return {'status': 'error', 'version': 'Error', 'details': f"FFmpeg error: {result.stderr}", 'path': binary}
+
+        first_line = result.stdout.splitlines()[0] if result.stdout else "Unknown version"
+        version_match = re.search(r'ffmpeg version\s+([^\s]+)', result.stdout)
+        return {
+            'status': 'healthy',
+            'version': version_match.group(1) if version_match else "Unknown",
+            'details': first_line,
+            'path': binary,
+            'probed_at': datetime.now().isoformat()
+        }
+
+    def info(self, force=False):
+        """Cached probe result; re-probes when forced or when the binary's mtime changed"""
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._info is not None and now - self._checked_at < MTIME_CHECK_INTERVAL:
+                return self._info
+            self._checked_at = now
+
+            binary = self._binary()
+            try:
+                mtime = os.stat(binary).st_mtime
+            except OSError:
+                mtime = None
+
+            if force or self._info is None or mtime != self._mtime:
+                if self._info is not None and mtime != self._mtime:
+                    logger.info(f"ffmpeg binary {binary} is gewijzigd, versie opnieuw bepalen")
+                self._info = self._probe(binary, mtime)
+                self._mtime = mtime
+            return self._info
+
+
+class HealthMonitor:
+    """Runs the health checks in the background and serves the last result"""
+
+    def __init__(self, app, ffmpeg_probe, interval=30):
+        self.app = app
+        self.ffmpeg_probe = ffmpeg_probe
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._thread = None
+
+    def _check_database(self):
+        from sqlalchemy import text
+        from app import db
+        with self.app.app_context():
+            try:
+                db.session.execute(text("SELECT 1"))
+                return 'healthy', 'Database connection successful'
+            except Exception as e:
+                logger.error(f"Database health check failed: {e}")
+                return 'error', str(e)
+            finally:
+                db.session.remove()
+
+    def _check_disk(self, force):
+        from disk_monitor import get_disk_monitor
+        try:
+            disk = get_disk_monitor().snapshot(force=force)
+            details = f"{disk['free_gb']} GB free"
+            if disk['hours_to_full'] is not None:
+                details += f", full in {disk['hours_to_full']} h at current write rate"
+            return ('warning' if disk['is_low'] else 'healthy'), details
+        except Exception as e:
+            logger.error(f"Disk space health check failed: {e}")
+            return 'error', str(e)
+
+    def _check_logs_dir(self):
+        logs_dir = self.app.config['LOGS_DIR']
+        if os.path.isdir(logs_dir):
+            return 'healthy', f"Directory exists: {logs_dir}"
+        return 'error', f"Directory not found: {logs_dir}"
+
+    def run_checks(self, force=False):
+        """Run every check now and store the result"""
+        checks = {}
+        details = {}
+        started = time.perf_counter()
+
+        checks['database'], details['database'] = self._check_database()
+        checks['disk_space'], details['disk_space'] = self._check_disk(force)
+        checks['logs_dir'], details['logs_dir'] = self._check_logs_dir()
+        ffmpeg = self.ffmpeg_probe.info(force=force)
+        checks['ffmpeg'], details['ffmpeg'] = ffmpeg['status'], ffmpeg['details']
+
+        if 'error' in checks.values():
+            overall = 'error'
+        elif 'warning' in checks.values():
+            overall = 'warning'
+        else:
+            overall = 'healthy'
+
+        snapshot = {
+            'status': overall,
+            'timestamp': datetime.now().isoformat(),
+            'checks': checks,
+            'details': details,
+            'check_seconds': round(time.perf_counter() - started, 4)
+        }
+        with self._lock:
+            self._snapshot = snapshot
+        return snapshot
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.run_checks()
+            except Exception as e:
+                logger.error(f"Error running background health checks: {e}")
+
+    def snapshot(self, deep=False):
+        """Last health result (fresh checks when deep or when nothing is cached yet)"""
+        with self._lock:
+            snapshot = self._snapshot
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name='health-checks', daemon=True)
+                self._thread.start()
+        if deep or snapshot is None:
+            return self.run_checks(force=deep)
+        return snapshot
+
+
+_ffmpeg_probe = None
+_health_monitor = None
+_init_lock = threading.Lock()
+
+
+def get_ffmpeg_probe():
+    """Process-wide ffmpeg probe for FFMPEG_PATH"""
+    global _ffmpeg_probe
+    with _init_lock:
+        if _ffmpeg_probe is None:
+            from app import app
+            _ffmpeg_probe = FfmpegProbe(app.config['FFMPEG_PATH'])
+        return _ffmpeg_probe
+
+
+def get_health_monitor():
+    """Process-wide background health monitor"""
+    global _health_monitor
+    probe = get_ffmpeg_probe()
+    with _init_lock:
+        if _health_monitor is None:
+            from app import app
+            _health_monitor = HealthMonitor(app, probe, interval=app.config.get('HEALTH_CHECK_INTERVAL', 30))
+        return _health_monitor
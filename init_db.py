@@ -142,6 +142,11 @@ try:
                     program_title VARCHAR(255),
                     recording_type VARCHAR(20) DEFAULT 'scheduled',
                     s3_uploaded BOOLEAN DEFAULT FALSE,
+                    size_bytes BIGINT,
+                    duration_seconds INTEGER,
+                    etag VARCHAR(64),
+                    silence_ratio DOUBLE PRECISION,
+                    silence_gaps TEXT,
                     created_at TIMESTAMP DEFAULT NOW()
                 )
             """)
@@ -164,6 +169,63 @@ try:
     else:
         logger.info("Alle vereiste tabellen zijn aanwezig!")
     
+    # Nieuwere kolommen en tabellen toevoegen aan bestaande installaties
+    cursor.execute("""
+        ALTER TABLE "recording"
+            ADD COLUMN IF NOT EXISTS size_bytes BIGINT,
+            ADD COLUMN IF NOT EXISTS duration_seconds INTEGER,
+            ADD COLUMN IF NOT EXISTS etag VARCHAR(64),
+            ADD COLUMN IF NOT EXISTS silence_ratio DOUBLE PRECISION,
+            ADD COLUMN IF NOT EXISTS silence_gaps TEXT
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS "station_day_stats" (
+            station_id INTEGER REFERENCES "station"(id) NOT NULL,
+            date DATE NOT NULL,
+            recording_count INTEGER DEFAULT 0 NOT NULL,
+            total_bytes BIGINT DEFAULT 0 NOT NULL,
+            updated_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (station_id, date)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS "recording_gap" (
+            id SERIAL PRIMARY KEY,
+            station_id INTEGER REFERENCES "station"(id) NOT NULL,
+            date DATE NOT NULL,
+            started_at TIMESTAMP NOT NULL,
+            ended_at TIMESTAMP NOT NULL,
+            seconds INTEGER NOT NULL,
+            reason VARCHAR(20) NOT NULL,
+            restarts INTEGER DEFAULT 0 NOT NULL,
+            created_at TIMESTAMP DEFAULT NOW()
+        )
+    """)
+    cursor.execute('CREATE INDEX IF NOT EXISTS ix_recording_gap_station_date ON "recording_gap" (station_id, date)')
+    logger.info("Schema bijgewerkt (opnamegroottes, stilte, dagtotalen en onderbrekingen)")
+    
+    # Indexen voor het dagoverzicht en per-station queries
+    cursor.execute('CREATE INDEX IF NOT EXISTS ix_recording_date_station_hour ON "recording" (date, station_id, hour)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS ix_recording_station_date ON "recording" (station_id, date)')
+    cursor.execute("""
+        SELECT 1 FROM pg_indexes
+        WHERE tablename = 'recording' AND indexname = 'uq_recording_station_date_hour_type'
+    """)
+    if cursor.fetchone() is None:
+        # Dubbele opnames opruimen (oudste record houden) voordat de unieke index erop kan
+        cursor.execute("""
+            DELETE FROM "recording"
+            WHERE id NOT IN (
+                SELECT MIN(id) FROM "recording"
+                GROUP BY station_id, date, hour, recording_type
+            )
+        """)
+        cursor.execute("""
+            ALTER TABLE "recording"
+            ADD CONSTRAINT uq_recording_station_date_hour_type UNIQUE (station_id, date, hour, recording_type)
+        """)
+    logger.info("Indexen op 'recording' gecontroleerd")
+    
     # Controleer of er gebruikers bestaan
     try:
         cursor.execute("SELECT COUNT(*) FROM \"user\"")
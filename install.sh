@@ -281,7 +281,10 @@ python-dotenv>=1.0.0
 boto3>=1.28.0
 psycopg2-binary>=2.9.0
 gunicorn>=21.0.0
+gevent>=23.9.0
+psycogreen>=1.0.2
 psutil>=5.9.0
+numpy>=1.24.0
 requests>=2.30.0
 trafilatura>=1.6.0
 email-validator>=2.0.0
@@ -303,9 +306,9 @@ fi
 # Ubuntu 24.04 vereist --break-system-packages flag
 if grep -q "Ubuntu 24" /etc/os-release 2>/dev/null; then
     log_info "Ubuntu 24.04 gedetecteerd, gebruik --break-system-packages flag voor pip..."
-    pip install gunicorn psycopg2-binary --break-system-packages || { log_error "Kan gunicorn of psycopg2 niet installeren"; exit 1; }
+    pip install gunicorn gevent psycogreen psycopg2-binary --break-system-packages || { log_error "Kan gunicorn, gevent of psycopg2 niet installeren"; exit 1; }
 else
-    pip install gunicorn psycopg2-binary || { log_error "Kan gunicorn of psycopg2 niet installeren"; exit 1; }
+    pip install gunicorn gevent psycogreen psycopg2-binary || { log_error "Kan gunicorn, gevent of psycopg2 niet installeren"; exit 1; }
 fi
 deactivate
 
@@ -543,11 +546,36 @@ if [ -f "$INSTALL_DIR/radiologger.service" ]; then
         cp "$INSTALL_DIR/radiologger.service.orig" /etc/systemd/system/ || handle_critical_error "Kan service file niet installeren" 4
     }
     
+    # Installeer de aparte scheduler service (opnames, uploads en S3 sync)
+    if [ -f "$INSTALL_DIR/radiologger-scheduler.service" ]; then
+        cp "$INSTALL_DIR/radiologger-scheduler.service" /etc/systemd/system/ || { log_error "Kan scheduler service niet kopiëren"; exit 1; }
+    else
+        # Zonder scheduler service moeten de web workers zelf de scheduler draaien
+        log_warning "radiologger-scheduler.service ontbreekt, scheduler draait in de web workers"
+        sed -i '/RUN_SCHEDULER=false/d' /etc/systemd/system/radiologger.service
+    fi
+    
+    # Installeer de streaming service (gevent workers voor afspelen en downloads)
+    if [ -f "$INSTALL_DIR/radiologger-stream.service" ]; then
+        cp "$INSTALL_DIR/radiologger-stream.service" /etc/systemd/system/ || { log_error "Kan streaming service niet kopiëren"; exit 1; }
+    else
+        # Zonder streaming service gaan /audio en /download ook naar de web workers
+        log_warning "radiologger-stream.service ontbreekt, afspelen en downloads lopen via de web workers"
+        sed -i '/127.0.0.1:5001/d' /etc/apache2/sites-available/radiologger_apache.conf
+        systemctl reload apache2 || log_warning "Kan Apache niet herladen"
+    fi
+    
     # Laad systemd daemon opnieuw
     systemctl daemon-reload || { log_error "Kan systemd daemon niet herladen"; exit 1; }
     
     # Schakel service in
     systemctl enable radiologger || { log_error "Kan radiologger service niet inschakelen"; exit 1; }
+    if [ -f /etc/systemd/system/radiologger-scheduler.service ]; then
+        systemctl enable radiologger-scheduler || { log_error "Kan radiologger-scheduler service niet inschakelen"; exit 1; }
+    fi
+    if [ -f /etc/systemd/system/radiologger-stream.service ]; then
+        systemctl enable radiologger-stream || { log_error "Kan radiologger-stream service niet inschakelen"; exit 1; }
+    fi
     
     log_success "Systemd service succesvol geïnstalleerd en ingeschakeld"
 else
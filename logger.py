@@ -1,16 +1,27 @@
 import os
 import time
-import subprocess
-import signal
 import logging
-import boto3
 import requests
-import sqlite3
-from app import app, db, scheduler
-from models import Station, Recording, ScheduledJob
-from datetime import datetime, date, timedelta
-import threading
-import tempfile
+from app import app, db
+from models import Station, Recording, ScheduledJob, RecordingGap
+from recorder import supervisor, build_segment_command, build_single_command, write_status_file
+from scheduler_lock import is_scheduler_process
+from uploader import ParallelUploader, UploadJob
+from upload_journal import get_journal
+from storage import initialize_s3_client, upload_frame_index, upload_peaks, lost_minutes_per_station
+from silence import analyse_recording, ALL_SILENT_RATIO
+from recording_batch import RecordingBatch
+from mp3_frames import estimate_duration, build_frame_index
+from disk_monitor import get_disk_monitor
+from health import get_ffmpeg_probe
+from segments import staging_pattern, staging_file, stash_segment, finalize_segments
+from recorder_watchdog import watchdog
+from progress_monitor import monitor as progress_monitor
+from system_stats import get_sampler
+from metrics import RECORDERS_ACTIVE, RECORDED_BYTES, RECORDER_RESTARTS, SILENT_RECORDINGS
+from s3_sync import sync_recordings_with_s3, incremental_sync
+from datetime import datetime, timedelta
+import json
 import re
 
 logger = logging.getLogger(__name__)
@@ -28,6 +39,41 @@ def start_scheduler(scheduler_instance):
         replace_existing=True
     )
     
+    # Opnames voor het volgende uur vooraf starten (gespreid), ffmpeg knipt zelf op XX:00:00
+    lead = app.config.get('RECORDING_START_LEAD_SECONDS', 30)
+    if lead > 0:
+        scheduler_instance.add_job(
+            prespawn_recordings,
+            'cron',
+            hour='*',
+            minute=59 - (lead - 1) // 60,
+            second=(60 - lead % 60) % 60,
+            id='prespawn_recordings',
+            replace_existing=True
+        )
+    
+    RECORDERS_ACTIVE.set_function(lambda: len(supervisor.running()))
+    
+    # Vastgelopen of gestopte recorders herstarten en onderbrekingen registreren
+    watchdog.stall_seconds = app.config.get('WATCHDOG_STALL_SECONDS', 60)
+    watchdog.backoff_max = app.config.get('WATCHDOG_BACKOFF_MAX', 300)
+    scheduler_instance.add_job(
+        watch_recorders,
+        'interval',
+        seconds=app.config.get('WATCHDOG_INTERVAL', 10),
+        id='watch_recorders',
+        replace_existing=True
+    )
+    
+    # Afgeronde segmenten uit de staging map op hun plek zetten
+    scheduler_instance.add_job(
+        finalize_recordings,
+        'interval',
+        minutes=1,
+        id='finalize_recordings',
+        replace_existing=True
+    )
+    
     scheduler_instance.add_job(
         upload_and_remove,
         'interval',
@@ -45,6 +91,15 @@ def start_scheduler(scheduler_instance):
         replace_existing=True
     )
     
+    scheduler_instance.add_job(
+        full_s3_reconcile,
+        'cron',
+        hour=3,
+        minute=30,  # Volledige S3 sync 's nachts, overdag incrementeel
+        id='full_s3_reconcile',
+        replace_existing=True
+    )
+    
     scheduler_instance.add_job(
         cleanup_logs,
         'cron',
@@ -54,6 +109,39 @@ def start_scheduler(scheduler_instance):
         replace_existing=True
     )
     
+    scheduler_instance.add_job(
+        process_recording_requests,
+        'interval',
+        seconds=5,  # Handmatige start/stop verzoeken vanuit de web workers
+        id='process_recording_requests',
+        replace_existing=True
+    )
+    
+    scheduler_instance.add_job(
+        publish_recorder_status,
+        'interval',
+        seconds=10,
+        id='publish_recorder_status',
+        replace_existing=True
+    )
+    
+    scheduler_instance.add_job(
+        publish_recorder_progress,
+        'interval',
+        seconds=30,
+        id='publish_recorder_progress',
+        replace_existing=True
+    )
+    
+    # CPU, geheugen, load, schijf I/O en recorder RSS/CPU voor de statuspagina
+    scheduler_instance.add_job(
+        publish_system_stats,
+        'interval',
+        seconds=app.config.get('SYSTEM_STATS_INTERVAL', 5),
+        id='publish_system_stats',
+        replace_existing=True
+    )
+    
     # Startup check
     scheduler_instance.add_job(
         prep_for_recording,
@@ -68,26 +156,17 @@ def prep_for_recording():
     logger.info("🔄 PREP-modus gestart")
     
     # Check disk space
-    disk_free = os.statvfs(app.config['RECORDINGS_DIR']).f_bfree * os.statvfs(app.config['RECORDINGS_DIR']).f_frsize
-    disk_free_gb = disk_free / (1024**3)
+    disk = get_disk_monitor().snapshot(force=True)
     
-    if disk_free_gb < 2:
-        logger.warning(f"⚠️ Weinig schijfruimte: {disk_free_gb:.2f} GB over")
+    if disk['is_low']:
+        logger.warning(f"⚠️ Weinig schijfruimte: {disk['free_gb']:.2f} GB over, {disk['needed_gb']:.2f} GB nodig")
         return {'status': 'error', 'message': 'Onvoldoende schijfruimte'}
     
-    # Check ffmpeg
-    try:
-        result = subprocess.run([app.config['FFMPEG_PATH'], '-version'], 
-                              stdout=subprocess.PIPE, 
-                              stderr=subprocess.PIPE, 
-                              text=True,
-                              timeout=5)
-        if result.returncode != 0:
-            logger.error(f"⚠️ ffmpeg test mislukt: {result.stderr}")
-            return {'status': 'error', 'message': 'ffmpeg test mislukt'}
-    except Exception as e:
-        logger.error(f"⚠️ ffmpeg test exception: {e}")
-        return {'status': 'error', 'message': f'ffmpeg test exception: {e}'}
+    # Check ffmpeg (opnieuw onderzocht als de binary sinds de vorige keer is gewijzigd)
+    ffmpeg = get_ffmpeg_probe().info()
+    if ffmpeg['status'] != 'healthy':
+        logger.error(f"⚠️ ffmpeg test mislukt: {ffmpeg['details']}")
+        return {'status': 'error', 'message': 'ffmpeg test mislukt'}
     
     # GEEN automatische start van opnames - ze starten automatisch op het hele uur (XX:00:00)
     logger.info("✅ Systeem gereed voor opnames. Opnames starten automatisch op het hele uur (XX:00:00)")
@@ -95,146 +174,382 @@ def prep_for_recording():
     logger.info("✅ PREP voltooid")
     return {'status': 'ok', 'message': 'PREP voltooid'}
 
+def station_should_record(station, at):
+    """Check whether a station is always-on or inside its schedule at a given time"""
+    if station.always_on:
+        return True
+    if station.schedule_start_date is None or station.schedule_end_date is None:
+        return False
+    
+    start_time = datetime.combine(
+        station.schedule_start_date,
+        datetime.strptime(f"{station.schedule_start_hour:02d}:00", "%H:%M").time()
+    )
+    end_time = datetime.combine(
+        station.schedule_end_date,
+        datetime.strptime(f"{station.schedule_end_hour:02d}:00", "%H:%M").time()
+    )
+    return start_time <= at < end_time
+
+def _launch_recorder(station, output_pattern, current_time, record_from=None):
+    """Spawn the segmenting ffmpeg for a station and record the ScheduledJob"""
+    # Een deel van dit uur van een vorig proces eerst veiligstellen (als .partN in staging),
+    # ffmpeg overschrijft het anders; na afloop van het uur worden de delen samengevoegd
+    stash_segment(app.config['RECORDINGS_DIR'], station.name, current_time)
+    
+    # Resolve playlist URL if needed
+    resolved_url = resolve_stream_url(station.recording_url)
+    
+    # Build and execute ffmpeg command
+    ffmpeg_cmd = build_segment_command(app.config['FFMPEG_PATH'], resolved_url, output_pattern)
+    job_type = 'always_on' if station.always_on else 'scheduled'
+    
+    recorder = supervisor.start(
+        station.id,
+        station.name,
+        station.recording_url,
+        output_pattern,
+        ffmpeg_cmd,
+        job_type=job_type,
+        record_from=record_from
+    )
+    
+    # Meteen bewaken: ffmpeg die direct stopt (stream weigert) wordt zo ook herstart
+    watchdog.watch(recorder)
+    logger.info(f"🎤 Opname gestart voor {station.name} (output: {output_pattern}), PID: {recorder.pid}")
+    
+    # Create or update job record
+    job = ScheduledJob.query.filter_by(
+        station_id=station.id, 
+        job_type=job_type,
+        status='running'
+    ).first()
+    
+    if job:
+        job.start_time = current_time
+    else:
+        job = ScheduledJob(
+            job_id=f"{job_type}_{station.id}_{current_time.strftime('%Y%m%d%H%M%S')}",
+            station_id=station.id,
+            job_type=job_type,
+            start_time=current_time,
+            status='running'
+        )
+        db.session.add(job)
+    
+    db.session.commit()
+    return recorder
+
+def prespawn_recordings():
+    """Start the recorders for the coming hour a little before XX:00, a few at a time
+    
+    ffmpeg cuts on the hour itself (-segment_atclocktime), so connecting early
+    costs nothing; the short lead-in segment is removed after the boundary.
+    """
+    now = datetime.now()
+    boundary = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    lead = app.config.get('RECORDING_START_LEAD_SECONDS', 30)
+    if (boundary - now).total_seconds() > lead + 60:
+        # Te laat uitgevoerd (misfire); start_scheduled_recordings vangt dit op
+        return
+    
+    with app.app_context():
+        stations = Station.query.all()
+        due = [station for station in stations
+               if station_should_record(station, boundary) and not supervisor.is_running(station.id)]
+        if not due:
+            return
+        
+        logger.info(f"⏳ {len(due)} opnames vooraf starten voor {boundary.strftime('%H:%M')}")
+        
+        disk_monitor = get_disk_monitor()
+        disk = disk_monitor.snapshot(force=True)
+        
+        # Golven van maximaal RECORDING_START_CONCURRENCY stations, verspreid over
+        # de eerste helft van de aanlooptijd; de rest is marge voor het verbinden
+        concurrency = max(1, app.config.get('RECORDING_START_CONCURRENCY', 4))
+        waves = [due[i:i + concurrency] for i in range(0, len(due), concurrency)]
+        gap = max((boundary - datetime.now()).total_seconds() / 2, 0) / len(waves)
+        
+        started = 0
+        for index, wave in enumerate(waves):
+            if index:
+                time.sleep(gap)
+            for station in wave:
+                fits, needed_bytes, _ = disk_monitor.can_start(pending=started, snapshot=disk)
+                if not fits:
+                    logger.warning(f"⚠️ Weinig schijfruimte: {disk['free_gb']:.2f} GB vrij, "
+                                   f"{needed_bytes / (1024**3):.2f} GB nodig. Opname niet gestart voor {station.name}.")
+                    continue
+                try:
+                    output_pattern = generate_output_pattern(station.name)
+                    _launch_recorder(station, output_pattern, datetime.now(), record_from=boundary)
+                    started += 1
+                except Exception as e:
+                    logger.error(f"Error starting recording for {station.name}: {e}")
+
+_gap_alerts = set()
+
+def watch_recorders():
+    """Restart stalled or dead recorders with backoff and record the gaps"""
+    now = datetime.now()
+    if progress_monitor.ensure_running():
+        logger.warning("⚠️ ffmpeg voortgangslezer was gestopt, opnieuw gestart")
+    with app.app_context():
+        try:
+            stations = Station.query.all()
+            closed = []
+            
+            for station in stations:
+                if not station_should_record(station, now):
+                    if watchdog.is_upcoming(station.id, now):
+                        # Vooraf gestart voor het komende uur
+                        continue
+                    gap = watchdog.close_gap(station.id)
+                    if gap:
+                        closed.append((station.id, gap))
+                    watchdog.forget(station.id)
+                    if not supervisor.is_running(station.id):
+                        progress_monitor.forget(station.id)
+                    continue
+                
+                recorder = supervisor.get(station.id)
+                if recorder:
+                    state = watchdog.observe(recorder, now)
+                    RECORDED_BYTES.inc(watchdog.bytes_delta(station.id), station.name)
+                    if state == 'growing':
+                        gap = watchdog.close_gap(station.id)
+                        if gap:
+                            closed.append((station.id, gap))
+                            logger.info(f"✅ Opname voor {station.name} loopt weer")
+                        continue
+                    if state == 'waiting':
+                        continue
+                    
+                    # Vastgelopen: bestand groeit niet meer
+                    logger.warning(f"⚠️ Opname voor {station.name} (PID {recorder.pid}) schrijft al "
+                                   f"{watchdog.stall_seconds}s niets, herstarten")
+                    watchdog.open_gap(station.id, 'stalled', watchdog.last_growth(station.id) or now)
+                    supervisor.stop(station.id)
+                else:
+                    # Stations die nog nooit liepen starten gewoon op het hele uur
+                    if not watchdog.is_watched(station.id):
+                        continue
+                    if watchdog.open_gap(station.id, 'died', watchdog.last_growth(station.id) or now):
+                        logger.warning(f"⚠️ Geen lopende opname voor {station.name}")
+                
+                if not watchdog.may_restart(station.id, now):
+                    continue
+                
+                fits, needed_bytes, disk = get_disk_monitor().can_start()
+                if not fits:
+                    continue
+                
+                delay = watchdog.restarted(station.id, now)
+                RECORDER_RESTARTS.inc(1, station.name)
+                try:
+                    _launch_recorder(station, generate_output_pattern(station.name), now)
+                    logger.info(f"🔁 Opname voor {station.name} herstart (volgende poging na {delay}s)")
+                except Exception as e:
+                    logger.error(f"Error restarting recording for {station.name}: {e}")
+            
+            _store_gaps(closed, now)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error in recorder watchdog: {e}")
+
+def _store_gaps(closed, now):
+    """Write open and just-closed gaps as RecordingGap rows and alert on lost minutes"""
+    # Alarmen van eerdere dagen vergeten, anders groeit de set zolang het proces leeft
+    today = now.date()
+    _gap_alerts.difference_update([key for key in _gap_alerts if key[1] < today])
+    
+    gaps = [(station_id, gap) for station_id, gap in watchdog.open_gaps()] + closed
+    if not gaps:
+        return
+    
+    for station_id, gap in gaps:
+        # Eén record per dag: een onderbreking over middernacht wordt op de daggrens gesplitst
+        row_start = gap.get('row_started_at', gap['started_at'])
+        while row_start.date() < today:
+            midnight = datetime.combine(row_start.date() + timedelta(days=1), datetime.min.time())
+            _write_gap_row(station_id, gap, row_start, midnight)
+            gap['id'] = None
+            row_start = midnight
+        gap['row_started_at'] = row_start
+        _write_gap_row(station_id, gap, row_start, now)
+    db.session.commit()
+    
+    # Alarm zodra een station vandaag meer dan GAP_ALERT_MINUTES kwijt is
+    threshold = app.config.get('GAP_ALERT_MINUTES', 5)
+    lost = lost_minutes_per_station(today)
+    for station_id, _ in gaps:
+        if lost.get(station_id, 0) >= threshold and (station_id, today) not in _gap_alerts:
+            _gap_alerts.add((station_id, today))
+            station = Station.query.get(station_id)
+            logger.error(f"🚨 {station.name if station else station_id}: {lost[station_id]} minuten opname verloren vandaag")
+
+def _write_gap_row(station_id, gap, started_at, ended_at):
+    """Insert or update the RecordingGap row for the part of a gap on started_at's day"""
+    seconds = int((ended_at - started_at).total_seconds())
+    if gap['id'] is None:
+        row = RecordingGap(
+            station_id=station_id,
+            date=started_at.date(),
+            started_at=started_at,
+            ended_at=ended_at,
+            seconds=seconds,
+            reason=gap['reason'],
+            restarts=gap['restarts']
+        )
+        db.session.add(row)
+        db.session.flush()
+        gap['id'] = row.id
+    else:
+        RecordingGap.query.filter_by(id=gap['id']).update(
+            {'ended_at': ended_at, 'seconds': seconds, 'restarts': gap['restarts']},
+            synchronize_session=False
+        )
+
 def start_scheduled_recordings():
     """Start scheduled and always-on recordings with segmentation"""
     logger.info("⏳ Start geplande en AO opnames")
     
+    # Aanloopsegmenten van vooraf gestarte opnames opruimen
+    discarded = supervisor.discard_lead_in()
+    if discarded:
+        logger.info(f"🧹 {discarded} aanloopsegmenten verwijderd")
+    
     with app.app_context():
         stations = Station.query.all()
         current_time = datetime.now()
         
-        # Get list of running ffmpeg processes
-        try:
-            process_output = subprocess.check_output(["pgrep", "-af", "ffmpeg"]).decode('utf-8')
-            process_lines = [line for line in process_output.split('\n') if line.strip()]
-        except subprocess.CalledProcessError:
-            # No ffmpeg processes running
-            process_lines = []
-            logger.info("Geen ffmpeg processen draaien momenteel")
+        # Eén meting per cyclus; nieuwe opnames in deze cyclus tellen mee in de prognose
+        disk_monitor = get_disk_monitor()
+        disk = disk_monitor.snapshot(force=True)
+        started_this_cycle = 0
         
         for station in stations:
             station_name = station.name
-            station_url = station.recording_url
-            
-            # Determine if station should be recorded
-            is_always_on = station.always_on
-            has_schedule = (station.schedule_start_date is not None and 
-                          station.schedule_end_date is not None)
-            in_schedule = False
-            
-            if has_schedule:
-                start_time = datetime.combine(
-                    station.schedule_start_date,
-                    datetime.strptime(f"{station.schedule_start_hour:02d}:00", "%H:%M").time()
-                )
-                end_time = datetime.combine(
-                    station.schedule_end_date,
-                    datetime.strptime(f"{station.schedule_end_hour:02d}:00", "%H:%M").time()
-                )
-                
-                if current_time >= start_time and current_time < end_time:
-                    in_schedule = True
             
-            should_record = is_always_on or (has_schedule and in_schedule)
-            
-            if should_record:
-                # Check disk space
-                disk_free = os.statvfs(app.config['RECORDINGS_DIR']).f_bfree * os.statvfs(app.config['RECORDINGS_DIR']).f_frsize
-                disk_free_gb = disk_free / (1024**3)
-                
-                if disk_free_gb < 2:
-                    logger.warning(f"⚠️ Weinig schijfruimte: {disk_free_gb:.2f} GB. Opname niet gestart voor {station_name}.")
-                    continue
-                
+            if station_should_record(station, current_time):
                 # Generate output pattern
                 output_pattern = generate_output_pattern(station_name)
-                expected_dir = os.path.dirname(output_pattern)
                 
-                # Check if process is already running for this station
-                process_found = False
-                processes_to_kill = []
+                # Check if a recorder is already running for this station
+                recorder = supervisor.get(station.id)
                 
-                for line in process_lines:
-                    if station_url in line:
-                        if expected_dir in line:
-                            process_found = True
-                            break
-                        else:
-                            # Old process with wrong output dir - kill it
-                            parts = line.split(" ", 1)
-                            if parts[0].isdigit():
-                                processes_to_kill.append(parts[0])
-                
-                # Kill old processes
-                for pid in processes_to_kill:
-                    try:
-                        os.kill(int(pid), signal.SIGTERM)
-                        logger.info(f"🛑 Oude opname voor {station_name} (PID {pid}) gestopt.")
-                    except Exception as e:
-                        logger.error(f"Error killing process {pid}: {e}")
+                # Het patroon bevat geen datum meer, dus een lopende recorder blijft
+                # gewoon doorlopen; alleen na een wijziging van RECORDINGS_DIR herstarten
+                if recorder and recorder.output_pattern != output_pattern:
+                    supervisor.stop(station.id)
+                    logger.info(f"🛑 Oude opname voor {station_name} (PID {recorder.pid}) gestopt.")
+                    recorder = None
                 
-                # Start new recording if not already running
-                if not process_found:
-                    try:
-                        # Resolve playlist URL if needed
-                        resolved_url = resolve_stream_url(station_url)
-                        
-                        # Build and execute ffmpeg command
-                        ffmpeg_cmd = [
-                            app.config['FFMPEG_PATH'],
-                            '-i', resolved_url,
-                            '-vn',  # No video
-                            '-acodec', 'copy',  # Copy audio codec (no transcoding)
-                            '-f', 'segment',  # Segment format
-                            '-segment_time', '3600',  # 1-hour segments
-                            '-reset_timestamps', '1',
-                            '-segment_atclocktime', '1',
-                            '-strftime', '1',
-                            output_pattern
-                        ]
-                        
-                        env = os.environ.copy()
-                        env['TZ'] = 'Europe/Amsterdam'
-                        
-                        process = subprocess.Popen(
-                            ffmpeg_cmd,
-                            stdout=subprocess.DEVNULL,
-                            stderr=subprocess.DEVNULL,
-                            env=env
-                        )
-                        
-                        logger.info(f"🎤 Opname gestart voor {station_name} (output: {output_pattern}), PID: {process.pid}")
-                        
-                        # Create or update job record
-                        job_type = 'always_on' if is_always_on else 'scheduled'
-                        job = ScheduledJob.query.filter_by(
-                            station_id=station.id, 
-                            job_type=job_type,
-                            status='running'
-                        ).first()
-                        
-                        if job:
-                            job.start_time = current_time
-                        else:
-                            job = ScheduledJob(
-                                job_id=f"{job_type}_{station.id}_{current_time.strftime('%Y%m%d%H%M%S')}",
-                                station_id=station.id,
-                                job_type=job_type,
-                                start_time=current_time,
-                                status='running'
-                            )
-                            db.session.add(job)
-                        
-                        db.session.commit()
+                # Start new recording if not already running (normally pre-spawned already)
+                if not recorder:
+                    # Check disk space (projected need until the files are uploaded)
+                    fits, needed_bytes, _ = disk_monitor.can_start(pending=started_this_cycle, snapshot=disk)
+                    if not fits:
+                        logger.warning(f"⚠️ Weinig schijfruimte: {disk['free_gb']:.2f} GB vrij, "
+                                       f"{needed_bytes / (1024**3):.2f} GB nodig. Opname niet gestart voor {station_name}.")
+                        continue
+                    started_this_cycle += 1
                     
+                    try:
+                        _launch_recorder(station, output_pattern, current_time)
                     except Exception as e:
                         logger.error(f"Error starting recording for {station_name}: {e}")
             else:
                 # Stop any running processes for this station
                 stop_recording(station.id)
+        
+        # Recorders van verwijderde stations stoppen
+        station_ids = {station.id for station in stations}
+        for recorder in supervisor.running():
+            if recorder.station_id not in station_ids:
+                supervisor.stop(recorder.station_id)
+                logger.info(f"🛑 Opname voor verwijderd station {recorder.station_name} gestopt (PID {recorder.pid}).")
+
+def request_recording_action(station_id, action):
+    """Queue a manual start or stop for the scheduler process"""
+    try:
+        with app.app_context():
+            station = Station.query.get(station_id)
+            if not station:
+                return {'success': False, 'error': 'Station not found'}
+            
+            now = datetime.now()
+            job = ScheduledJob(
+                job_id=f"request_{action}_{station.id}_{now.strftime('%Y%m%d%H%M%S')}",
+                station_id=station.id,
+                job_type=f"{action}_request",
+                start_time=now,
+                status='requested'
+            )
+            db.session.add(job)
+            db.session.commit()
+            
+            logger.info(f"📨 Verzoek '{action}' voor {station.name} doorgegeven aan de scheduler")
+            return {'success': True, 'queued': True, 'processes_killed': 0}
+    
+    except Exception as e:
+        logger.error(f"Error queueing {action} request: {e}")
+        return {'success': False, 'error': str(e)}
+
+def process_recording_requests():
+    """Execute manual start/stop requests queued by the web workers"""
+    with app.app_context():
+        requests_pending = ScheduledJob.query.filter_by(status='requested').order_by(ScheduledJob.id).all()
+        
+        for job in requests_pending:
+            if job.job_type == 'manual_request':
+                result = _start_manual_recording(job.station_id)
+            elif job.job_type == 'stop_request':
+                result = _stop_recording(job.station_id)
+            else:
+                result = {'success': False, 'error': f'Onbekend verzoek {job.job_type}'}
+            
+            job.status = 'completed' if result.get('success') else 'failed'
+            job.end_time = datetime.now()
+            if not result.get('success'):
+                logger.error(f"Verzoek {job.job_id} mislukt: {result.get('error')}")
+        
+        if requests_pending:
+            db.session.commit()
+
+def publish_recorder_status():
+    """Write the recorder registry to the shared status file for the web workers"""
+    try:
+        write_status_file(app.config['RECORDER_STATUS_PATH'], supervisor.status())
+    except Exception as e:
+        logger.error(f"Error publishing recorder status: {e}")
+
+def publish_recorder_progress():
+    """Write the ffmpeg progress time series of the running recorders for the web workers"""
+    try:
+        station_ids = {recorder.station_id for recorder in supervisor.running()}
+        write_status_file(app.config['RECORDER_PROGRESS_PATH'], progress_monitor.snapshot(station_ids), key='progress')
+    except Exception as e:
+        logger.error(f"Error publishing recorder progress: {e}")
+
+def publish_system_stats():
+    """Sample system and recorder resource usage and write it for the web workers"""
+    try:
+        sampler = get_sampler()
+        sampler.sample()
+        write_status_file(app.config['SYSTEM_STATS_PATH'], sampler.snapshot(), key='system')
+    except Exception as e:
+        logger.error(f"Error publishing system stats: {e}")
 
 def start_manual_recording(station_id):
     """Start a manual recording (1 hour) for a station"""
+    if not is_scheduler_process():
+        return request_recording_action(station_id, 'manual')
+    return _start_manual_recording(station_id)
+
+def _start_manual_recording(station_id):
+    """Start a manual recording in this (scheduler) process"""
     try:
         with app.app_context():
             station = Station.query.get(station_id)
@@ -242,43 +557,37 @@ def start_manual_recording(station_id):
                 return {'success': False, 'error': 'Station not found'}
             
             # Check disk space
-            disk_free = os.statvfs(app.config['RECORDINGS_DIR']).f_bfree * os.statvfs(app.config['RECORDINGS_DIR']).f_frsize
-            disk_free_gb = disk_free / (1024**3)
+            fits, needed_bytes, disk = get_disk_monitor().can_start()
             
-            if disk_free_gb < 2:
-                logger.warning(f"⚠️ Weinig schijfruimte: {disk_free_gb:.2f} GB. Geen handmatige opname voor {station.name}.")
-                return {'success': False, 'error': f'Onvoldoende schijfruimte: {disk_free_gb:.2f} GB'}
+            if not fits:
+                logger.warning(f"⚠️ Weinig schijfruimte: {disk['free_gb']:.2f} GB. Geen handmatige opname voor {station.name}.")
+                return {'success': False, 'error': f"Onvoldoende schijfruimte: {disk['free_gb']:.2f} GB vrij, {needed_bytes / (1024**3):.2f} GB nodig"}
             
-            # Prepare output path
-            current_date = date.today()
-            hour_raw = datetime.now().hour
+            # Niet dubbel opnemen naar hetzelfde uurbestand
+            if supervisor.is_running(station.id):
+                return {'success': False, 'error': f'Er loopt al een opname voor {station.name}'}
             
-            directory = os.path.join(app.config['RECORDINGS_DIR'], station.name, current_date.strftime('%Y-%m-%d'))
-            os.makedirs(directory, exist_ok=True)
+            # Prepare output path (staging, finalize_recordings zet het bestand op zijn plek)
+            now = datetime.now()
+            current_date = now.date()
+            hour_raw = now.hour
             
-            file_path = os.path.join(directory, f"{hour_raw:02d}.mp3")
+            file_path = staging_file(app.config['RECORDINGS_DIR'], station.name, now)
+            stash_segment(app.config['RECORDINGS_DIR'], station.name, now)
             
             # Resolve playlist URL if needed
             resolved_url = resolve_stream_url(station.recording_url)
             
-            # Build and execute ffmpeg command
-            ffmpeg_cmd = [
-                app.config['FFMPEG_PATH'],
-                '-i', resolved_url,
-                '-vn',  # No video
-                '-acodec', 'copy',  # Copy audio codec
-                '-t', '3600',  # Record exactly 1 hour
-                file_path
-            ]
-            
-            env = os.environ.copy()
-            env['TZ'] = 'Europe/Amsterdam'
+            # Build and execute ffmpeg command (exactly 1 hour)
+            ffmpeg_cmd = build_single_command(app.config['FFMPEG_PATH'], resolved_url, file_path, duration=3600)
             
-            process = subprocess.Popen(
+            process = supervisor.start(
+                station.id,
+                station.name,
+                station.recording_url,
+                file_path,
                 ffmpeg_cmd,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                env=env
+                job_type='manual'
             )
             
             logger.info(f"🎤 Handmatige opname gestart voor {station.name}, file={file_path}, PID: {process.pid}")
@@ -313,32 +622,26 @@ def start_manual_recording(station_id):
 
 def stop_recording(station_id):
     """Stop all recordings for a station"""
+    if not is_scheduler_process():
+        return request_recording_action(station_id, 'stop')
+    return _stop_recording(station_id)
+
+def _stop_recording(station_id):
+    """Stop the recordings of a station in this (scheduler) process"""
     try:
         with app.app_context():
             station = Station.query.get(station_id)
             if not station:
                 return {'success': False, 'error': 'Station not found'}
             
-            # Find running processes for this station
-            try:
-                process_output = subprocess.check_output(["pgrep", "-af", "ffmpeg"]).decode('utf-8')
-                processes_killed = 0
-                
-                for line in process_output.split('\n'):
-                    if station.recording_url in line:
-                        parts = line.split(" ", 1)
-                        if parts[0].isdigit():
-                            pid = int(parts[0])
-                            try:
-                                os.kill(pid, signal.SIGTERM)
-                                processes_killed += 1
-                                logger.info(f"🛑 Opname voor {station.name} gestopt (PID: {pid}).")
-                            except Exception as e:
-                                logger.error(f"Error killing process {pid}: {e}")
-            except subprocess.CalledProcessError:
-                # No ffmpeg processes running
-                logger.info(f"Geen ffmpeg processen draaien momenteel voor {station.name}")
-                return {'success': True, 'processes_killed': 0}
+            # Stop the recorder registered for this station
+            recorder = supervisor.get(station.id)
+            processes_killed = 0
+            
+            if recorder:
+                supervisor.stop(station.id)
+                processes_killed = 1
+                logger.info(f"🛑 Opname voor {station.name} gestopt (PID: {recorder.pid}).")
             
             # Update job records
             jobs = ScheduledJob.query.filter_by(
@@ -380,209 +683,154 @@ def upload_and_remove():
                     logger.info("Setup nog niet voltooid. Vul de Wasabi gegevens in bij de eerste setup.")
                 return
                 
-            # Initialize S3 client
-            s3_client = boto3.client(
-                's3',
-                endpoint_url=app.config['WASABI_ENDPOINT_URL'],
-                region_name=app.config['WASABI_REGION'],
-                aws_access_key_id=app.config['WASABI_ACCESS_KEY'],
-                aws_secret_access_key=app.config['WASABI_SECRET_KEY']
-            )
+            # Initialize S3 client (genoeg verbindingen voor alle parallelle workers)
+            concurrency = app.config.get('UPLOAD_CONCURRENCY', 4)
+            part_concurrency = app.config.get('UPLOAD_PART_CONCURRENCY', 4)
+            s3_client = initialize_s3_client(max_pool_connections=concurrency * part_concurrency + 2)
+            
+            # Upload journal: welke versie van elk bestand staat al op S3
+            journal = get_journal(app.config['UPLOAD_JOURNAL_PATH'])
             
+            # Eerst afgeronde segmenten op hun plek zetten
+            finalize_recordings()
+            
+            # Aanloopsegmenten blijven in staging (finalize_segments slaat ze over) en komen hier nooit langs
             # 1. Find MP3 files to upload
             mp3_files = []
+            upload_jobs = []
             for root, _, files in os.walk(app.config['RECORDINGS_DIR']):
                 for file in files:
                     if file.endswith('.mp3') and re.match(r'^\d{2}\.mp3$', file):
-                        mp3_files.append(os.path.join(root, file))
-            
-            # 2. Upload each file to S3
-            for file_path in mp3_files:
-                try:
-                    # Extract components from path
-                    rel_path = os.path.relpath(file_path, app.config['RECORDINGS_DIR'])
-                    parts = rel_path.split(os.sep)
-                    
-                    if len(parts) >= 3:
-                        station_name = parts[0]
-                        date_str = parts[1]
-                        hour_file = parts[2]
-                        
-                        # S3 key: opnames/station/date/hour.mp3
-                        s3_key = f"opnames/{station_name}/{date_str}/{hour_file}"
-                        
-                        # Upload file if it doesn't exist or if local file is newer
-                        try:
-                            s3_client.head_object(Bucket=app.config['WASABI_BUCKET'], Key=s3_key)
-                            # File exists, check if local is newer (modification time)
-                            local_mtime = os.path.getmtime(file_path)
-                            
-                            # Only upload if local file is newer than 60 seconds
-                            # This handles the case of ongoing recordings
-                            if time.time() - local_mtime > 60:
-                                continue
+                        file_path = os.path.join(root, file)
+                        mp3_files.append(file_path)
                         
-                        except Exception:
-                            # File doesn't exist, upload it
-                            pass
+                        # Extract components from path
+                        rel_path = os.path.relpath(file_path, app.config['RECORDINGS_DIR'])
+                        parts = rel_path.split(os.sep)
                         
-                        # Upload file
-                        s3_client.upload_file(file_path, app.config['WASABI_BUCKET'], s3_key)
-                        logger.info(f"⬆️ Uploaded {file_path} to s3://{app.config['WASABI_BUCKET']}/{s3_key}")
-                        
-                        # Verwijder direct als LOCAL_FILE_RETENTION op 0 staat
-                        if app.config.get('LOCAL_FILE_RETENTION', 0) == 0:
+                        if len(parts) >= 3:
                             try:
-                                # Maar alleen als de file niet in gebruik is (niet aan het schrijven)
-                                if time.time() - os.path.getmtime(file_path) > 60:
-                                    os.remove(file_path)
-                                    logger.info(f"🗑️ Direct verwijderd na upload: {file_path}")
-                            except Exception as e:
-                                logger.error(f"Fout bij direct verwijderen na upload: {e}")
-                        
-                        # Add to database if not exists
-                        station = Station.query.filter_by(name=station_name).first()
-                        if station:
-                            hour = hour_file.replace('.mp3', '')
-                            recording_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+                                stat = os.stat(file_path)
+                            except OSError:
+                                continue
                             
-                            recording = Recording.query.filter_by(
-                                station_id=station.id,
-                                date=recording_date,
-                                hour=hour
-                            ).first()
+                            # Deze versie is al geüpload, geen HEAD request nodig
+                            if journal.is_uploaded(file_path, stat.st_size, stat.st_mtime):
+                                continue
                             
-                            if not recording:
-                                recording = Recording(
-                                    station_id=station.id,
-                                    date=recording_date,
-                                    hour=hour,
-                                    filepath=f"opnames/{station_name}/{date_str}/{hour_file}",
-                                    recording_type='scheduled',
-                                    s3_uploaded=True
-                                )
-                                db.session.add(recording)
-                                db.session.commit()
-                            elif not recording.s3_uploaded:
-                                recording.s3_uploaded = True
-                                db.session.commit()
-                
+                            station_name, date_str, hour_file = parts[0], parts[1], parts[2]
+                            # S3 key: opnames/station/date/hour.mp3
+                            s3_key = f"opnames/{station_name}/{date_str}/{hour_file}"
+                            job = UploadJob(station_name, date_str, hour_file, file_path, s3_key)
+                            job.size, job.mtime = stat.st_size, stat.st_mtime
+                            upload_jobs.append(job)
+            
+            recording_batch = RecordingBatch(batch_size=100)
+            skip_silent = app.config.get('SKIP_SILENT_UPLOADS', False)
+            
+            def analyse_before_upload(s3_client, job):
+                # Eén keer decoderen in de upload workers: stilte-analyse en waveform peaks
+                job.analysis = analyse_recording(
+                    job.local_path,
+                    app.config['FFMPEG_PATH'],
+                    threshold_db=app.config.get('SILENCE_THRESHOLD_DB', -50),
+                    min_seconds=app.config.get('SILENCE_MIN_SECONDS', 10)
+                )
+                if skip_silent and job.analysis and job.analysis['silence_ratio'] >= ALL_SILENT_RATIO:
+                    return False
+                return True
+            
+            def remove_local(job):
+                # Verwijder direct als LOCAL_FILE_RETENTION op 0 staat, maar alleen de versie die in het journaal staat
+                if app.config.get('LOCAL_FILE_RETENTION', 0) != 0:
+                    return
+                try:
+                    stat = os.stat(job.local_path)
+                    if journal.is_uploaded(job.local_path, stat.st_size, stat.st_mtime):
+                        os.remove(job.local_path)
+                        logger.info(f"🗑️ Direct verwijderd na upload: {job.local_path}")
                 except Exception as e:
-                    logger.error(f"Error uploading {file_path}: {e}")
+                    logger.error(f"Fout bij direct verwijderen na upload: {e}")
             
-            # 3. List files on S3 and sync with database
-            try:
-                # Use paginator to handle large lists
-                paginator = s3_client.get_paginator('list_objects_v2')
-                s3_files = []
+            def register_recording(job, duration=None, uploaded=True):
+                # Registreren in de database (per batch, één commit)
+                analysis = job.analysis
+                try:
+                    recording_batch.add(
+                        job.station_name,
+                        datetime.strptime(job.date_str, '%Y-%m-%d').date(),
+                        job.hour_file.replace('.mp3', ''),
+                        job.s3_key,
+                        size_bytes=job.size if uploaded else None,
+                        etag=job.etag,
+                        duration_seconds=int(round(duration)) if duration else None,
+                        silence_ratio=analysis['silence_ratio'] if analysis else None,
+                        silence_gaps=json.dumps(analysis['gaps']) if analysis else None,
+                        s3_uploaded=uploaded
+                    )
+                except Exception as e:
+                    logger.error(f"Error registering uploaded recordings: {e}")
+            
+            def register_upload(job):
+                analysis = job.analysis
+                if job.status == 'skipped' and analysis is not None:
+                    # Helemaal stil uur: niet naar S3, wel als afgehandeld in het journaal en als
+                    # niet-geüploade Recording met de stilte-analyse in de database
+                    journal.record(job.local_path, job.s3_key, job.size, job.mtime)
+                    _alert_silence(job, analysis, uploaded=False)
+                    remove_local(job)
+                    register_recording(job, duration=analysis['duration'], uploaded=False)
+                    return
+                if job.status != 'uploaded':
+                    return
+                logger.info(f"⬆️ Uploaded {job.local_path} to s3://{app.config['WASABI_BUCKET']}/{job.s3_key}")
+                journal.record(job.local_path, job.s3_key, job.size, job.mtime, job.etag)
                 
-                for page in paginator.paginate(Bucket=app.config['WASABI_BUCKET'], Prefix='opnames/'):
-                    if 'Contents' in page:
-                        for obj in page['Contents']:
-                            s3_files.append(obj['Key'])
+                # Duur en seek index bepalen zolang het bestand nog lokaal staat
+                index = build_frame_index(job.local_path)
+                duration = index.duration if index else estimate_duration(job.local_path)
+                if index is not None and os.path.getsize(job.local_path) == job.size:
+                    index.etag = job.etag
+                    try:
+                        upload_frame_index(s3_client, job.s3_key, index)
+                    except Exception as e:
+                        logger.error(f"Error uploading frame index for {job.s3_key}: {e}")
                 
-                # Create temporary files for comparison
-                with tempfile.NamedTemporaryFile(mode='w+', delete=False) as tmp_remote, \
-                    tempfile.NamedTemporaryFile(mode='w+', delete=False) as tmp_db:
-                    
-                    # Write S3 files to temp file
-                    for s3_path in sorted(s3_files):
-                        tmp_remote.write(f"{s3_path}\n")
-                    
-                    # Write DB records to temp file
-                    for rec in Recording.query.all():
-                        tmp_db.write(f"{rec.filepath}\n")
-                    
-                    tmp_remote.flush()
-                    tmp_db.flush()
-                    
-                    # Re-open for reading
-                    tmp_remote.close()
-                    tmp_db.close()
-                    
-                    # Use comm to find differences
-                    with tempfile.NamedTemporaryFile(mode='w+', delete=False) as tmp_added, \
-                        tempfile.NamedTemporaryFile(mode='w+', delete=False) as tmp_removed:
-                        
-                        # Find files in S3 but not in DB (to add)
-                        subprocess.run(
-                            f"comm -13 {tmp_db.name} {tmp_remote.name}",
-                            shell=True,
-                            stdout=tmp_added,
-                            check=True
-                        )
-                        
-                        # Find files in DB but not in S3 (to remove)
-                        subprocess.run(
-                            f"comm -23 {tmp_db.name} {tmp_remote.name}",
-                            shell=True,
-                            stdout=tmp_removed,
-                            check=True
-                        )
-                        
-                        tmp_added.flush()
-                        tmp_removed.flush()
-                        
-                        # Re-open for reading
-                        tmp_added.close()
-                        tmp_removed.close()
-                        
-                        # Process files to add
-                        with open(tmp_added.name, 'r') as f:
-                            for s3_path in f:
-                                s3_path = s3_path.strip()
-                                if not s3_path:
-                                    continue
-                                
-                                # Parse path: opnames/station/date/hour.mp3
-                                parts = s3_path.split('/')
-                                if len(parts) >= 4:
-                                    station_name = parts[1]
-                                    date_str = parts[2]
-                                    hour_file = parts[3]
-                                    
-                                    station = Station.query.filter_by(name=station_name).first()
-                                    if station:
-                                        hour = hour_file.replace('.mp3', '')
-                                        
-                                        try:
-                                            recording_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-                                            
-                                            recording = Recording(
-                                                station_id=station.id,
-                                                date=recording_date,
-                                                hour=hour,
-                                                filepath=s3_path,
-                                                recording_type='scheduled',
-                                                s3_uploaded=True
-                                            )
-                                            db.session.add(recording)
-                                            logger.info(f"Added {s3_path} to database")
-                                        except ValueError:
-                                            logger.error(f"Invalid date format in {s3_path}")
-                        
-                        # Process files to remove
-                        with open(tmp_removed.name, 'r') as f:
-                            for db_path in f:
-                                db_path = db_path.strip()
-                                if not db_path:
-                                    continue
-                                
-                                # Find and delete the recording
-                                recording = Recording.query.filter_by(filepath=db_path).first()
-                                if recording:
-                                    db.session.delete(recording)
-                                    logger.info(f"Removed {db_path} from database")
-                        
-                        db.session.commit()
+                if analysis is not None:
+                    _alert_silence(job, analysis, uploaded=True)
                 
-                # Delete temporary files
-                for tmp_file in [tmp_remote.name, tmp_db.name, tmp_added.name, tmp_removed.name]:
+                # Waveform overzicht voor de player (uit dezelfde decodering als de stilte-analyse)
+                peaks = analysis['peaks'] if analysis else None
+                if peaks is not None:
                     try:
-                        os.unlink(tmp_file)
-                    except Exception:
-                        pass
+                        upload_peaks(s3_client, job.s3_key, peaks)
+                    except Exception as e:
+                        logger.error(f"Error uploading waveform peaks for {job.s3_key}: {e}")
+                
+                remove_local(job)
+                register_recording(job, duration=duration)
             
+            # 2. Upload files to S3 in parallel, fair across stations
+            uploader = ParallelUploader(
+                s3_client,
+                app.config['WASABI_BUCKET'],
+                concurrency=concurrency,
+                chunk_size_mb=app.config.get('UPLOAD_CHUNK_SIZE_MB', 16),
+                part_concurrency=part_concurrency,
+                compute_etags=True
+            )
+            stats = uploader.run(upload_jobs, should_upload=analyse_before_upload, on_complete=register_upload)
+            try:
+                recording_batch.flush()
+            except Exception as e:
+                logger.error(f"Error registering uploaded recordings: {e}")
+            logger.info(f"⬆️ Upload klaar: {stats}")
+            
+            # 3. List changed date prefixes on S3 and sync with database
+            # (volledige sync draait 's nachts in full_s3_reconcile)
+            try:
+                uploaded_prefixes = {f"opnames/{job.station_name}/{job.date_str}/" for job in upload_jobs if job.status == 'uploaded'}
+                incremental_sync(s3_client, app.config['WASABI_BUCKET'], extra_prefixes=uploaded_prefixes)
             except Exception as e:
                 logger.error(f"Error synchronizing database with S3: {e}")
             
@@ -601,10 +849,43 @@ def upload_and_remove():
                     logger.error(f"Error removing old file {file_path}: {e}")
             
             logger.info(f"🧹 Removed {removed_count} local files older than {retention_hours} hours")
+            
+            # Journaal opschonen voor bestanden die lokaal niet meer bestaan
+            journal.prune(path for path in mp3_files if os.path.exists(path))
     
     except Exception as e:
         logger.error(f"Error in upload_and_remove task: {e}")
 
+def _alert_silence(job, analysis, uploaded):
+    """Alert when a finished recording is (largely) silent"""
+    ratio = analysis['silence_ratio']
+    if ratio < app.config.get('SILENCE_ALERT_RATIO', 0.1):
+        return
+    SILENT_RECORDINGS.inc(1, job.station_name)
+    hour = job.hour_file.replace('.mp3', '')
+    if not uploaded:
+        logger.error(f"🚨 {job.station_name}: {job.date_str} {hour}:00 is helemaal stil, niet geüpload")
+        return
+    longest = max((end - start for start, end in analysis['gaps']), default=0)
+    logger.error(f"🚨 {job.station_name}: {job.date_str} {hour}:00 bevat {round(ratio * 100)}% stilte "
+                 f"({len(analysis['gaps'])} stiltes, langste {int(longest)}s)")
+
+def full_s3_reconcile():
+    """Nightly full reconciliation of the Recording table with the whole opnames/ prefix"""
+    logger.info("🔄 Starting full S3 reconcile")
+    
+    try:
+        with app.app_context():
+            if not app.config.get('WASABI_BUCKET'):
+                logger.error("Ontbrekende Wasabi configuratie, S3 sync overgeslagen.")
+                return
+            
+            s3_client = initialize_s3_client()
+            sync_recordings_with_s3(s3_client, app.config['WASABI_BUCKET'])
+    
+    except Exception as e:
+        logger.error(f"Error in full S3 reconcile: {e}")
+
 def download_omroeplvc():
     """Download recordings from Omroep Land van Cuijk
     
@@ -724,20 +1005,24 @@ def resolve_stream_url(url):
 
 def generate_output_pattern(station_name):
     """Generate the output pattern for ffmpeg segmentation"""
-    # Format: {RECORDINGS_DIR}/StationName/YYYY-MM-DD/%H.mp3
-    
-    # For 00:00, use today's date; for all other hours, use the date from 1 hour ago
-    current_hour = datetime.now().hour
-    if current_hour == 0:
-        target_date = date.today()
-    else:
-        target_date = (datetime.now() - timedelta(hours=1)).date()
-    
-    directory = os.path.join(
-        app.config['RECORDINGS_DIR'],
-        station_name,
-        target_date.strftime('%Y-%m-%d')
-    )
-    
-    os.makedirs(directory, exist_ok=True)
-    return os.path.join(directory, '%H.mp3')
+    # Format: {RECORDINGS_DIR}/.incoming/StationName/%Y-%m-%d_%H.mp3
+    # Geen datummap in het patroon: ffmpeg loopt door over uur- en daggrenzen,
+    # finalize_recordings() zet de segmenten in StationName/YYYY-MM-DD/HH.mp3
+    return staging_pattern(app.config['RECORDINGS_DIR'], station_name)
+
+def finalize_recordings(stations=None, min_age=10):
+    """Move finished segments from the staging area to StationName/YYYY-MM-DD/HH.mp3"""
+    try:
+        finalized = finalize_segments(
+            app.config['RECORDINGS_DIR'],
+            busy_files=supervisor.active_files(),
+            skip_files=supervisor.lead_in_files(),
+            min_age=min_age,
+            stations=stations
+        )
+        if finalized:
+            logger.info(f"📁 {len(finalized)} segmenten afgerond")
+        return finalized
+    except Exception as e:
+        logger.error(f"Error finalizing segments: {e}")
+        return []
@@ -0,0 +1,345 @@
+"""
+Eenvoudige in-process metrics in het Prometheus tekstformaat.
+
+Counters, gauges en histogrammen worden per proces in het geheugen
+bijgehouden (een dict update per meting, geen externe dependency). Omdat
+gunicorn meerdere workers draait en de recorders in het scheduler proces
+zitten, schrijft elk proces periodiek een snapshot naar METRICS_DIR; /metrics
+telt de snapshots van alle levende processen bij elkaar op.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+PUBLISH_INTERVAL = 15  # seconden
+STALE_AFTER = 60  # snapshots van gestopte processen negeren
+REMOVE_AFTER = 3600  # en na een uur opruimen
+
+
+class Metric:
+    """Base class: one named metric with a fixed set of label names"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        REGISTRY.register(self)
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} verwacht labels {self.labelnames}")
+        return tuple(str(value) for value in labels)
+
+    def samples(self):
+        """(label values, value) pairs for the snapshot"""
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, *labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, *labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_function(self, function):
+        """Compute the value(s) at collection time: a number, or a dict of label tuple -> value"""
+        self._function = function
+
+    def samples(self):
+        if self._function is None:
+            return super().samples()
+        try:
+            result = self._function()
+        except Exception as e:
+            logger.error(f"Error collecting metric {self.name}: {e}")
+            return []
+        if isinstance(result, dict):
+            return [[list(self._key(key if isinstance(key, tuple) else (key,))), value] for key, value in result.items()]
+        return [[[], result]]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # Eén teller per bucket plus +Inf, dan sum en count
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[len(self.buckets)] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def time(self, *labels):
+        """Context manager that observes the elapsed time of a block"""
+        return _Timer(self, labels)
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+
+class Registry:
+    """All metrics of this process"""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+
+    def dump(self):
+        """JSON-serialisable snapshot of every metric"""
+        return {
+            name: {
+                'kind': metric.kind,
+                'help': metric.documentation,
+                'labelnames': list(metric.labelnames),
+                'buckets': list(getattr(metric, 'buckets', ())),
+                'samples': metric.samples()
+            }
+            for name, metric in self._metrics.items()
+        }
+
+
+REGISTRY = Registry()
+
+
+def _snapshot_path(directory, pid=None):
+    return os.path.join(directory, f"metrics-{pid or os.getpid()}.json")
+
+
+def publish(directory):
+    """Write this process' snapshot for the other processes"""
+    os.makedirs(directory, exist_ok=True)
+    path = _snapshot_path(directory)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'updated_at': time.time(), 'metrics': REGISTRY.dump()}, f)
+    os.replace(tmp_path, path)
+
+
+def start_publisher(directory, interval=PUBLISH_INTERVAL):
+    """Publish this process' snapshot every `interval` seconds in a daemon thread"""
+    def _loop():
+        while True:
+            try:
+                publish(directory)
+            except Exception as e:
+                logger.error(f"Error publishing metrics: {e}")
+            time.sleep(interval)
+
+    threading.Thread(target=_loop, name='metrics-publisher', daemon=True).start()
+
+
+def _collect(directory):
+    """Snapshots of all live processes, with this process' own data taken live"""
+    snapshots = [REGISTRY.dump()]
+    own_path = _snapshot_path(directory)
+    now = time.time()
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        names = []
+    for name in names:
+        path = os.path.join(directory, name)
+        if not (name.startswith('metrics-') and name.endswith('.json')) or path == own_path:
+            continue
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        age = now - data.get('updated_at', 0)
+        if age > REMOVE_AFTER:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        if age <= STALE_AFTER:
+            snapshots.append(data.get('metrics', {}))
+    return snapshots
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render(directory):
+    """All metrics of all processes in the Prometheus text exposition format"""
+    merged = {}
+    for snapshot in _collect(directory):
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {**metric, 'values': {}})
+            for labels, value in metric['samples']:
+                key = tuple(labels)
+                if key not in target['values']:
+                    target['values'][key] = list(value) if isinstance(value, list) else value
+                elif isinstance(value, list):
+                    target['values'][key] = [a + b for a, b in zip(target['values'][key], value)]
+                else:
+                    target['values'][key] += value
+
+    lines = []
+    for name in sorted(merged):
+        metric = merged[name]
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        labelnames = metric['labelnames']
+        for labels, value in sorted(metric['values'].items()):
+            if metric['kind'] != 'histogram':
+                lines.append(f"{name}{_labels(labelnames, labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(list(metric['buckets']) + [float('inf')], value[:-2]):
+                cumulative += count
+                le = f'le="{_number(float(bound))}"'
+                lines.append(f"{name}_bucket{_labels(labelnames, labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labelnames, labels)} {_number(value[-2])}")
+            lines.append(f"{name}_count{_labels(labelnames, labels)} {value[-1]}")
+    return '\n'.join(lines) + '\n'
+
+
+# Recorders (scheduler proces)
+RECORDERS_ACTIVE = Gauge('radiologger_recorders_active', 'Number of running ffmpeg recorders')
+RECORDED_BYTES = Counter('radiologger_recorded_bytes_total', 'Bytes written by the recorders', ['station'])
+RECORDER_RESTARTS = Counter('radiologger_recorder_restarts_total', 'Recorder restarts by the watchdog', ['station'])
+SILENT_RECORDINGS = Counter('radiologger_silent_recordings_total', 'Recordings above the silence alert ratio', ['station'])
+
+# Uploads
+UPLOAD_QUEUE = Gauge('radiologger_upload_queue', 'Files waiting to be uploaded in the current run')
+UPLOADED_BYTES = Counter('radiologger_upload_bytes_total', 'Bytes uploaded to S3')
+UPLOADS = Counter('radiologger_uploads_total', 'Upload jobs by result', ['status'])
+UPLOAD_RATE = Gauge('radiologger_upload_bytes_per_second', 'Throughput of the last upload run')
+
+# S3 en synchronisatie
+S3_REQUEST_SECONDS = Histogram('radiologger_s3_request_seconds', 'S3 API call latency', ['operation'])
+RECONCILE_SECONDS = Histogram('radiologger_s3_reconcile_seconds', 'Duration of S3/database reconciliation', ['mode'],
+                              buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600))
+
+# Database en web
+DB_QUERY_SECONDS = Histogram('radiologger_db_query_seconds', 'Database statement latency', ['statement'])
+HTTP_REQUEST_SECONDS = Histogram('radiologger_http_request_seconds', 'HTTP request latency', ['blueprint', 'method'])
+HTTP_REQUESTS = Counter('radiologger_http_requests_total', 'HTTP requests', ['blueprint', 'status'])
+
+
+def _statement_kind(statement):
+    word = statement.lstrip().split(None, 1)[0].upper() if statement and statement.strip() else 'OTHER'
+    return word if word in ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH') else 'OTHER'
+
+
+def init_app(app):
+    """Hook request, database and publication metrics into the Flask app"""
+    from flask import g, request
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            blueprint = request.blueprint or 'app'
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, blueprint, request.method)
+            HTTP_REQUESTS.inc(1, blueprint, f"{response.status_code // 100}xx")
+        return response
+
+    # Starttijd op de execution context, niet op de verbinding: een mislukt statement
+    # (geen after_cursor_execute) laat zo niets achter
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._metrics_query_start = time.perf_counter()
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, '_metrics_query_start', None)
+        if start is not None:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - start, _statement_kind(statement))
+
+    start_publisher(app.config['METRICS_DIR'])
+
+
+def instrument_s3_client(client):
+    """Time every S3 API call of a boto3 client"""
+    def _before_call(model, context, **kwargs):
+        context['metrics_start'] = time.perf_counter()
+
+    def _after_call(model, context, **kwargs):
+        start = context.get('metrics_start')
+        if start is not None:
+            S3_REQUEST_SECONDS.observe(time.perf_counter() - start, model.name)
+
+    client.meta.events.register('before-call.s3', _before_call)
+    client.meta.events.register('after-call.s3', _after_call)
+    return client
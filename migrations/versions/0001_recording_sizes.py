@@ -0,0 +1,49 @@
+"""Recording grootte, duur en etag plus station_day_stats rollup
+
+Revision ID: 0001_recording_sizes
+Revises: 
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_recording_sizes'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Tabellen kunnen al door db.create_all() of init_db.py zijn aangemaakt
+    inspector = sa.inspect(op.get_bind())
+    columns = {column['name'] for column in inspector.get_columns('recording')}
+
+    with op.batch_alter_table('recording') as batch_op:
+        if 'size_bytes' not in columns:
+            batch_op.add_column(sa.Column('size_bytes', sa.BigInteger(), nullable=True))
+        if 'duration_seconds' not in columns:
+            batch_op.add_column(sa.Column('duration_seconds', sa.Integer(), nullable=True))
+        if 'etag' not in columns:
+            batch_op.add_column(sa.Column('etag', sa.String(length=64), nullable=True))
+
+    if not inspector.has_table('station_day_stats'):
+        op.create_table(
+            'station_day_stats',
+            sa.Column('station_id', sa.Integer(), sa.ForeignKey('station.id'), nullable=False),
+            sa.Column('date', sa.Date(), nullable=False),
+            sa.Column('recording_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('total_bytes', sa.BigInteger(), nullable=False, server_default='0'),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('station_id', 'date')
+        )
+
+
+def downgrade():
+    op.drop_table('station_day_stats')
+    with op.batch_alter_table('recording') as batch_op:
+        batch_op.drop_column('etag')
+        batch_op.drop_column('duration_seconds')
+        batch_op.drop_column('size_bytes')
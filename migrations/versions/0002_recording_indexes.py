@@ -0,0 +1,49 @@
+"""Samengestelde indexen en unieke constraint op recording
+
+Revision ID: 0002_recording_indexes
+Revises: 0001_recording_sizes
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_recording_indexes'
+down_revision = '0001_recording_sizes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    indexes = {index['name'] for index in inspector.get_indexes('recording')}
+    constraints = {constraint['name'] for constraint in inspector.get_unique_constraints('recording')}
+
+    if 'ix_recording_date_station_hour' not in indexes:
+        op.create_index('ix_recording_date_station_hour', 'recording', ['date', 'station_id', 'hour'])
+    if 'ix_recording_station_date' not in indexes:
+        op.create_index('ix_recording_station_date', 'recording', ['station_id', 'date'])
+
+    if 'uq_recording_station_date_hour_type' not in constraints | indexes:
+        # Dubbele opnames opruimen (oudste record houden) voordat de constraint erop kan
+        op.execute("""
+            DELETE FROM recording
+            WHERE id NOT IN (
+                SELECT MIN(id) FROM recording
+                GROUP BY station_id, date, hour, recording_type
+            )
+        """)
+        with op.batch_alter_table('recording') as batch_op:
+            batch_op.create_unique_constraint(
+                'uq_recording_station_date_hour_type',
+                ['station_id', 'date', 'hour', 'recording_type']
+            )
+
+
+def downgrade():
+    with op.batch_alter_table('recording') as batch_op:
+        batch_op.drop_constraint('uq_recording_station_date_hour_type', type_='unique')
+    op.drop_index('ix_recording_station_date', table_name='recording')
+    op.drop_index('ix_recording_date_station_hour', table_name='recording')
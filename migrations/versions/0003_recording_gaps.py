@@ -0,0 +1,41 @@
+"""Tabel recording_gap voor onderbrekingen in opnames
+
+Revision ID: 0003_recording_gaps
+Revises: 0002_recording_indexes
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_recording_gaps'
+down_revision = '0002_recording_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table('recording_gap'):
+        return
+
+    op.create_table(
+        'recording_gap',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('station_id', sa.Integer(), sa.ForeignKey('station.id'), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=False),
+        sa.Column('ended_at', sa.DateTime(), nullable=False),
+        sa.Column('seconds', sa.Integer(), nullable=False),
+        sa.Column('reason', sa.String(length=20), nullable=False),
+        sa.Column('restarts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), nullable=True)
+    )
+    op.create_index('ix_recording_gap_station_date', 'recording_gap', ['station_id', 'date'])
+
+
+def downgrade():
+    op.drop_index('ix_recording_gap_station_date', table_name='recording_gap')
+    op.drop_table('recording_gap')
@@ -0,0 +1,33 @@
+"""Stilte-analyse per opname (silence_ratio en stiltes)
+
+Revision ID: 0004_recording_silence
+Revises: 0003_recording_gaps
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_recording_silence'
+down_revision = '0003_recording_gaps'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    columns = {column['name'] for column in inspector.get_columns('recording')}
+
+    with op.batch_alter_table('recording') as batch_op:
+        if 'silence_ratio' not in columns:
+            batch_op.add_column(sa.Column('silence_ratio', sa.Float(), nullable=True))
+        if 'silence_gaps' not in columns:
+            batch_op.add_column(sa.Column('silence_gaps', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('recording') as batch_op:
+        batch_op.drop_column('silence_gaps')
+        batch_op.drop_column('silence_ratio')
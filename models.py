@@ -63,6 +63,14 @@ class DennisStation(db.Model):
 
 # Recording model
 class Recording(db.Model):
+    __table_args__ = (
+        # Dagoverzicht: WHERE date = ? [AND station_id = ?] ORDER BY ..., hour
+        db.Index('ix_recording_date_station_hour', 'date', 'station_id', 'hour'),
+        # Per station: uploader lookups, tellingen en verwijderen van een station
+        db.Index('ix_recording_station_date', 'station_id', 'date'),
+        db.UniqueConstraint('station_id', 'date', 'hour', 'recording_type', name='uq_recording_station_date_hour_type'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     station_id = db.Column(db.Integer, db.ForeignKey('station.id'), nullable=False)
     date = db.Column(db.Date, nullable=False)
@@ -71,11 +79,48 @@ class Recording(db.Model):
     program_title = db.Column(db.String(255), nullable=True)
     recording_type = db.Column(db.String(20), default='scheduled')  # scheduled, manual, dennis
     s3_uploaded = db.Column(db.Boolean, default=False)
+    size_bytes = db.Column(db.BigInteger, nullable=True)  # Grootte van het object in S3
+    duration_seconds = db.Column(db.Integer, nullable=True)
+    etag = db.Column(db.String(64), nullable=True)
+    silence_ratio = db.Column(db.Float, nullable=True)  # Aandeel stilte (0-1), bepaald vóór de upload
+    silence_gaps = db.Column(db.Text, nullable=True)  # JSON lijst van [begin, eind] in seconden
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def __repr__(self):
         return f'<Recording {self.filepath}>'
 
+# Opslag per station per dag, bijgewerkt bij upload en S3 sync
+class StationDayStats(db.Model):
+    station_id = db.Column(db.Integer, db.ForeignKey('station.id'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    recording_count = db.Column(db.Integer, default=0, nullable=False)
+    total_bytes = db.Column(db.BigInteger, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<StationDayStats {self.station_id} {self.date}>'
+
+# Onderbreking in een opname (recorder vastgelopen, gestopt of niet te starten)
+class RecordingGap(db.Model):
+    __table_args__ = (
+        db.Index('ix_recording_gap_station_date', 'station_id', 'date'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    station_id = db.Column(db.Integer, db.ForeignKey('station.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)  # Dag waarop de onderbreking begon
+    started_at = db.Column(db.DateTime, nullable=False)
+    ended_at = db.Column(db.DateTime, nullable=False)
+    seconds = db.Column(db.Integer, nullable=False)
+    reason = db.Column(db.String(20), nullable=False)  # stalled, died
+    restarts = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    station = db.relationship('Station')
+    
+    def __repr__(self):
+        return f'<RecordingGap {self.station_id} {self.started_at} {self.seconds}s>'
+
 # Job model for logging scheduled jobs
 class ScheduledJob(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -92,6 +137,15 @@ class ScheduledJob(db.Model):
     def __repr__(self):
         return f'<ScheduledJob {self.job_id} for {self.station.name}>'
 
+# Key/value state for background tasks (bijv. S3 sync watermark)
+class SyncState(db.Model):
+    key = db.Column(db.String(100), primary_key=True)
+    value = db.Column(db.String(255), nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<SyncState {self.key}={self.value}>'
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
@@ -0,0 +1,423 @@
+"""
+Eenvoudige MP3 frame parser (pure Python, geen ffmpeg nodig).
+
+Wordt gebruikt om de duur van opnames te bepalen bij het uploaden. Leest de
+MPEG audio frame headers (MPEG 1/2/2.5, Layer III) en een eventuele Xing/Info
+header voor VBR bestanden.
+
+Daarnaast bouwt het een frame index: per seconde de byte offset van het
+eerste frame dat op of na die seconde begint. Die index gaat als klein
+sidecar object (<key>.idx) mee naar S3, zodat een fragment met één ranged
+GET van precies de benodigde frames opgehaald kan worden.
+"""
+
+import os
+import sys
+import mmap
+import math
+import struct
+from array import array
+
+# Bitrates in kbps per (MPEG versie 1 of 2/2.5), Layer III
+BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 0],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160, 0],
+}
+
+# Samplerates per versie bits (00 = 2.5, 10 = 2, 11 = 1)
+SAMPLE_RATES = {
+    3: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    0: [11025, 12000, 8000],
+}
+
+HEADER_SCAN_BYTES = 64 * 1024
+
+
+def parse_frame_header(data, offset=0):
+    """Parse the 4-byte MPEG Layer III frame header at offset; None if not a valid header"""
+    if offset + 4 > len(data):
+        return None
+    b0, b1, b2, b3 = data[offset], data[offset + 1], data[offset + 2], data[offset + 3]
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+
+    version_bits = (b1 >> 3) & 0x03
+    layer_bits = (b1 >> 1) & 0x03
+    if version_bits == 1 or layer_bits != 1:  # gereserveerd / geen Layer III
+        return None
+
+    bitrate_index = (b2 >> 4) & 0x0F
+    sample_rate_index = (b2 >> 2) & 0x03
+    if bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    is_mpeg1 = version_bits == 3
+    bitrate = BITRATES[1 if is_mpeg1 else 2][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version_bits][sample_rate_index]
+    padding = (b2 >> 1) & 0x01
+    samples_per_frame = 1152 if is_mpeg1 else 576
+    frame_length = (samples_per_frame // 8) * bitrate // sample_rate + padding
+    channel_mode = (b3 >> 6) & 0x03
+
+    return {
+        'mpeg1': is_mpeg1,
+        'bitrate': bitrate,
+        'sample_rate': sample_rate,
+        'samples_per_frame': samples_per_frame,
+        'frame_length': frame_length,
+        'mono': channel_mode == 3,
+    }
+
+
+def skip_id3v2(data):
+    """Return the offset of the first byte after an ID3v2 tag (0 if there is none)"""
+    if len(data) >= 10 and data[:3] == b'ID3':
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        footer = 10 if data[5] & 0x10 else 0
+        return 10 + size + footer
+    return 0
+
+
+def find_first_frame(data, start=0):
+    """Find the first valid frame, confirmed by a second header right after it"""
+    offset = start
+    while offset < len(data) - 4:
+        header = parse_frame_header(data, offset)
+        if header and header['frame_length'] > 0:
+            next_offset = offset + header['frame_length']
+            if next_offset + 4 > len(data) or parse_frame_header(data, next_offset):
+                return offset, header
+        offset += 1
+    return None, None
+
+
+def side_info_size(header):
+    """Size of the Layer III side information after the frame header"""
+    if header['mpeg1']:
+        return 17 if header['mono'] else 32
+    return 9 if header['mono'] else 17
+
+
+def xing_tag_offset(data, offset, header):
+    """Offset of a Xing/Info tag inside the frame at offset, or None"""
+    pos = offset + 4 + side_info_size(header)
+    if data[pos:pos + 4] in (b'Xing', b'Info'):
+        return pos
+    return None
+
+
+def read_xing_frames(data, offset, header):
+    """Number of frames from a Xing/Info header in the first frame, or None"""
+    pos = xing_tag_offset(data, offset, header)
+    if pos is None:
+        return None
+    flags = struct.unpack('>I', data[pos + 4:pos + 8])[0]
+    if flags & 0x1:
+        return struct.unpack('>I', data[pos + 8:pos + 12])[0]
+    return None
+
+
+def estimate_duration(path):
+    """Duration of an MP3 file in seconds (exact for Xing VBR and CBR files), or None"""
+    try:
+        file_size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            data = f.read(HEADER_SCAN_BYTES)
+    except OSError:
+        return None
+
+    start = skip_id3v2(data)
+    if start >= len(data):
+        return None
+    offset, header = find_first_frame(data, start)
+    if header is None:
+        return None
+
+    frames = read_xing_frames(data, offset, header)
+    if frames:
+        return frames * header['samples_per_frame'] / header['sample_rate']
+
+    audio_bytes = file_size - offset
+    return audio_bytes * 8 / header['bitrate']
+
+
+INDEX_MAGIC = b'RLFI'
+INDEX_VERSION = 2
+# magic, versie, aantal seconden, eerste frame, einde audio, duur in seconden
+INDEX_HEADER = struct.Struct('<4sB3xIIIf')
+# Versie 2: header van het eerste audio frame en lengte van de ETag van de opname
+INDEX_HEADER_V2 = struct.Struct('<4sB')
+
+XING_FLAGS = 0x7  # frames, bytes en TOC aanwezig
+XING_TOC_SIZE = 100
+
+
+def build_xing_frame(header_bytes, frame_count, audio_bytes, toc):
+    """A silent frame carrying a Xing header (frame count, byte count and seek TOC), or None"""
+    b0, b1, b2, b3 = header_bytes
+    b1 |= 0x01  # geen CRC, dan staat de Xing tag direct na de side info
+    for bitrate_index in range(1, 15):
+        # Bitrate zo kiezen dat het frame groot genoeg is; samplerate en kanalen blijven gelijk
+        candidate = bytes((b0, b1, (b2 & 0x0D) | (bitrate_index << 4), b3))
+        header = parse_frame_header(candidate)
+        if header is None:
+            return None
+        pos = 4 + side_info_size(header)
+        if header['frame_length'] >= pos + 16 + XING_TOC_SIZE:
+            break
+    else:
+        return None
+
+    frame = bytearray(header['frame_length'])
+    frame[0:4] = candidate
+    frame[pos:pos + 4] = b'Xing'
+    struct.pack_into('>III', frame, pos + 4, XING_FLAGS, frame_count, len(frame) + audio_bytes)
+    frame[pos + 16:pos + 16 + XING_TOC_SIZE] = bytes(toc)
+    return bytes(frame)
+
+
+class FrameIndex:
+    """Byte offset of the first frame at or after every whole second of a recording"""
+
+    def __init__(self, offsets, first_frame, audio_end, duration, header=None, etag=None):
+        self.offsets = offsets
+        self.first_frame = first_frame
+        self.audio_end = audio_end
+        self.duration = duration
+        self.header = header  # 4 bytes van het eerste audio frame (versie 2)
+        self.etag = etag  # ETag van de opname waarvoor de index gebouwd is
+
+    @property
+    def audio_start(self):
+        """Offset of the first audio frame (after ID3 and Xing/Info frames)"""
+        return self.offsets[0]
+
+    def offset_at(self, second):
+        """Byte offset where playback of a whole second starts"""
+        second = min(max(int(second), 0), len(self.offsets) - 1)
+        return self.offsets[second]
+
+    def _position(self, seconds):
+        """Interpolated byte offset of a moment between two indexed seconds"""
+        whole = math.floor(seconds)
+        first = self.offset_at(whole)
+        if whole + 1 < len(self.offsets):
+            following = self.offsets[whole + 1]
+        else:
+            following = self.audio_end
+        return first + (following - first) * (seconds - whole)
+
+    def _timing(self):
+        """(sample_rate, samples_per_frame) from the first frame header, or None (version 1 index)"""
+        header = parse_frame_header(self.header) if self.header else None
+        if header is None:
+            return None
+        return header['sample_rate'], header['samples_per_frame']
+
+    def span(self, start, end):
+        """Exact frames for start..end: (first byte, end byte exclusive, skip, keep, start time, end time)
+
+        The byte range runs between indexed seconds (one ranged GET); skip is
+        the number of frames to drop at its start and keep the number of
+        frames to pass on after that (None: all), so the cut lands on the
+        frames containing start and end. Without a frame header (version 1
+        index) the cut is rounded to whole seconds.
+        """
+        timing = self._timing()
+        if timing is None:
+            start_second = min(max(math.floor(start), 0), len(self.offsets) - 1)
+            end_second = math.ceil(end)
+            if end_second < len(self.offsets):
+                return self.offsets[start_second], self.offsets[end_second], 0, None, start_second, end_second
+            return self.offsets[start_second], self.audio_end, 0, None, start_second, self.duration
+
+        sample_rate, samples_per_frame = timing
+        total_frames = int(round(self.duration * sample_rate / samples_per_frame))
+        first_frame = min(max(math.floor(start * sample_rate / samples_per_frame), 0), max(total_frames - 1, 0))
+        end_frame = min(max(math.ceil(end * sample_rate / samples_per_frame), first_frame + 1), total_frames)
+
+        # offsets[s] wijst naar frame ceil(s * sample_rate / samples_per_frame)
+        start_second = min(first_frame * samples_per_frame // sample_rate, len(self.offsets) - 1)
+        skip = first_frame - -(-start_second * sample_rate // samples_per_frame)
+        end_second = -(-end_frame * samples_per_frame // sample_rate)
+        end_byte = self.offsets[end_second] if end_second < len(self.offsets) else self.audio_end
+        return (self.offsets[start_second], end_byte, skip, end_frame - first_frame,
+                first_frame * samples_per_frame / sample_rate, end_frame * samples_per_frame / sample_rate)
+
+    def xing_frame(self, start=0, end=None):
+        """Xing frame with a 100-point seek TOC for the audio between start and end seconds, or None"""
+        if self.header is None:
+            return None
+        header = parse_frame_header(self.header)
+        if header is None:
+            return None
+        first, end_byte, skip, keep, start_time, end_time = self.span(start, self.duration if end is None else end)
+        # Bytes binnen een seconde zijn geïnterpoleerd; op geïndexeerde grenzen zijn ze exact
+        if skip:
+            first = self._position(start_time)
+        if end_time < self.duration and end_byte != self.audio_end:
+            end_byte = min(end_byte, self._position(end_time))
+        audio_bytes = int(round(end_byte - first))
+        seconds = end_time - start_time
+        if audio_bytes <= 0 or seconds <= 0:
+            return None
+
+        toc = []
+        for i in range(XING_TOC_SIZE):
+            position = self._position(start_time + seconds * i / XING_TOC_SIZE)
+            entry = min(255, max(0, int(256 * (position - first) / audio_bytes)))
+            toc.append(max(entry, toc[-1]) if toc else entry)
+        frame_count = keep if keep is not None else int(round(seconds * header['sample_rate'] / header['samples_per_frame']))
+        return build_xing_frame(self.header, frame_count, audio_bytes, toc)
+
+    def to_bytes(self):
+        offsets = array('I', self.offsets)
+        if sys.byteorder == 'big':
+            offsets.byteswap()
+        etag = (self.etag or '').encode('ascii')
+        header = INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(offsets),
+                                   self.first_frame, self.audio_end, self.duration)
+        extra = INDEX_HEADER_V2.pack(self.header or bytes(4), len(etag)) + etag
+        return header + extra + offsets.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Parse a serialised index; None when the data is not a (supported) index"""
+        if len(data) < INDEX_HEADER.size:
+            return None
+        magic, version, count, first_frame, audio_end, duration = INDEX_HEADER.unpack_from(data)
+        if magic != INDEX_MAGIC or version not in (1, 2):
+            return None
+        pos = INDEX_HEADER.size
+        header = etag = None
+        if version >= 2:
+            if len(data) < pos + INDEX_HEADER_V2.size:
+                return None
+            header, etag_length = INDEX_HEADER_V2.unpack_from(data, pos)
+            pos += INDEX_HEADER_V2.size
+            etag = data[pos:pos + etag_length].decode('ascii', 'replace') or None
+            pos += etag_length
+            if header == bytes(4):
+                header = None
+        offsets = array('I')
+        offsets.frombytes(data[pos:pos + count * offsets.itemsize])
+        if sys.byteorder == 'big':
+            offsets.byteswap()
+        if len(offsets) != count or count == 0:
+            return None
+        return cls(offsets, first_frame, audio_end, duration, header=header, etag=etag)
+
+
+def trim_frames(chunks, skip=0, keep=None):
+    """Yield the bytes of a frame-aligned MP3 stream without its first `skip` frames, stopping after `keep` frames"""
+    headers = {}
+    carry = b''
+    frame = 0
+    for chunk in chunks:
+        data = carry + chunk if carry else chunk
+        size = len(data)
+        pos = 0
+        out_start = None
+        while pos + 4 <= size:
+            raw = data[pos:pos + 4]
+            header = headers.get(raw)
+            if header is None:
+                header = parse_frame_header(raw)
+                if header is None or header['frame_length'] <= 0:
+                    # Geen frame: niets doorgeven en naar de volgende sync zoeken
+                    if out_start is not None:
+                        yield data[out_start:pos]
+                        out_start = None
+                    found = data.find(b'\xff', pos + 1)
+                    pos = found if found >= 0 else size
+                    continue
+                headers[raw] = header
+            frame_end = pos + header['frame_length']
+            if frame_end > size:
+                break
+            if frame >= skip:
+                if out_start is None:
+                    out_start = pos
+                if keep is not None and frame + 1 - skip >= keep:
+                    yield data[out_start:frame_end]
+                    return
+            frame += 1
+            pos = frame_end
+        if out_start is not None and pos > out_start:
+            yield data[out_start:pos]
+        carry = data[pos:]
+
+
+def _resync(data, pos, size):
+    """Next offset with a valid frame header confirmed by the following one, or None"""
+    while True:
+        pos = data.find(b'\xff', pos)
+        if pos < 0 or pos + 4 > size:
+            return None
+        header = parse_frame_header(data, pos)
+        if header and header['frame_length'] > 0:
+            next_offset = pos + header['frame_length']
+            if next_offset + 4 > size or parse_frame_header(data, next_offset):
+                return pos
+        pos += 1
+
+
+def build_frame_index(path):
+    """Walk every frame of an MP3 file and build its FrameIndex; None if there are no frames"""
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        return None
+
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        if size < 4:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = skip_id3v2(data[:10])
+            if start >= size:
+                return None
+            pos, header = find_first_frame(data[start:start + HEADER_SCAN_BYTES])
+            if header is None:
+                return None
+            pos += start
+            first_frame = pos
+
+            # Een Xing/Info frame bevat geen audio
+            if xing_tag_offset(data, pos, header) is not None:
+                pos += header['frame_length']
+
+            sample_rate = header['sample_rate']
+            offsets = array('I')
+            first_header = None
+            samples = 0
+            audio_end = pos
+            headers = {}
+            while pos + 4 <= size:
+                raw = data[pos:pos + 4]
+                header = headers.get(raw)
+                if header is None:
+                    header = parse_frame_header(raw)
+                    if header is None or header['frame_length'] <= 0:
+                        pos = _resync(data, pos + 1, size)
+                        if pos is None:
+                            break
+                        continue
+                    headers[raw] = header
+
+                frame_end = pos + header['frame_length']
+                if frame_end > size:
+                    break  # afgebroken laatste frame
+                if first_header is None:
+                    first_header = raw
+                # Alle seconden die op of vóór het begin van dit frame vallen wijzen hierheen
+                while len(offsets) * sample_rate <= samples:
+                    offsets.append(pos)
+                samples += header['samples_per_frame']
+                audio_end = frame_end
+                pos = frame_end
+
+    if not offsets:
+        return None
+    return FrameIndex(offsets, first_frame, audio_end, samples / sample_rate, header=first_header)
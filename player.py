@@ -6,16 +6,18 @@ from datetime import datetime, date, timedelta
 from urllib.parse import quote as url_quote
 import os
 import subprocess
-import boto3
 import tempfile
 import logging
-import requests
 from io import BytesIO
-from botocore.exceptions import ClientError
+from storage import generate_presigned_url, load_frame_index, forget_frame_index, load_peaks
+from waveform import PEAKS_PER_SECOND
+from audio_proxy import stream_s3_object, stream_indexed_s3_object, stream_s3_fragment, stream_http_url, IndexOutdated
 
 player_bp = Blueprint('player', __name__)
 logger = logging.getLogger(__name__)
 
+STREAM_CHUNK_SIZE = 256 * 1024
+
 @player_bp.route('/list_recordings')
 @login_required
 def list_recordings():
@@ -46,6 +48,8 @@ def list_recordings():
     dennis_stations = DennisStation.query.filter_by(visible_in_logger=True).order_by(DennisStation.name).all()
     
     # Query recordings based on filters
+    # Gebruikt ix_recording_date_station_hour (date, station_id, hour): een index range scan
+    # op de dag (en eventueel het station), daarna alleen een sort op de paar rijen van die dag
     query = Recording.query.filter_by(date=filter_date)
     if selected_station != 'all' and not selected_station.startswith('dennis_'):
         try:
@@ -91,6 +95,45 @@ def list_recordings():
                           selected_station=selected_station,
                           date_nav=date_nav)
 
+def resolve_cloudpath(cloudpath):
+    """Map a cloudpath to its source: an S3 key for own recordings or the Dennis URL"""
+    if cloudpath.startswith('dennis/'):
+        # Extract folder, date, hour from dennis/folder/date/hour.mp3
+        parts = cloudpath.split('/')
+        if len(parts) < 4:
+            raise ValueError("Ongeldig Dennis cloudpath formaat")
+        
+        folder = parts[1]
+        date_str = parts[2]
+        hour = parts[3].replace('.mp3', '')
+        return {
+            'is_dennis': True,
+            'url': f"{app.config['DENNIS_API_URL']}{folder}/{folder}-{date_str}-{hour}.mp3",
+            'filename': f"{folder}-{date_str}-{hour}.mp3"
+        }
+    
+    if not cloudpath.startswith('opnames/'):
+        raise ValueError("Ongeldige cloudpath-prefix")
+    
+    s3_path = cloudpath
+    if not s3_path.endswith('.mp3'):
+        s3_path += '.mp3'
+    
+    # Extract filename parts
+    parts = s3_path.split('/')
+    if len(parts) >= 4:
+        filename = f"{parts[1]}-{parts[2]}-{parts[3]}"
+    else:
+        filename = os.path.basename(s3_path)
+    return {'is_dennis': False, 's3_key': s3_path, 'filename': filename}
+
+def source_url(source):
+    """URL ffmpeg and the debug view use: the Dennis URL or a presigned S3 URL"""
+    if source['is_dennis']:
+        return source['url']
+    # Generate S3 presigned URL (gedeelde client, gecachte URL)
+    return generate_presigned_url(source['s3_key'], expires_in=3600)
+
 @player_bp.route('/player')
 @login_required
 def player():
@@ -106,93 +149,37 @@ def player():
     end = request.args.get('end', '')
     debug = request.args.get('debug', '0') == '1'
     
-    # Determine if it's a Dennis or local recording
-    is_dennis = False
-    if cloudpath.startswith('dennis/'):
-        is_dennis = True
-    elif cloudpath.startswith('opnames/'):
-        is_dennis = False
-    else:
-        flash('Ongeldige cloudpath-prefix', 'danger')
+    try:
+        source = resolve_cloudpath(cloudpath)
+    except ValueError as e:
+        flash(str(e), 'danger')
         return redirect(url_for('player.list_recordings'))
     
+    # Downloads lopen via de streaming workers (zie /download)
+    if action == 'download':
+        return redirect(url_for('player.download', cloudpath=cloudpath, start=start, end=end))
+    
     # Build the URL for streaming
     try:
-        if is_dennis:
-            # Extract folder, date, hour from dennis/folder/date/hour.mp3
-            parts = cloudpath.split('/')
-            if len(parts) < 4:
-                raise ValueError("Ongeldig Dennis cloudpath formaat")
-                
-            folder = parts[1]
-            date_str = parts[2]
-            hour = parts[3].replace('.mp3', '')
-            
-            final_url = f"{app.config['DENNIS_API_URL']}{folder}/{folder}-{date_str}-{hour}.mp3"
-            custom_filename = f"{folder}-{date_str}-{hour}.mp3"
-        else:
-            # Local recordings: use S3 presigned URL
-            s3_path = cloudpath
-            if not s3_path.endswith('.mp3'):
-                s3_path += '.mp3'
-                
-            # Generate S3 presigned URL
-            s3_client = boto3.client(
-                's3',
-                endpoint_url=app.config['WASABI_ENDPOINT_URL'],
-                region_name=app.config['WASABI_REGION'],
-                aws_access_key_id=app.config['WASABI_ACCESS_KEY'],
-                aws_secret_access_key=app.config['WASABI_SECRET_KEY']
-            )
-            
-            try:
-                final_url = s3_client.generate_presigned_url(
-                    'get_object',
-                    Params={'Bucket': app.config['WASABI_BUCKET'], 'Key': s3_path},
-                    ExpiresIn=3600
-                )
-                
-                # Extract filename parts
-                parts = s3_path.split('/')
-                if len(parts) >= 4:
-                    station = parts[1]
-                    date_part = parts[2]
-                    file_part = parts[3]
-                    custom_filename = f"{station}-{date_part}-{file_part}"
-                else:
-                    custom_filename = os.path.basename(s3_path)
-            except ClientError as e:
-                logger.error(f"Error generating presigned URL: {e}")
-                flash('Kon geen presigned URL genereren voor streaming', 'danger')
-                return redirect(url_for('player.list_recordings'))
+        custom_filename = source['filename']
+        final_url = source_url(source)
+        if not final_url:
+            flash('Kon geen presigned URL genereren voor streaming', 'danger')
+            return redirect(url_for('player.list_recordings'))
         
-        # Handle download action
-        if action == 'download':
-            if start and end:
-                # Fragment download
-                try:
-                    start_float = float(start)
-                    end_float = float(end)
-                    if end_float <= start_float:
-                        flash('Eindtijd moet na begintijd liggen', 'danger')
-                        return redirect(url_for('player.player', cloudpath=cloudpath))
-                        
-                    duration = end_float - start_float
-                    filename_base = custom_filename.replace('.mp3', '')
-                    download_filename = f"{filename_base}_fragment_{start}_{end}.mp3"
-                    
-                    return stream_audio_fragment(final_url, start_float, duration, download_filename)
-                except ValueError:
-                    flash('Ongeldige start- of eindtijd', 'danger')
-                    return redirect(url_for('player.player', cloudpath=cloudpath))
-            else:
-                # Full download
-                return stream_full_audio(final_url, custom_filename)
+        # Waveform overzicht; de ETag in de URL maakt hem onveranderlijk (lang te cachen)
+        peaks_url = None
+        if not source['is_dennis']:
+            etag = db.session.query(Recording.etag).filter_by(filepath=source['s3_key']).limit(1).scalar()
+            peaks_url = url_for('player.peaks', cloudpath=cloudpath, v=etag or None)
         
         # Streaming mode (default)
         return render_template('player.html', 
                               title='Opname Player',
                               final_url=final_url,
+                              stream_url=url_for('player.stream_audio', cloudpath=cloudpath),
+                              peaks_url=peaks_url,
+                              peaks_per_second=PEAKS_PER_SECOND,
                               cloudpath=cloudpath,
                               custom_filename=custom_filename,
                               debug=debug)
@@ -202,11 +189,114 @@ def player():
         flash(f'Fout bij het laden van de opname: {str(e)}', 'danger')
         return redirect(url_for('player.list_recordings'))
 
+@player_bp.route('/download')
+@login_required
+def download():
+    """Full or fragment download (served by the gevent streaming workers in production)"""
+    cloudpath = request.args.get('cloudpath', '')
+    start = request.args.get('start', '')
+    end = request.args.get('end', '')
+    
+    try:
+        source = resolve_cloudpath(cloudpath)
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('player.list_recordings'))
+    
+    if not (start and end):
+        return stream_full_audio(source)
+    
+    # Fragment download
+    try:
+        start_float = float(start)
+        end_float = float(end)
+    except ValueError:
+        flash('Ongeldige start- of eindtijd', 'danger')
+        return redirect(url_for('player.player', cloudpath=cloudpath))
+    if end_float <= start_float:
+        flash('Eindtijd moet na begintijd liggen', 'danger')
+        return redirect(url_for('player.player', cloudpath=cloudpath))
+    
+    filename_base = source['filename'].replace('.mp3', '')
+    download_filename = f"{filename_base}_fragment_{start}_{end}.mp3"
+    
+    # Met een frame index is een fragment één ranged GET van precies de benodigde frames
+    if not source['is_dennis']:
+        index = load_frame_index(source['s3_key'])
+        if index is not None:
+            try:
+                return stream_s3_fragment(source['s3_key'], index, start_float, end_float, url_quote(download_filename))
+            except IndexOutdated:
+                # Opname is na het bouwen van de index vervangen: terugvallen op ffmpeg
+                forget_frame_index(source['s3_key'])
+            except Exception as e:
+                logger.error(f"Error streaming indexed fragment of {source['s3_key']}: {e}")
+                flash(f'Fout bij het downloaden van het fragment: {str(e)}', 'danger')
+                return redirect(url_for('player.player', cloudpath=cloudpath))
+    
+    # Zonder index (Dennis en oudere opnames): knippen met ffmpeg
+    final_url = source_url(source)
+    if not final_url:
+        flash('Kon geen presigned URL genereren voor streaming', 'danger')
+        return redirect(url_for('player.player', cloudpath=cloudpath))
+    return stream_audio_fragment(final_url, start_float, end_float - start_float, download_filename)
+
+@player_bp.route('/peaks')
+@login_required
+def peaks():
+    """Waveform peaks (uint8, PEAKS_PER_SECOND per second) of a recording, cached long by the browser"""
+    try:
+        source = resolve_cloudpath(request.args.get('cloudpath', ''))
+    except ValueError as e:
+        return Response(str(e), status=400)
+    
+    data = None if source['is_dennis'] else load_peaks(source['s3_key'])
+    if data is None:
+        response = Response('Geen waveform beschikbaar', status=404)
+        response.headers['Cache-Control'] = 'private, max-age=600'
+        return response
+    
+    response = Response(data, mimetype='application/octet-stream')
+    response.headers['X-Peaks-Per-Second'] = str(PEAKS_PER_SECOND)
+    if request.args.get('v'):
+        # Versie (ETag van de opname) zit in de URL: de inhoud verandert nooit meer
+        response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'private, max-age=3600'
+    response.add_etag()
+    return response.make_conditional(request)
+
+@player_bp.route('/audio')
+@login_required
+def stream_audio():
+    """Range-aware audio proxy for the player (206 with Content-Range, bounded per response)"""
+    try:
+        source = resolve_cloudpath(request.args.get('cloudpath', ''))
+    except ValueError as e:
+        return Response(str(e), status=400)
+    
+    try:
+        if source['is_dennis']:
+            return stream_http_url(source['url'], request.headers.get('Range'))
+        # Met een seek index kan de browser met één range request exact zoeken
+        index = load_frame_index(source['s3_key'])
+        if index is not None:
+            try:
+                return stream_indexed_s3_object(source['s3_key'], index, request.headers.get('Range'))
+            except IndexOutdated:
+                forget_frame_index(source['s3_key'])
+        return stream_s3_object(source['s3_key'], request.headers.get('Range'))
+    except Exception as e:
+        logger.error(f"Error proxying audio for {request.args.get('cloudpath')}: {e}")
+        return Response('Fout bij het ophalen van de opname', status=502)
+
 def stream_audio_fragment(url, start_time, duration, filename):
     """Stream a fragment of audio using ffmpeg"""
     try:
         ffmpeg_cmd = [
             app.config['FFMPEG_PATH'],
+            '-nostdin',
+            '-loglevel', 'error',
             '-ss', str(start_time),
             '-i', url,
             '-t', str(duration),
@@ -215,17 +305,21 @@ def stream_audio_fragment(url, start_time, duration, filename):
             'pipe:1'
         ]
         
-        process = subprocess.Popen(ffmpeg_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        # stderr niet als ongelezen pipe: een volle pipe laat ffmpeg vastlopen
+        process = subprocess.Popen(ffmpeg_cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
         
         def generate():
+            # Pas een nieuw blok lezen als het vorige naar de client is geschreven: ffmpeg
+            # wacht dan op de volle pipe en loopt nooit verder voor dan de luisteraar
             try:
                 while True:
-                    data = process.stdout.read(4096)
+                    data = process.stdout.read1(STREAM_CHUNK_SIZE)
                     if not data:
                         break
                     yield data
             finally:
                 process.kill()
+                process.wait()
                 
         return Response(
             stream_with_context(generate()),
@@ -239,27 +333,17 @@ def stream_audio_fragment(url, start_time, duration, filename):
         flash(f'Fout bij het downloaden van het fragment: {str(e)}', 'danger')
         return redirect(url_for('player.player', cloudpath=request.args.get('cloudpath', '')))
 
-def stream_full_audio(url, filename):
-    """Stream the full audio file for download"""
+def stream_full_audio(source):
+    """Full download: S3 via a presigned attachment URL, Dennis via the range-aware proxy"""
     try:
-        # Stream the file via requests to avoid loading it entirely in memory
-        response = requests.get(url, stream=True)
-        if response.status_code != 200:
-            flash(f'Fout bij het downloaden: HTTP {response.status_code}', 'danger')
-            return redirect(url_for('player.player', cloudpath=request.args.get('cloudpath', '')))
-            
-        def generate():
-            for chunk in response.iter_content(chunk_size=4096):
-                yield chunk
-                
-        return Response(
-            stream_with_context(generate()),
-            mimetype='audio/mpeg',
-            headers={
-                'Content-Disposition': f'attachment; filename="{url_quote(filename)}"',
-                'Content-Length': response.headers.get('Content-Length')
-            }
-        )
+        filename = url_quote(source['filename'])
+        if not source['is_dennis']:
+            # De client haalt het bestand rechtstreeks bij S3 op (inclusief hervatten met Range)
+            download_url = generate_presigned_url(source['s3_key'], expires_in=3600, download_name=filename)
+            if not download_url:
+                raise RuntimeError('Kon geen download URL genereren')
+            return redirect(download_url)
+        return stream_http_url(source['url'], request.headers.get('Range'), filename=filename, cap=False)
     except Exception as e:
         logger.error(f"Error streaming full audio: {e}")
         flash(f'Fout bij het downloaden: {str(e)}', 'danger')
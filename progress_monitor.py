@@ -0,0 +1,215 @@
+"""
+Voortgang en foutmeldingen van de ffmpeg recorders.
+
+Elke recorder draait met -progress pipe:1 en stuurt waarschuwingen naar
+stderr. Eén thread leest alle pipes via een selector (geen thread per
+proces) en houdt per station een korte tijdreeks bij van out_time,
+total_size, bitrate en speed, plus de laatste regels van stderr.
+"""
+
+import os
+import time
+import logging
+import selectors
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_INTERVAL = 30  # seconden tussen twee punten in de tijdreeks
+SERIES_LENGTH = 120  # één uur bij SAMPLE_INTERVAL = 30
+STDERR_LINES = 20
+READ_SIZE = 65536
+
+
+def parse_out_time(value):
+    """Convert ffmpeg's HH:MM:SS.micro out_time to seconds, or None"""
+    try:
+        hours, minutes, seconds = value.split(':')
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except (ValueError, AttributeError):
+        return None
+
+
+def parse_number(value, suffix=''):
+    """Parse '128.0kbits/s' / '1.01x' / '12345' style values, or None for N/A"""
+    if value is None:
+        return None
+    value = value.strip()
+    if suffix and value.endswith(suffix):
+        value = value[:-len(suffix)]
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+class StationProgress:
+    """Progress time series and stderr tail for one station"""
+
+    def __init__(self):
+        self.series = deque(maxlen=SERIES_LENGTH)
+        self.latest = None
+        self.stderr = deque(maxlen=STDERR_LINES)
+        self.warnings = 0
+        self.pending = {}
+        self.last_sample_at = 0
+
+    def handle_progress_line(self, line, now):
+        key, _, value = line.partition('=')
+        if key != 'progress':
+            self.pending[key] = value
+            return
+        # Blok compleet: "progress=continue" of "progress=end"
+        block, self.pending = self.pending, {}
+        sample = {
+            'ts': round(now, 1),
+            'out_time': parse_out_time(block.get('out_time')),
+            'total_size': int(parse_number(block.get('total_size')) or 0),
+            'bitrate_kbps': parse_number(block.get('bitrate'), 'kbits/s'),
+            'speed': parse_number(block.get('speed'), 'x')
+        }
+        self.latest = sample
+        if now - self.last_sample_at >= SAMPLE_INTERVAL or value == 'end':
+            self.series.append(sample)
+            self.last_sample_at = now
+
+    def handle_stderr_line(self, line, now):
+        self.stderr.append(f"{time.strftime('%H:%M:%S', time.localtime(now))} {line}")
+        self.warnings += 1
+
+    def to_dict(self, with_series=True):
+        data = {
+            'latest': self.latest,
+            'warnings': self.warnings,
+            'stderr': list(self.stderr)
+        }
+        if with_series:
+            data['series'] = list(self.series)
+        return data
+
+
+class ProgressMonitor:
+    """Reads the progress and stderr pipes of all recorders in a single thread"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stations = {}
+        self._pending = []
+        self._thread = None
+        self._selector = selectors.DefaultSelector()
+
+    def register(self, station_id, process):
+        """Start reading a recorder's stdout (progress) and stderr pipes"""
+        with self._lock:
+            self._stations.setdefault(station_id, StationProgress())
+            for stream, kind in ((process.stdout, 'progress'), (process.stderr, 'stderr')):
+                if stream is not None:
+                    os.set_blocking(stream.fileno(), False)
+                    self._pending.append((stream, (station_id, kind, bytearray())))
+            self._start_thread()
+
+    def ensure_running(self):
+        """Restart the reader thread if it died; returns True when it had to be restarted"""
+        with self._lock:
+            # Nog nooit gestart (geen recorders): register() start de thread
+            return self._thread is not None and self._start_thread()
+
+    def _start_thread(self):
+        # Aanroepen met self._lock vast
+        if self._thread is not None and self._thread.is_alive():
+            return False
+        self._thread = threading.Thread(target=self._run, name='ffmpeg-progress', daemon=True)
+        self._thread.start()
+        return True
+
+    def _run(self):
+        while True:
+            # Nooit stoppen: zonder lezer lopen de pipes vol en blijft ffmpeg hangen
+            try:
+                self._poll()
+            except Exception as e:
+                logger.error(f"Error reading ffmpeg progress: {e}")
+                time.sleep(1)
+
+    def _poll(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for stream, data in pending:
+            try:
+                self._selector.register(stream, selectors.EVENT_READ, data)
+            except (ValueError, KeyError, OSError):
+                pass
+
+        if not self._selector.get_map():
+            time.sleep(1)
+            return
+
+        try:
+            events = self._selector.select(timeout=1)
+        except OSError as e:
+            logger.error(f"Error in ffmpeg progress selector: {e}")
+            time.sleep(1)
+            return
+
+        now = time.time()
+        for key, _ in events:
+            try:
+                self._read(key, now)
+            except Exception as e:
+                # Regels weggooien maar de pipe blijven leegmaken, anders blijft ffmpeg hangen
+                logger.error(f"Error reading ffmpeg output for station {key.data[0]}: {e}")
+                key.data[2].clear()
+
+    def _read(self, key, now):
+        stream = key.fileobj
+        station_id, kind, buffer = key.data
+        try:
+            chunk = os.read(stream.fileno(), READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            chunk = b''
+
+        if not chunk:
+            # Proces gestopt: pipe sluiten
+            self._selector.unregister(stream)
+            stream.close()
+            return
+
+        buffer.extend(chunk)
+        *lines, rest = buffer.split(b'\n')
+        buffer[:] = rest
+        with self._lock:
+            progress = self._stations.setdefault(station_id, StationProgress())
+            for raw in lines:
+                line = raw.decode('utf-8', 'replace').strip()
+                if not line:
+                    continue
+                if kind == 'progress':
+                    progress.handle_progress_line(line, now)
+                else:
+                    progress.handle_stderr_line(line, now)
+
+    def latest(self, station_id):
+        """Most recent progress sample and stderr tail for a station (no series)"""
+        with self._lock:
+            progress = self._stations.get(station_id)
+            return progress.to_dict(with_series=False) if progress else None
+
+    def snapshot(self, station_ids=None):
+        """Time series per station as plain dicts (JSON serialisable)"""
+        with self._lock:
+            return {
+                str(station_id): progress.to_dict()
+                for station_id, progress in self._stations.items()
+                if station_ids is None or station_id in station_ids
+            }
+
+    def forget(self, station_id):
+        """Drop the history of a station that is no longer recorded"""
+        with self._lock:
+            self._stations.pop(station_id, None)
+
+
+monitor = ProgressMonitor()
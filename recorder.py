@@ -0,0 +1,303 @@
+"""
+Recorder supervisor voor de Radiologger.
+
+Alle ffmpeg opnameprocessen worden via deze module gestart, zodat we de
+Popen handles zelf bijhouden in een station_id -> proces register. Starten,
+stoppen en status opvragen zijn daardoor directe lookups, zonder pgrep of
+het doorzoeken van commandoregels.
+"""
+
+import os
+import json
+import time
+import atexit
+import signal
+import logging
+import threading
+import subprocess
+from datetime import datetime
+from progress_monitor import monitor as progress_monitor
+
+logger = logging.getLogger(__name__)
+
+
+def monitor_options():
+    """ffmpeg options for machine-readable progress on stdout and only warnings on stderr"""
+    return ['-nostats', '-loglevel', 'warning', '-progress', 'pipe:1']
+
+
+def input_options(stream_url):
+    """ffmpeg input options: reconnect on dropped HTTP streams, give up on a hung read"""
+    if not stream_url.startswith(('http://', 'https://')):
+        return []
+    return [
+        '-reconnect', '1',
+        '-reconnect_streamed', '1',
+        '-reconnect_delay_max', '30',
+        '-rw_timeout', '30000000',  # 30 s in microseconden, daarna stopt ffmpeg en herstart de watchdog
+    ]
+
+
+def build_segment_command(ffmpeg_path, stream_url, output_pattern):
+    """Build the ffmpeg command for an hourly segmented recording"""
+    return [
+        ffmpeg_path,
+        *monitor_options(),
+        *input_options(stream_url),
+        '-i', stream_url,
+        '-vn',  # No video
+        '-acodec', 'copy',  # Copy audio codec (no transcoding)
+        '-f', 'segment',  # Segment format
+        '-segment_time', '3600',  # 1-hour segments
+        '-reset_timestamps', '1',
+        '-segment_atclocktime', '1',
+        '-strftime', '1',
+        output_pattern
+    ]
+
+
+def build_single_command(ffmpeg_path, stream_url, output_file, duration=3600):
+    """Build the ffmpeg command for a single fixed-length recording"""
+    return [
+        ffmpeg_path,
+        *monitor_options(),
+        *input_options(stream_url),
+        '-i', stream_url,
+        '-vn',  # No video
+        '-acodec', 'copy',  # Copy audio codec
+        '-t', str(duration),
+        output_file
+    ]
+
+
+class RecorderProcess:
+    """A single ffmpeg recording owned by the supervisor"""
+
+    def __init__(self, station_id, station_name, stream_url, output_pattern, job_type, process, record_from=None):
+        self.station_id = station_id
+        self.station_name = station_name
+        self.stream_url = stream_url
+        self.output_pattern = output_pattern
+        self.job_type = job_type
+        self.process = process
+        self.pid = process.pid
+        self.started_at = datetime.now()
+        # Vooraf gestart vóór het hele uur: het segment tot record_from is aanloop
+        self.record_from = record_from
+        self._finished_bytes = 0
+        self._current_file = None
+        self._current_size = 0
+
+    def is_alive(self):
+        """Return True while the ffmpeg process has not exited (reaps it otherwise)"""
+        return self.process.poll() is None
+
+    def current_file(self):
+        """Path of the file ffmpeg is currently writing to"""
+        # Segment patronen bevatten strftime codes, enkelvoudige opnames niet
+        return datetime.now().strftime(self.output_pattern)
+
+    def lead_in_file(self):
+        """Segment written before record_from by a pre-spawned recorder, or None"""
+        if self.record_from is None or self.started_at >= self.record_from:
+            return None
+        return self.started_at.strftime(self.output_pattern)
+
+    def bytes_written(self):
+        """Total bytes written by this recorder since it was started"""
+        path = self.current_file()
+        if path != self._current_file:
+            # Nieuw segment: eindgrootte van het vorige segment vastleggen (alles
+            # na de laatste meting telt mee); al verplaatst, dan de laatste meting
+            if self._current_file is not None:
+                try:
+                    self._current_size = max(os.path.getsize(self._current_file), self._current_size)
+                except OSError:
+                    pass
+            self._finished_bytes += self._current_size
+            self._current_file = path
+            self._current_size = 0
+        try:
+            self._current_size = os.path.getsize(path)
+        except OSError:
+            pass
+        return self._finished_bytes + self._current_size
+
+    def to_dict(self):
+        """Status information for the admin page"""
+        duration = datetime.now() - self.started_at
+        hours, remainder = divmod(int(duration.total_seconds()), 3600)
+        minutes, seconds = divmod(remainder, 60)
+        bytes_written = self.bytes_written()
+        elapsed = duration.total_seconds()
+        progress = progress_monitor.latest(self.station_id) or {}
+        latest = progress.get('latest') or {}
+        return {
+            'pid': self.pid,
+            'station_id': self.station_id,
+            'station': self.station_name,
+            'station_name': self.station_name,
+            'url': self.stream_url,
+            'output': self.output_pattern,
+            'type': self.job_type,
+            'start_time': self.started_at.strftime('%d-%m-%Y %H:%M:%S'),
+            'duration': f"{hours:02d}:{minutes:02d}:{seconds:02d}",
+            'bytes_written': bytes_written,
+            'bytes_per_second': round(bytes_written / elapsed, 1) if elapsed >= 1 else 0,
+            'bitrate_kbps': latest.get('bitrate_kbps'),
+            'speed': latest.get('speed'),
+            'out_time': latest.get('out_time'),
+            'warnings': progress.get('warnings', 0),
+            'last_warning': progress['stderr'][-1] if progress.get('stderr') else None
+        }
+
+
+class RecorderSupervisor:
+    """Owns every ffmpeg Popen handle, keyed by station id"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._recorders = {}
+
+    def start(self, station_id, station_name, stream_url, output_pattern, command, job_type='scheduled', env=None,
+              record_from=None):
+        """Spawn an ffmpeg process for a station and register it
+
+        record_from marks a recorder started ahead of an hour boundary; the
+        segment it writes before that moment is discarded by discard_lead_in().
+        """
+        if env is None:
+            env = os.environ.copy()
+            env['TZ'] = 'Europe/Amsterdam'
+
+        with self._lock:
+            existing = self.get(station_id)
+            if existing:
+                raise RuntimeError(f"Station {station_name} neemt al op (PID {existing.pid})")
+
+            # stdout (voortgang) en stderr worden gelezen door de progress monitor
+            process = subprocess.Popen(
+                command,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                env=env
+            )
+            progress_monitor.register(station_id, process)
+            recorder = RecorderProcess(station_id, station_name, stream_url, output_pattern, job_type, process,
+                                       record_from=record_from)
+            self._recorders[station_id] = recorder
+            return recorder
+
+    def active_files(self):
+        """Paths the live recorders are currently writing to"""
+        return {recorder.current_file() for recorder in self.running()}
+
+    def lead_in_files(self):
+        """Paths of lead-in segments that must not be uploaded"""
+        with self._lock:
+            return {path for path in (r.lead_in_file() for r in self._recorders.values()) if path}
+
+    def discard_lead_in(self, now=None):
+        """Remove lead-in segments of recorders whose record_from has passed; returns the number removed"""
+        now = now or datetime.now()
+        removed = 0
+        with self._lock:
+            for recorder in self._recorders.values():
+                if recorder.record_from is None or recorder.record_from > now:
+                    continue
+                path = recorder.lead_in_file()
+                recorder.record_from = None
+                if path and path != recorder.current_file():
+                    try:
+                        os.remove(path)
+                        removed += 1
+                    except FileNotFoundError:
+                        pass
+                    except OSError as e:
+                        logger.error(f"Kon aanloopsegment {path} niet verwijderen: {e}")
+        return removed
+
+    def get(self, station_id):
+        """Return the live recorder for a station, or None"""
+        with self._lock:
+            recorder = self._recorders.get(station_id)
+            if recorder is None:
+                return None
+            if not recorder.is_alive():
+                logger.info(f"Opname voor {recorder.station_name} (PID {recorder.pid}) is beëindigd met code {recorder.process.returncode}")
+                del self._recorders[station_id]
+                return None
+            return recorder
+
+    def is_running(self, station_id):
+        """Check whether a station has a live recorder"""
+        return self.get(station_id) is not None
+
+    def stop(self, station_id, timeout=10):
+        """Terminate the recorder for a station; returns True if one was stopped"""
+        with self._lock:
+            recorder = self._recorders.pop(station_id, None)
+        if recorder is None:
+            return False
+        self._terminate(recorder, timeout)
+        return True
+
+    def stop_all(self, timeout=10):
+        """Terminate every registered recorder"""
+        with self._lock:
+            recorders = list(self._recorders.values())
+            self._recorders.clear()
+        for recorder in recorders:
+            self._terminate(recorder, timeout)
+        return len(recorders)
+
+    def running(self):
+        """List all live recorders"""
+        with self._lock:
+            return [r for r in (self.get(sid) for sid in list(self._recorders)) if r]
+
+    def status(self):
+        """Status dicts of all live recorders, for the admin page"""
+        return [recorder.to_dict() for recorder in self.running()]
+
+    def _terminate(self, recorder, timeout):
+        """Send SIGTERM so ffmpeg can finalise the file, SIGKILL if it hangs"""
+        if not recorder.is_alive():
+            return
+        try:
+            recorder.process.send_signal(signal.SIGTERM)
+            recorder.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"ffmpeg voor {recorder.station_name} (PID {recorder.pid}) reageert niet, wordt gekilld")
+            recorder.process.kill()
+            recorder.process.wait()
+        except Exception as e:
+            logger.error(f"Error stopping recorder {recorder.pid}: {e}")
+
+
+def write_status_file(path, recorders, key='recorders'):
+    """Atomically publish recorder status for processes that do not own the recorders"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'updated_at': time.time(), 'pid': os.getpid(), key: recorders}, f)
+    os.replace(tmp_path, path)
+
+
+def read_status_file(path, max_age=60, key='recorders'):
+    """Read the published recorder status; None if missing or stale"""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - data.get('updated_at', 0) > max_age:
+        return None
+    return data.get(key, [])
+
+
+# Eén supervisor per proces
+supervisor = RecorderSupervisor()
+
+# Geen verweesde ffmpeg processen achterlaten bij afsluiten
+atexit.register(supervisor.stop_all)
@@ -0,0 +1,190 @@
+"""
+Watchdog voor de opnameprocessen.
+
+Houdt per station bij hoe snel het opnamebestand groeit. Een recorder die
+langer dan stall_seconds niets schrijft geldt als vastgelopen. Een
+vastgelopen of gestopte recorder wordt herstart met exponentiële backoff, en
+de tijd zonder opname wordt bijgehouden als onderbreking (gap), zodat het
+aantal verloren minuten per station per dag meetbaar is.
+
+Deze module houdt alleen de toestand in het geheugen bij; logger.py schrijft
+de onderbrekingen als RecordingGap records weg.
+"""
+
+import logging
+import threading
+from datetime import timedelta
+
+logger = logging.getLogger(__name__)
+
+
+class StationWatch:
+    """Watchdog state for one station"""
+
+    def __init__(self, station_id):
+        self.station_id = station_id
+        self.pid = None
+        self.last_bytes = None
+        self.last_sample_at = None
+        self.last_growth_at = None
+        self.growing_since = None
+        self.bytes_per_second = 0.0
+        self.bytes_delta = 0
+        self.failures = 0
+        self.next_restart_at = None
+        self.record_from = None
+        self.gap = None  # {'id', 'started_at', 'reason', 'restarts'}; logger voegt 'row_started_at' toe (per dag een record)
+
+    def to_dict(self, now):
+        return {
+            'station_id': self.station_id,
+            'pid': self.pid,
+            'bytes_per_second': round(self.bytes_per_second, 1),
+            'failures': self.failures,
+            'next_restart_in': max((self.next_restart_at - now).total_seconds(), 0) if self.next_restart_at else 0,
+            'gap_since': self.gap['started_at'].strftime('%Y-%m-%d %H:%M:%S') if self.gap else None,
+            'gap_reason': self.gap['reason'] if self.gap else None
+        }
+
+
+class RecorderWatchdog:
+    """Tracks output growth per recorder and decides when to restart"""
+
+    def __init__(self, stall_seconds=60, backoff_base=5, backoff_max=300, stable_seconds=300):
+        self.stall_seconds = stall_seconds
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stable_seconds = stable_seconds
+        self._lock = threading.Lock()
+        self._stations = {}
+
+    def _watch(self, station_id):
+        watch = self._stations.get(station_id)
+        if watch is None:
+            watch = self._stations[station_id] = StationWatch(station_id)
+        return watch
+
+    def watch(self, recorder):
+        """Start watching a freshly launched recorder, also if it exits before its first observation"""
+        with self._lock:
+            watch = self._watch(recorder.station_id)
+            watch.pid = recorder.pid
+            watch.last_bytes = None
+            # Vooraf gestart: verlies telt pas vanaf het hele uur
+            watch.last_growth_at = max(recorder.started_at, recorder.record_from or recorder.started_at)
+            watch.growing_since = None
+            watch.record_from = recorder.record_from
+
+    def is_upcoming(self, station_id, now):
+        """True while the station's recorder was started ahead of an hour that has not begun yet"""
+        with self._lock:
+            watch = self._stations.get(station_id)
+            return bool(watch and watch.record_from and watch.record_from > now)
+
+    def observe(self, recorder, now):
+        """Sample a live recorder; returns 'growing', 'waiting' or 'stalled'"""
+        with self._lock:
+            watch = self._watch(recorder.station_id)
+            if watch.pid != recorder.pid:
+                # Nieuw proces: meten vanaf de start van dit proces
+                watch.pid = recorder.pid
+                watch.last_bytes = None
+                watch.last_growth_at = recorder.started_at
+                watch.growing_since = None
+
+            size = recorder.bytes_written()
+            watch.bytes_delta = max(size - (watch.last_bytes or 0), 0)
+            grew = watch.last_bytes is not None and size > watch.last_bytes
+            if watch.last_bytes is not None and watch.last_sample_at is not None:
+                elapsed = (now - watch.last_sample_at).total_seconds()
+                if elapsed > 0:
+                    watch.bytes_per_second = max(size - watch.last_bytes, 0) / elapsed
+            if watch.last_bytes is None and size > 0:
+                grew = True
+            watch.last_bytes = size
+            watch.last_sample_at = now
+
+            if grew:
+                watch.last_growth_at = now
+                watch.growing_since = watch.growing_since or now
+                if watch.failures and (now - watch.growing_since).total_seconds() >= self.stable_seconds:
+                    # Weer stabiel: backoff terugzetten
+                    watch.failures = 0
+                    watch.next_restart_at = None
+                return 'growing'
+
+            watch.growing_since = None
+            if (now - watch.last_growth_at).total_seconds() > self.stall_seconds:
+                return 'stalled'
+            return 'waiting'
+
+    def bytes_delta(self, station_id):
+        """Bytes written by the station's recorder since the previous observation"""
+        with self._lock:
+            watch = self._stations.get(station_id)
+            return watch.bytes_delta if watch else 0
+
+    def is_watched(self, station_id):
+        """True once a recorder for this station has been launched or observed"""
+        with self._lock:
+            return station_id in self._stations
+
+    def last_growth(self, station_id):
+        """Last moment the station's output grew, or None"""
+        with self._lock:
+            watch = self._stations.get(station_id)
+            return watch.last_growth_at if watch else None
+
+    def may_restart(self, station_id, now):
+        """True when the backoff delay for this station has passed"""
+        with self._lock:
+            watch = self._watch(station_id)
+            return watch.next_restart_at is None or now >= watch.next_restart_at
+
+    def restarted(self, station_id, now):
+        """Register a (re)start attempt and schedule the next allowed one"""
+        with self._lock:
+            watch = self._watch(station_id)
+            watch.failures += 1
+            delay = min(self.backoff_base * 2 ** (watch.failures - 1), self.backoff_max)
+            watch.next_restart_at = now + timedelta(seconds=delay)
+            watch.pid = None
+            if watch.gap:
+                watch.gap['restarts'] += 1
+            return delay
+
+    def open_gap(self, station_id, reason, since):
+        """Start a gap for the station; returns the gap dict if it is new, else None"""
+        with self._lock:
+            watch = self._watch(station_id)
+            if watch.gap:
+                return None
+            watch.gap = {'id': None, 'started_at': since, 'reason': reason, 'restarts': 0}
+            return watch.gap
+
+    def open_gaps(self):
+        """(station_id, gap) pairs of all gaps still in progress"""
+        with self._lock:
+            return [(station_id, watch.gap) for station_id, watch in self._stations.items() if watch.gap]
+
+    def close_gap(self, station_id):
+        """End the station's gap; returns the gap dict or None"""
+        with self._lock:
+            watch = self._stations.get(station_id)
+            if watch is None or watch.gap is None:
+                return None
+            gap, watch.gap = watch.gap, None
+            return gap
+
+    def forget(self, station_id):
+        """Drop all state for a station that should not be recording"""
+        with self._lock:
+            self._stations.pop(station_id, None)
+
+    def status(self, now):
+        """Watchdog state per station for the admin page"""
+        with self._lock:
+            return [watch.to_dict(now) for watch in self._stations.values()]
+
+
+watchdog = RecorderWatchdog()
@@ -0,0 +1,138 @@
+"""
+Gebundelde registratie van Recording records.
+
+De uploader verzamelt (station, datum, uur, key, grootte) per bestand en
+schrijft ze per batch weg met één INSERT ... ON CONFLICT DO UPDATE en één
+commit, in plaats van twee SELECTs en een commit per bestand. Stationsnamen
+worden opgezocht in een map die één keer per batch-object wordt geladen.
+"""
+
+import logging
+from datetime import datetime
+from sqlalchemy import insert
+from app import db
+from models import Station, Recording
+from storage import refresh_station_day_stats
+
+logger = logging.getLogger(__name__)
+
+CONFLICT_COLUMNS = ['station_id', 'date', 'hour', 'recording_type']
+UPDATE_COLUMNS = ['filepath', 's3_uploaded', 'size_bytes', 'etag', 'duration_seconds', 'silence_ratio', 'silence_gaps']
+
+
+def _dialect_insert(model):
+    """Dialect-specific INSERT supporting ON CONFLICT, or None if unsupported"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert(model)
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert(model)
+    return None
+
+
+def insert_ignore_duplicates(model):
+    """INSERT that skips rows hitting a unique constraint (PostgreSQL and SQLite)"""
+    stmt = _dialect_insert(model)
+    if stmt is None:
+        return insert(model)
+    return stmt.on_conflict_do_nothing()
+
+
+def upsert_recordings(rows):
+    """Insert or update Recording rows in one statement (no commit)"""
+    if not rows:
+        return
+    stmt = _dialect_insert(Recording)
+    if stmt is not None:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=CONFLICT_COLUMNS,
+            set_={column: getattr(stmt.excluded, column) for column in UPDATE_COLUMNS}
+        )
+        db.session.execute(stmt, rows)
+        return
+
+    # Andere databases: per rij opzoeken en bijwerken
+    for row in rows:
+        recording = Recording.query.filter_by(**{column: row[column] for column in CONFLICT_COLUMNS}).first()
+        if recording is None:
+            db.session.add(Recording(**row))
+        else:
+            for column in UPDATE_COLUMNS:
+                setattr(recording, column, row[column])
+
+
+class RecordingBatch:
+    """Collects uploaded recordings and writes them per batch"""
+
+    def __init__(self, batch_size=100):
+        self.batch_size = batch_size
+        self._rows = {}
+        self._station_ids = dict(db.session.query(Station.name, Station.id).all())
+        self.written = 0
+
+    def add(self, station_name, recording_date, hour, s3_key, size_bytes=None, etag=None,
+            duration_seconds=None, silence_ratio=None, silence_gaps=None, s3_uploaded=True,
+            recording_type='scheduled'):
+        """Queue a recording; returns False if the station is unknown
+
+        s3_uploaded=False registers an hour that was deliberately not uploaded
+        (all silent), so its silence analysis stays available.
+        """
+        station_id = self._station_ids.get(station_name)
+        if station_id is None:
+            return False
+
+        # Binnen één statement mag elke conflict key maar één keer voorkomen
+        self._rows[(station_id, recording_date, hour, recording_type)] = {
+            'station_id': station_id,
+            'date': recording_date,
+            'hour': hour,
+            'recording_type': recording_type,
+            'filepath': s3_key,
+            's3_uploaded': s3_uploaded,
+            'size_bytes': size_bytes,
+            'etag': etag,
+            'duration_seconds': duration_seconds,
+            'silence_ratio': silence_ratio,
+            'silence_gaps': silence_gaps,
+            'created_at': datetime.utcnow()
+        }
+
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+        return True
+
+    def flush(self):
+        """Write all queued rows and the affected daily totals in one transaction"""
+        if not self._rows:
+            return 0
+        rows = list(self._rows.values())
+        self._rows = {}
+
+        try:
+            # Bestaande records (bijv. handmatige opnames) behouden hun type
+            existing_types = dict(
+                ((station_id, recording_date, hour), recording_type)
+                for station_id, recording_date, hour, recording_type in db.session.query(
+                    Recording.station_id, Recording.date, Recording.hour, Recording.recording_type
+                ).filter(
+                    Recording.station_id.in_({row['station_id'] for row in rows}),
+                    Recording.date.in_({row['date'] for row in rows})
+                )
+            )
+            for row in rows:
+                row['recording_type'] = existing_types.get(
+                    (row['station_id'], row['date'], row['hour']), row['recording_type']
+                )
+
+            upsert_recordings(rows)
+            refresh_station_day_stats({(row['station_id'], row['date']) for row in rows})
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        self.written += len(rows)
+        return len(rows)
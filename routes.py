@@ -1,15 +1,17 @@
-from flask import render_template, redirect, url_for, flash, request, jsonify
+from flask import render_template, redirect, url_for, flash, request, jsonify, Response
 from flask_login import login_required, current_user
 from app import app, db
-from models import Station, Recording, DennisStation, User
+from models import Station, User, RecordingGap
 from auth import admin_required, editor_required
+from disk_monitor import get_disk_monitor
+from health import get_health_monitor
+from storage import lost_minutes_per_station, dashboard_counts
 from forms import StationForm, SetupForm
 from werkzeug.security import generate_password_hash
 import os
+import hmac
 from dotenv import load_dotenv
 import sys
-import subprocess
-import psutil
 from datetime import datetime
 import logging
 
@@ -43,13 +45,12 @@ def admin():
     """Statuspagina - toont informatie over lopende opnames en systeemstatus"""
     from utils import get_running_recordings, check_disk_space, get_ffmpeg_version
     from models import ScheduledJob
-    import psutil
+    from system_stats import get_system_stats
     
-    # Systeeminformatie
+    # Systeeminformatie (gemeten op de achtergrond, hier alleen gelezen)
     disk_space = check_disk_space()
     ffmpeg_version = get_ffmpeg_version()
-    cpu_percent = psutil.cpu_percent(interval=0.1)
-    memory = psutil.virtual_memory()
+    system = get_system_stats()['latest']
     
     # Actuele opnames en jobs
     running_recordings = get_running_recordings()
@@ -58,36 +59,20 @@ def admin():
     running_jobs = ScheduledJob.query.filter_by(status='running').all()
     scheduled_jobs = ScheduledJob.query.filter_by(status='scheduled').all()
     
-    # Station en opname statistieken
-    total_recordings = Recording.query.count()
-    total_stations = Station.query.count()
-    always_on_stations = Station.query.filter_by(always_on=True).count()
-    scheduled_stations = Station.query.filter(
-        (Station.schedule_start_date != None) & 
-        (Station.schedule_end_date != None)
-    ).count()
-    
-    dennis_count = DennisStation.query.count()
-    dennis_visible = DennisStation.query.filter_by(visible_in_logger=True).count()
-    
-    # Vandaag gemaakte opnames
+    # Station en opname statistieken in één query
     today = datetime.now().date()
-    todays_recordings = Recording.query.filter_by(date=today).count()
+    counts = dashboard_counts(today)
+    
+    # Onderbrekingen in opnames vandaag
+    recording_gaps = RecordingGap.query.filter_by(date=today).order_by(RecordingGap.started_at.desc()).limit(50).all()
+    lost_minutes = lost_minutes_per_station(today)
     
     stats = {
-        'total_recordings': total_recordings,
-        'total_stations': total_stations,
-        'always_on_stations': always_on_stations,
-        'scheduled_stations': scheduled_stations,
-        'dennis_count': dennis_count,
-        'dennis_visible': dennis_visible,
-        'todays_recordings': todays_recordings,
+        **counts,
+        'lost_minutes_today': round(sum(lost_minutes.values()), 1),
         'system': {
+            **system,
             'disk_space': disk_space,
-            'cpu_percent': cpu_percent,
-            'memory_percent': memory.percent,
-            'memory_used': memory.used // (1024 * 1024),  # MB
-            'memory_total': memory.total // (1024 * 1024),  # MB
             'ffmpeg_version': ffmpeg_version
         }
     }
@@ -97,9 +82,76 @@ def admin():
                           running_recordings=running_recordings,
                           running_jobs=running_jobs,
                           scheduled_jobs=scheduled_jobs,
+                          recording_gaps=recording_gaps,
                           stats=stats,
                           current_user=current_user)
 
+def metrics_allowed():
+    """Bearer token when METRICS_TOKEN is set, otherwise only direct requests from this machine"""
+    token = app.config.get('METRICS_TOKEN')
+    if token:
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}")
+    # Via Apache/nginx komt alles van 127.0.0.1, maar dan met X-Forwarded-For
+    return request.remote_addr in ('127.0.0.1', '::1') and 'X-Forwarded-For' not in request.headers
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics of all processes (text exposition format)"""
+    if not metrics_allowed():
+        return Response('Forbidden', status=403, mimetype='text/plain')
+    from metrics import render
+    return Response(render(app.config['METRICS_DIR']), mimetype='text/plain; version=0.0.4')
+
+@app.route('/recorder_progress')
+@login_required
+def recorder_progress():
+    """ffmpeg progress time series (out_time, total_size, bitrate, speed) per station as JSON"""
+    from scheduler_lock import is_scheduler_process
+    from progress_monitor import monitor
+    from recorder import read_status_file
+    
+    if is_scheduler_process():
+        progress = monitor.snapshot()
+    else:
+        # De recorders draaien in het scheduler proces; lees de gepubliceerde reeksen
+        progress = read_status_file(app.config['RECORDER_PROGRESS_PATH'], max_age=120, key='progress') or {}
+    
+    station_names = {str(station_id): name for station_id, name in db.session.query(Station.id, Station.name).all()}
+    return jsonify({station_names.get(station_id, station_id): data for station_id, data in progress.items()})
+
+@app.route('/system_stats')
+@login_required
+def system_stats():
+    """Rolling CPU, memory, load, disk I/O and per-recorder RSS/CPU samples as JSON"""
+    from system_stats import get_system_stats
+    return jsonify(get_system_stats())
+
+@app.route('/recording_gaps')
+@login_required
+def recording_gaps():
+    """Lost recording minutes per station for a day (JSON, for monitoring/alerts)"""
+    try:
+        day = datetime.strptime(request.args.get('date'), '%Y-%m-%d').date() if request.args.get('date') else datetime.now().date()
+    except ValueError:
+        return jsonify({'error': 'Ongeldige datum, gebruik YYYY-MM-DD'}), 400
+    
+    station_names = dict(db.session.query(Station.id, Station.name).all())
+    gaps = RecordingGap.query.filter_by(date=day).order_by(RecordingGap.started_at).all()
+    lost_minutes = lost_minutes_per_station(day)
+    
+    return jsonify({
+        'date': day.strftime('%Y-%m-%d'),
+        'lost_minutes': {station_names.get(station_id, str(station_id)): minutes for station_id, minutes in lost_minutes.items()},
+        'gaps': [{
+            'station': station_names.get(gap.station_id, str(gap.station_id)),
+            'started_at': gap.started_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'ended_at': gap.ended_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'seconds': gap.seconds,
+            'reason': gap.reason,
+            'restarts': gap.restarts
+        } for gap in gaps]
+    })
+
 @app.route('/debug_info')
 @admin_required
 def debug_info():
@@ -117,11 +169,11 @@ def debug_info():
     
     # Get disk space info
     try:
-        disk_total = os.statvfs(app.config['RECORDINGS_DIR']).f_blocks * os.statvfs(app.config['RECORDINGS_DIR']).f_frsize
-        disk_free = os.statvfs(app.config['RECORDINGS_DIR']).f_bfree * os.statvfs(app.config['RECORDINGS_DIR']).f_frsize
-        info['disk_total_gb'] = round(disk_total / (1024**3), 2)
-        info['disk_free_gb'] = round(disk_free / (1024**3), 2)
-        info['disk_used_percent'] = round((1 - (disk_free / disk_total)) * 100, 2)
+        disk = get_disk_monitor().snapshot()
+        info['disk_total_gb'] = disk['total_gb']
+        info['disk_free_gb'] = disk['free_gb']
+        info['disk_used_percent'] = disk['used_percent']
+        info['disk_hours_to_full'] = disk['hours_to_full']
     except Exception as e:
         logger.error(f"Error getting disk space info: {e}")
         info['disk_space_error'] = str(e)
@@ -132,86 +184,10 @@ def debug_info():
 
 @app.route('/health')
 def health_check():
-    """Simple health check endpoint"""
-    status = {
-        'database': 'unknown',
-        'disk_space': 'unknown',
-        'logs_dir': 'unknown',
-        'ffmpeg': 'unknown',
-        'overall': 'unknown',
-        'details': {}
-    }
-    
-    # Check if database is accessible
-    try:
-        db.session.execute("SELECT 1")
-        status['database'] = 'healthy'
-        status['details']['database'] = 'Database connection successful'
-    except Exception as e:
-        status['database'] = 'error'
-        status['details']['database'] = str(e)
-        logger.error(f"Database health check failed: {e}")
-    
-    # Check disk space
-    try:
-        disk_free_gb = os.statvfs(app.config['RECORDINGS_DIR']).f_bfree * os.statvfs(app.config['RECORDINGS_DIR']).f_frsize / (1024**3)
-        status['disk_space'] = 'healthy' if disk_free_gb > 2 else 'warning'
-        status['details']['disk_space'] = f'{round(disk_free_gb, 2)} GB free'
-    except Exception as e:
-        status['disk_space'] = 'error'
-        status['details']['disk_space'] = str(e)
-        logger.error(f"Disk space health check failed: {e}")
-    
-    # Check logs directory
-    try:
-        if os.path.isdir(app.config['LOGS_DIR']):
-            status['logs_dir'] = 'healthy'
-            status['details']['logs_dir'] = f"Directory exists: {app.config['LOGS_DIR']}"
-        else:
-            status['logs_dir'] = 'error'
-            status['details']['logs_dir'] = f"Directory not found: {app.config['LOGS_DIR']}"
-    except Exception as e:
-        status['logs_dir'] = 'error'
-        status['details']['logs_dir'] = str(e)
-        logger.error(f"Logs directory health check failed: {e}")
-    
-    # Check ffmpeg
-    try:
-        result = subprocess.run(['ffmpeg', '-version'], 
-                              stdout=subprocess.PIPE, 
-                              stderr=subprocess.PIPE, 
-                              text=True,
-                              timeout=5)
-        if result.returncode == 0:
-            ffmpeg_version = result.stdout.splitlines()[0] if result.stdout else "Unknown version"
-            status['ffmpeg'] = 'healthy'
-            status['details']['ffmpeg'] = ffmpeg_version
-        else:
-            status['ffmpeg'] = 'error'
-            status['details']['ffmpeg'] = f"FFmpeg error: {result.stderr}"
-    except Exception as e:
-        status['ffmpeg'] = 'error'
-        status['details']['ffmpeg'] = str(e)
-        logger.error(f"FFmpeg health check failed: {e}")
-    
-    # Determine overall status
-    if 'error' in status.values():
-        status['overall'] = 'error'
-        http_status = 500
-    elif 'warning' in status.values():
-        status['overall'] = 'warning'
-        http_status = 200
-    else:
-        status['overall'] = 'healthy'
-        http_status = 200
-    
-    response = {
-        'status': status['overall'],
-        'timestamp': datetime.now().isoformat(),
-        'checks': {k: v for k, v in status.items() if k != 'details' and k != 'overall'},
-        'details': status['details']
-    }
-    
+    """Health check endpoint, served from the cached background snapshot (?deep=1 for fresh checks)"""
+    deep = request.args.get('deep', '').lower() in ('1', 'true', 'yes')
+    response = get_health_monitor().snapshot(deep=deep)
+    http_status = 500 if response['status'] == 'error' else 200
     return jsonify(response), http_status
 
 @app.errorhandler(404)
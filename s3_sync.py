@@ -0,0 +1,238 @@
+"""
+Synchronisatie tussen de S3 bucket en de Recording tabel.
+
+De S3 listing wordt pagina voor pagina in een dict (key -> metadata) gelezen
+en vergeleken met één geprojecteerde query op de database. Toevoegingen en
+verwijderingen worden in bulk en in één transactie uitgevoerd.
+
+Naast de volledige sync is er een incrementele modus: die onthoudt tot welke
+datum er gesynchroniseerd is (de watermark) en lijst daarna per station dat
+in die periode opnames heeft of kan hebben één keer opnames/<station>/,
+beginnend bij de watermark (StartAfter), in plaats van elke datum apart.
+"""
+
+import re
+import time
+import logging
+from datetime import datetime, date, timedelta
+from sqlalchemy import update, or_, and_
+from app import db
+from models import Station, Recording, SyncState
+from storage import refresh_station_day_stats, rebuild_station_day_stats, stored_on_s3
+from recording_batch import insert_ignore_duplicates
+from metrics import RECONCILE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# opnames/<station>/<YYYY-MM-DD>/<HH>.mp3
+RECORDING_KEY_RE = re.compile(r'^opnames/([^/]+)/(\d{4}-\d{2}-\d{2})/(\d{2})\.mp3$')
+
+# Maximaal aantal parameters per IN (...) clausule
+DELETE_BATCH_SIZE = 500
+
+WATERMARK_KEY = 's3_sync_watermark'
+
+
+def parse_recording_key(key):
+    """Split an S3 recording key into (station_name, date, hour), or None"""
+    match = RECORDING_KEY_RE.match(key)
+    if not match:
+        return None
+    station_name, date_str, hour = match.groups()
+    try:
+        recording_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+    return station_name, recording_date, hour
+
+
+def list_s3_objects(s3_client, bucket, prefix='opnames/', start_after=None):
+    """Stream list_objects_v2 pages into a dict of key -> object metadata (keys after start_after only)"""
+    objects = {}
+    paginator = s3_client.get_paginator('list_objects_v2')
+    params = {'Bucket': bucket, 'Prefix': prefix}
+    if start_after:
+        params['StartAfter'] = start_after
+    for page in paginator.paginate(**params):
+        for obj in page.get('Contents', ()):
+            objects[obj['Key']] = obj
+    return objects
+
+
+def apply_diff(s3_objects, prefix='opnames/', scope=None, rebuild_stats=False):
+    """Diff S3 objects against the Recording table and apply adds/removes in one transaction
+
+    When scope is a set of listed date prefixes (opnames/<station>/<date>/),
+    only database rows inside those prefixes are candidates for removal.
+    Rows without a known size get size and ETag from the listing.
+    """
+    # Eén geprojecteerde query in plaats van volledige ORM objecten
+    query = db.session.query(
+        Recording.filepath, Recording.id, Recording.station_id, Recording.date, Recording.size_bytes
+    ).filter(Recording.filepath.like(f'{prefix}%'), stored_on_s3())
+    if scope is not None:
+        scope_dates = set()
+        for scope_prefix in scope:
+            try:
+                scope_dates.add(datetime.strptime(scope_prefix.rstrip('/').rsplit('/', 1)[-1], '%Y-%m-%d').date())
+            except ValueError:
+                continue
+        query = query.filter(Recording.date.in_(scope_dates))
+    db_rows = {row[0]: row for row in query.all()}
+    if scope is not None:
+        db_rows = {path: row for path, row in db_rows.items() if path.rsplit('/', 1)[0] + '/' in scope}
+    station_ids = dict(db.session.query(Station.name, Station.id).all())
+
+    changed_days = set()
+    to_add = []
+    for key in s3_objects.keys() - db_rows.keys():
+        parsed = parse_recording_key(key)
+        if parsed is None:
+            continue
+        station_name, recording_date, hour = parsed
+        station_id = station_ids.get(station_name)
+        if station_id is None:
+            continue
+        obj = s3_objects[key]
+        to_add.append({
+            'station_id': station_id,
+            'date': recording_date,
+            'hour': hour,
+            'filepath': key,
+            'recording_type': 'scheduled',
+            's3_uploaded': True,
+            'size_bytes': obj.get('Size'),
+            'etag': obj.get('ETag', '').strip('"') or None,
+            'created_at': datetime.utcnow()
+        })
+        changed_days.add((station_id, recording_date))
+
+    to_remove = []
+    for path in db_rows.keys() - s3_objects.keys():
+        _, rec_id, station_id, recording_date, _ = db_rows[path]
+        to_remove.append(rec_id)
+        changed_days.add((station_id, recording_date))
+
+    # Ontbrekende groottes aanvullen vanuit de listing (geen HEAD requests)
+    to_update = []
+    for path in db_rows.keys() & s3_objects.keys():
+        _, rec_id, station_id, recording_date, size_bytes = db_rows[path]
+        obj = s3_objects[path]
+        if size_bytes != obj.get('Size'):
+            to_update.append({
+                'id': rec_id,
+                'size_bytes': obj.get('Size'),
+                'etag': obj.get('ETag', '').strip('"') or None,
+                's3_uploaded': True
+            })
+            changed_days.add((station_id, recording_date))
+
+    try:
+        if to_add:
+            db.session.execute(insert_ignore_duplicates(Recording), to_add)
+        if to_update:
+            db.session.execute(update(Recording), to_update)
+        for i in range(0, len(to_remove), DELETE_BATCH_SIZE):
+            batch = to_remove[i:i + DELETE_BATCH_SIZE]
+            Recording.query.filter(Recording.id.in_(batch)).delete(synchronize_session=False)
+        if rebuild_stats:
+            rebuild_station_day_stats()
+        else:
+            refresh_station_day_stats(changed_days)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return len(to_add), len(to_remove), len(db_rows)
+
+
+def get_watermark():
+    """Date up to which the S3 listing has been reconciled, or None"""
+    state = SyncState.query.get(WATERMARK_KEY)
+    if state is None or not state.value:
+        return None
+    try:
+        return datetime.strptime(state.value, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+def set_watermark(watermark_date):
+    """Store the reconcile watermark"""
+    state = SyncState.query.get(WATERMARK_KEY)
+    if state is None:
+        state = SyncState(key=WATERMARK_KEY)
+        db.session.add(state)
+    state.value = watermark_date.strftime('%Y-%m-%d')
+    db.session.commit()
+
+
+def _summary(mode, s3_count, db_count, added, removed, list_calls, started):
+    seconds = time.monotonic() - started
+    RECONCILE_SECONDS.observe(seconds, mode)
+    logger.info(f"🔄 S3 sync ({mode}): {s3_count} objecten, {db_count} records, "
+                f"{added} toegevoegd, {removed} verwijderd, {list_calls} LIST prefixes in {seconds:.2f}s")
+    return {
+        'mode': mode,
+        's3_objects': s3_count,
+        'db_records': db_count,
+        'added': added,
+        'removed': removed,
+        'list_prefixes': list_calls,
+        'seconds': seconds
+    }
+
+
+def sync_recordings_with_s3(s3_client, bucket, prefix='opnames/'):
+    """Full reconciliation of the Recording table with the S3 bucket"""
+    started = time.monotonic()
+    today = date.today()
+    s3_objects = list_s3_objects(s3_client, bucket, prefix)
+    added, removed, db_count = apply_diff(s3_objects, prefix, rebuild_stats=True)
+    set_watermark(today)
+    return _summary('volledig', len(s3_objects), db_count, added, removed, 1, started)
+
+
+def incremental_sync(s3_client, bucket, extra_prefixes=(), overlap_days=1, max_days=7):
+    """Reconcile only the date prefixes changed since the watermark
+
+    Only stations that can have recordings since the watermark (minus
+    overlap_days) are listed: stations with Recording rows in that period,
+    always-on stations and stations whose schedule overlaps it. Each of
+    them costs one paginated LIST of opnames/<station>/ starting after the
+    first date. extra_prefixes (e.g. the date folders the uploader just
+    wrote to) outside that are listed separately. Falls back to a full
+    sync when there is no watermark yet or it is more than max_days old.
+    """
+    watermark = get_watermark()
+    today = date.today()
+    if watermark is None or (today - watermark).days > max_days:
+        return sync_recordings_with_s3(s3_client, bucket)
+
+    started = time.monotonic()
+    start_date = min(watermark, today) - timedelta(days=overlap_days)
+    dates = [start_date + timedelta(days=i) for i in range((today - start_date).days + 1)]
+    recent = db.session.query(Recording.station_id).filter(Recording.date >= start_date).distinct()
+    station_names = [name for (name,) in db.session.query(Station.name).filter(or_(
+        Station.id.in_(recent),
+        Station.always_on.is_(True),
+        and_(Station.schedule_start_date <= today, Station.schedule_end_date >= start_date)
+    )).all()]
+
+    prefixes = {f"opnames/{name}/{day.strftime('%Y-%m-%d')}/" for name in station_names for day in dates}
+    extra = set(extra_prefixes) - prefixes
+    prefixes.update(extra)
+
+    # Datums sorteren als tekst, dus alles na "<station>/<startdatum>" valt in de periode
+    s3_objects = {}
+    for name in station_names:
+        s3_objects.update(list_s3_objects(s3_client, bucket, f"opnames/{name}/",
+                                          start_after=f"opnames/{name}/{start_date.strftime('%Y-%m-%d')}"))
+    for scope_prefix in sorted(extra):
+        s3_objects.update(list_s3_objects(s3_client, bucket, scope_prefix))
+
+    added, removed, db_count = apply_diff(s3_objects, scope=prefixes)
+    set_watermark(today)
+    return _summary('incrementeel', len(s3_objects), db_count, added, removed,
+                    len(station_names) + len(extra), started)
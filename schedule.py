@@ -1,15 +1,16 @@
 from app import app, scheduler, db
 from models import Station, Recording, ScheduledJob, DennisStation
-from datetime import datetime, date, timedelta
+from recorder import supervisor, build_segment_command
+from s3_sync import sync_recordings_with_s3
+from storage import initialize_s3_client
+from disk_monitor import get_disk_monitor
+from segments import staging_pattern, finalize_segments
+from datetime import datetime, timedelta
 from flask import url_for
 import logging
 import os
-import subprocess
-import signal
 import requests
-import tempfile
 import re
-import boto3
 from botocore.exceptions import ClientError
 import time
 
@@ -101,15 +102,14 @@ def check_scheduled_recordings():
                         should_record = True
                 
                 # Get running process info for this station
-                process_info = find_recording_process(station.recording_url)
-                is_running = process_info is not None
+                is_running = supervisor.is_running(station.id)
                 
                 if should_record and not is_running:
                     # Start recording
                     start_recording(station)
                 elif not should_record and is_running:
                     # Stop recording
-                    stop_recording(process_info['pid'])
+                    stop_recording(station.id)
         
         except Exception as e:
             logger.error(f"Error in check_scheduled_recordings: {e}")
@@ -120,16 +120,13 @@ def hourly_check():
         try:
             logger.info("Running hourly check")
             
-            # Restart all always-on recordings to ensure proper hourly segments
-            stations = Station.query.filter_by(always_on=True).all()
-            
-            for station in stations:
-                process_info = find_recording_process(station.recording_url)
-                if process_info:
-                    # Stop and restart the recording
-                    logger.info(f"Restarting always-on recording for {station.name}")
-                    stop_recording(process_info['pid'])
-                    start_recording(station)
+            # Always-on recordings keep running across hours (date-free segment
+            # pattern); only move the finished segments into place
+            finalize_segments(
+                app.config['RECORDINGS_DIR'],
+                busy_files=supervisor.active_files(),
+                skip_files=supervisor.lead_in_files()
+            )
             
             # Also check scheduled recordings
             check_scheduled_recordings()
@@ -137,39 +134,17 @@ def hourly_check():
         except Exception as e:
             logger.error(f"Error in hourly_check: {e}")
 
-def find_recording_process(stream_url):
-    """Find ffmpeg process for a given stream URL"""
-    try:
-        output = subprocess.check_output(["pgrep", "-af", "ffmpeg"]).decode('utf-8')
-        
-        for line in output.splitlines():
-            if stream_url in line:
-                parts = line.split(" ", 1)
-                if len(parts) >= 2:
-                    pid = int(parts[0])
-                    command = parts[1]
-                    
-                    # Extract output path if available
-                    # Zoek naar het outputpad in het ffmpeg commando
-                    recordings_dir = app.config['RECORDINGS_DIR']
-                    output_match = re.search(fr'({re.escape(recordings_dir)}/[^\s]+)', command)
-                    output_path = output_match.group(1) if output_match else None
-                    
-                    return {
-                        'pid': pid,
-                        'command': command,
-                        'output_path': output_path
-                    }
-        
-        return None
-    
-    except subprocess.CalledProcessError:
-        # No ffmpeg processes running
+def find_recording_process(station_id):
+    """Find the ffmpeg process recording a given station"""
+    recorder = supervisor.get(station_id)
+    if recorder is None:
         return None
     
-    except Exception as e:
-        logger.error(f"Error finding recording process: {e}")
-        return None
+    return {
+        'pid': recorder.pid,
+        'command': recorder.process.args,
+        'output_path': recorder.output_pattern
+    }
 
 def start_recording(station):
     """Start a recording for a station"""
@@ -177,46 +152,32 @@ def start_recording(station):
         logger.info(f"Starting recording for {station.name}")
         
         # Check disk space
-        disk_free = os.statvfs(app.config['RECORDINGS_DIR']).f_bfree * os.statvfs(app.config['RECORDINGS_DIR']).f_frsize
-        disk_free_gb = disk_free / (1024**3)
+        fits, needed_bytes, disk = get_disk_monitor().can_start()
         
-        if disk_free_gb < 2:
-            logger.warning(f"Insufficient disk space ({disk_free_gb:.2f} GB), not starting recording for {station.name}")
+        if not fits:
+            logger.warning(f"Insufficient disk space ({disk['free_gb']:.2f} GB free, {needed_bytes / (1024**3):.2f} GB needed), not starting recording for {station.name}")
             return False
         
         # Generate output path
         output_pattern = generate_output_path(station.name)
         
         # Build ffmpeg command
-        ffmpeg_cmd = [
-            app.config['FFMPEG_PATH'],
-            '-i', station.recording_url,
-            '-vn',  # No video
-            '-acodec', 'copy',  # Copy audio codec (no transcoding)
-            '-f', 'segment',  # Segment format
-            '-segment_time', '3600',  # 1-hour segments
-            '-reset_timestamps', '1',
-            '-segment_atclocktime', '1',
-            '-strftime', '1',
-            output_pattern
-        ]
-        
-        # Set environment variables
-        env = os.environ.copy()
-        env['TZ'] = 'Europe/Amsterdam'
+        ffmpeg_cmd = build_segment_command(app.config['FFMPEG_PATH'], station.recording_url, output_pattern)
         
         # Start the process
-        process = subprocess.Popen(
+        job_type = 'always_on' if station.always_on else 'scheduled'
+        process = supervisor.start(
+            station.id,
+            station.name,
+            station.recording_url,
+            output_pattern,
             ffmpeg_cmd,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-            env=env
+            job_type=job_type
         )
         
         logger.info(f"Started recording for {station.name} (PID: {process.pid})")
         
         # Create job record
-        job_type = 'always_on' if station.always_on else 'scheduled'
         job = ScheduledJob(
             job_id=f"{job_type}_{station.id}_{datetime.now().strftime('%Y%m%d%H%M%S')}",
             station_id=station.id,
@@ -234,31 +195,26 @@ def start_recording(station):
         logger.error(f"Error starting recording for {station.name}: {e}")
         return False
 
-def stop_recording(pid):
-    """Stop a recording process by PID"""
+def stop_recording(station_id):
+    """Stop the recording process of a station"""
     try:
-        logger.info(f"Stopping recording with PID {pid}")
-        
-        # Send SIGTERM to the process
-        os.kill(pid, signal.SIGTERM)
+        recorder = supervisor.get(station_id)
+        if recorder:
+            logger.info(f"Stopping recording with PID {recorder.pid}")
+            supervisor.stop(station_id)
         
-        # Update any job records
-        jobs = ScheduledJob.query.filter_by(status='running').all()
+        # Update job records
+        jobs = ScheduledJob.query.filter_by(station_id=station_id, status='running').all()
         for job in jobs:
-            # Find the process info for this station
-            station = Station.query.get(job.station_id)
-            if station:
-                process_info = find_recording_process(station.recording_url)
-                if not process_info:
-                    job.status = 'stopped'
-                    job.end_time = datetime.now()
+            job.status = 'stopped'
+            job.end_time = datetime.now()
         
         db.session.commit()
         
         return True
     
     except Exception as e:
-        logger.error(f"Error stopping recording (PID {pid}): {e}")
+        logger.error(f"Error stopping recording for station {station_id}: {e}")
         return False
 
 def check_running_recordings():
@@ -277,9 +233,7 @@ def check_running_recordings():
             
             # Check each station
             for station in stations:
-                process_info = find_recording_process(station.recording_url)
-                
-                if process_info:
+                if supervisor.is_running(station.id):
                     # Recording is running
                     job = ScheduledJob.query.filter_by(
                         station_id=station.id,
@@ -317,11 +271,7 @@ def upload_to_wasabi():
             logger.info("Starting upload to Wasabi")
             
             # Initialize S3 client
-            s3_client = boto3.client(
-                's3',
-                endpoint_url=app.config['S3_ENDPOINT'],
-                region_name=app.config['S3_REGION']
-            )
+            s3_client = initialize_s3_client()
             
             # Find MP3 files to upload
             mp3_files = []
@@ -421,114 +371,7 @@ def upload_to_wasabi():
 def sync_database_with_s3(s3_client):
     """Synchronize database records with files in S3"""
     logger.info("Syncing database with S3")
-    
-    # Get all S3 files
-    paginator = s3_client.get_paginator('list_objects_v2')
-    s3_files = []
-    
-    for page in paginator.paginate(Bucket=app.config['S3_BUCKET'], Prefix='opnames/'):
-        if 'Contents' in page:
-            for obj in page['Contents']:
-                s3_files.append(obj['Key'])
-    
-    logger.info(f"Found {len(s3_files)} files in S3")
-    
-    # Get all recordings in database
-    db_records = Recording.query.all()
-    db_filepaths = [rec.filepath for rec in db_records]
-    
-    logger.info(f"Found {len(db_records)} records in database")
-    
-    # Create temporary files for comparison
-    with tempfile.NamedTemporaryFile(mode='w+') as s3_file, \
-         tempfile.NamedTemporaryFile(mode='w+') as db_file:
-        
-        # Write S3 files to temp file
-        for file_path in sorted(s3_files):
-            s3_file.write(f"{file_path}\n")
-        
-        # Write DB records to temp file
-        for file_path in sorted(db_filepaths):
-            db_file.write(f"{file_path}\n")
-        
-        s3_file.flush()
-        db_file.flush()
-        
-        # Create temp files for differences
-        with tempfile.NamedTemporaryFile(mode='w+') as to_add, \
-             tempfile.NamedTemporaryFile(mode='w+') as to_remove:
-            
-            # Find files in S3 but not in DB
-            subprocess.run(
-                f"comm -13 {db_file.name} {s3_file.name}",
-                shell=True,
-                stdout=to_add,
-                stderr=subprocess.PIPE,
-                check=True
-            )
-            
-            # Find files in DB but not in S3
-            subprocess.run(
-                f"comm -23 {db_file.name} {s3_file.name}",
-                shell=True,
-                stdout=to_remove,
-                stderr=subprocess.PIPE,
-                check=True
-            )
-            
-            to_add.flush()
-            to_remove.flush()
-            
-            # Process files to add
-            to_add.seek(0)
-            for line in to_add:
-                s3_path = line.strip()
-                if not s3_path:
-                    continue
-                
-                # Parse path: opnames/station/date/hour.mp3
-                parts = s3_path.split('/')
-                if len(parts) >= 4:
-                    try:
-                        station_name = parts[1]
-                        date_str = parts[2]
-                        hour_file = parts[3]
-                        
-                        station = Station.query.filter_by(name=station_name).first()
-                        if station:
-                            hour = hour_file.replace('.mp3', '')
-                            recording_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-                            
-                            recording = Recording(
-                                station_id=station.id,
-                                date=recording_date,
-                                hour=hour,
-                                filepath=s3_path,
-                                recording_type='scheduled',
-                                s3_uploaded=True
-                            )
-                            
-                            db.session.add(recording)
-                            logger.info(f"Added record for {s3_path}")
-                    except Exception as e:
-                        logger.error(f"Error adding record for {s3_path}: {e}")
-            
-            # Process files to remove
-            to_remove.seek(0)
-            for line in to_remove:
-                db_path = line.strip()
-                if not db_path:
-                    continue
-                
-                try:
-                    recording = Recording.query.filter_by(filepath=db_path).first()
-                    if recording:
-                        db.session.delete(recording)
-                        logger.info(f"Removed record for {db_path}")
-                except Exception as e:
-                    logger.error(f"Error removing record for {db_path}: {e}")
-            
-            db.session.commit()
+    return sync_recordings_with_s3(s3_client, app.config['S3_BUCKET'])
 
 def cleanup_local_files():
     """Remove local files older than the retention period"""
@@ -681,23 +524,8 @@ def clean_logs():
 
 def generate_output_path(station_name):
     """Generate output path for ffmpeg recording"""
-    # Format: {RECORDINGS_DIR}/StationName/YYYY-MM-DD/%H.mp3
-    
-    # For 00:00, use today's date; for all other hours, use date from 1 hour ago
-    current_hour = datetime.now().hour
-    if current_hour == 0:
-        target_date = date.today()
-    else:
-        target_date = (datetime.now() - timedelta(hours=1)).date()
-    
-    directory = os.path.join(
-        app.config['RECORDINGS_DIR'],
-        station_name,
-        target_date.strftime('%Y-%m-%d')
-    )
-    
-    os.makedirs(directory, exist_ok=True)
-    return os.path.join(directory, '%H.mp3')
+    # Format: {RECORDINGS_DIR}/.incoming/StationName/%Y-%m-%d_%H.mp3
+    return staging_pattern(app.config['RECORDINGS_DIR'], station_name)
 
 if __name__ == "__main__":
     # This can be used to test the scheduler functions independently
@@ -0,0 +1,88 @@
+"""
+Zorgt dat de APScheduler (en dus alle opnames en uploads) in precies één
+proces draait, ook als gunicorn meerdere workers start.
+
+RUN_SCHEDULER bepaalt het gedrag:
+  auto  - het eerste proces dat de lock file kan claimen draait de scheduler,
+          de andere processen proberen het periodiek opnieuw (standaard)
+  true  - dit proces moet de scheduler draaien (scheduler_service.py)
+  false - alleen HTTP, nooit de scheduler (web workers naast de scheduler service)
+"""
+
+import os
+import fcntl
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_lock_file = None
+_is_leader = False
+_leader_lock = threading.Lock()
+
+RETRY_INTERVAL = 60  # seconden
+
+
+def acquire_scheduler_lock(path):
+    """Try to take the exclusive scheduler lock; the lock is held for the life of the process"""
+    global _lock_file, _is_leader
+    with _leader_lock:
+        if _is_leader:
+            return True
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        lock_file = open(path, 'a+')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        _lock_file = lock_file
+        _is_leader = True
+        return True
+
+
+def is_scheduler_process():
+    """True if this process owns the scheduler and the recorders"""
+    return _is_leader
+
+
+def start_background_scheduler(app, scheduler, start_scheduler):
+    """Start the scheduler in this process if it wins (or is assigned) the scheduler role"""
+    mode = str(app.config.get('RUN_SCHEDULER', 'auto')).lower()
+    lock_path = app.config['SCHEDULER_LOCK_PATH']
+
+    if mode in ('false', '0', 'no', 'off'):
+        logger.info(f"Scheduler uitgeschakeld in dit proces (PID {os.getpid()}), alleen HTTP")
+        return False
+
+    def _start():
+        start_scheduler(scheduler)
+        scheduler.start()
+        logger.info(f"Scheduler gestart in proces {os.getpid()}")
+
+    if acquire_scheduler_lock(lock_path):
+        _start()
+        return True
+
+    if mode in ('true', '1', 'yes', 'on'):
+        raise RuntimeError(f"Scheduler lock {lock_path} is al in gebruik door een ander proces")
+
+    logger.info(f"Scheduler draait al in een ander proces, PID {os.getpid()} bedient alleen HTTP")
+
+    # Neem de scheduler over als het huidige proces stopt
+    def _retry():
+        stop = threading.Event()
+        while not stop.wait(RETRY_INTERVAL):
+            if acquire_scheduler_lock(lock_path):
+                logger.info(f"Scheduler overgenomen door proces {os.getpid()}")
+                _start()
+                return
+
+    threading.Thread(target=_retry, name='scheduler-lock-retry', daemon=True).start()
+    return False
@@ -0,0 +1,42 @@
+"""
+Losse scheduler/recorder service voor de Radiologger.
+
+Draait de APScheduler met alle opname-, upload- en sync taken in een eigen
+proces, zodat de gunicorn workers (met RUN_SCHEDULER=false) alleen HTTP
+verzoeken afhandelen. Gebruik: python scheduler_service.py
+"""
+
+import os
+import signal
+import logging
+import threading
+
+# Dit proces moet de scheduler draaien
+os.environ['RUN_SCHEDULER'] = 'true'
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('scheduler_service')
+
+from app import app, scheduler
+from recorder import supervisor
+
+stop_event = threading.Event()
+
+def handle_signal(signum, frame):
+    logger.info(f"Signaal {signum} ontvangen, scheduler wordt gestopt")
+    stop_event.set()
+
+if __name__ == "__main__":
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    
+    logger.info(f"Radiologger scheduler service draait (PID {os.getpid()})")
+    while not stop_event.wait(1):
+        pass
+    
+    scheduler.shutdown(wait=False)
+    stopped = supervisor.stop_all()
+    logger.info(f"Scheduler gestopt, {stopped} opnames beëindigd")
@@ -0,0 +1,140 @@
+"""
+Afronden van opnamesegmenten.
+
+ffmpeg schrijft per station doorlopend naar één vaste map
+({RECORDINGS_DIR}/.incoming/<station>/) met een strftime patroon zonder
+datummap (%Y-%m-%d_%H.mp3). Daardoor hoeft ffmpeg nooit herstart te worden
+bij een nieuw uur of een nieuwe dag. Zodra een segment niet meer beschreven
+wordt, verplaatst finalize_segments() het naar de gebruikelijke plek
+<station>/<YYYY-MM-DD>/<HH>.mp3, waar de uploader het oppakt.
+
+Een uur wordt pas afgerond als het voorbij is. Start een recorder opnieuw
+binnen een uur (watchdog of handmatig), dan wordt het bestaande deel eerst
+in de staging map hernoemd naar <YYYY-MM-DD>_<HH>.part<N>.mp3 (stash_segment),
+zodat ffmpeg het niet overschrijft. Na afloop van het uur worden de delen en
+het laatste bestand in volgorde aan elkaar geplakt tot één uurbestand.
+"""
+
+import os
+import re
+import time
+import shutil
+import logging
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+STAGING_DIRNAME = '.incoming'
+SEGMENT_PATTERN = '%Y-%m-%d_%H.mp3'
+
+# <YYYY-MM-DD>_<HH>.mp3 of, na een herstart binnen het uur, <YYYY-MM-DD>_<HH>.part<N>.mp3
+SEGMENT_RE = re.compile(r'^(\d{4}-\d{2}-\d{2})_(\d{2})(?:\.part(\d+))?\.mp3$')
+
+
+def staging_dir(recordings_dir, station_name):
+    """Directory ffmpeg writes a station's segments to (created if missing)"""
+    directory = os.path.join(recordings_dir, STAGING_DIRNAME, station_name)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def staging_pattern(recordings_dir, station_name):
+    """strftime output pattern for a long-running segmenting recorder"""
+    return os.path.join(staging_dir(recordings_dir, station_name), SEGMENT_PATTERN)
+
+
+def staging_file(recordings_dir, station_name, moment):
+    """Staging path of the segment for the hour containing `moment`"""
+    return os.path.join(staging_dir(recordings_dir, station_name), moment.strftime(SEGMENT_PATTERN))
+
+
+def final_path(recordings_dir, station_name, segment_name):
+    """Final <station>/<date>/<HH>.mp3 path for a staged segment name, or None"""
+    match = SEGMENT_RE.match(segment_name)
+    if not match:
+        return None
+    date_str, hour, _ = match.groups()
+    return os.path.join(recordings_dir, station_name, date_str, f"{hour}.mp3")
+
+
+def stash_segment(recordings_dir, station_name, moment):
+    """Rename an existing staged segment for moment's hour to the next .part<N> name; returns the new path or None"""
+    source = staging_file(recordings_dir, station_name, moment)
+    if not os.path.exists(source):
+        return None
+    base = source[:-len('.mp3')]
+    number = 1
+    while os.path.exists(f"{base}.part{number}.mp3"):
+        number += 1
+    target = f"{base}.part{number}.mp3"
+    os.replace(source, target)
+    return target
+
+
+def _move_segment(sources, target):
+    """Move an hour into place; restart parts are concatenated in order (MP3 frames can be appended)"""
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if len(sources) == 1 and not os.path.exists(target):
+        os.replace(sources[0], target)
+        return
+    # Eerst volledig naar een tijdelijk bestand, de uploader ziet alleen het afgeronde uur
+    temp = f"{target}.tmp"
+    if os.path.exists(target):
+        shutil.copyfile(target, temp)
+    with open(temp, 'ab') as out:
+        for source in sources:
+            with open(source, 'rb') as part:
+                shutil.copyfileobj(part, out, 1024 * 1024)
+    os.replace(temp, target)
+    for source in sources:
+        os.remove(source)
+
+
+def finalize_segments(recordings_dir, busy_files=(), skip_files=(), min_age=10, stations=None):
+    """Move every staged hour that has ended into place
+
+    busy_files are segments a recorder is still writing; an hour with a busy
+    file is left alone. skip_files are segments that must stay where they
+    are (e.g. lead-in segments that will be deleted). Hours that have not
+    ended yet, or with a file modified less than min_age seconds ago, are
+    left alone so ffmpeg can flush the tail of the previous hour. stations
+    limits the run to those station names. Returns the list of final paths.
+    """
+    root = os.path.join(recordings_dir, STAGING_DIRNAME)
+    if not os.path.isdir(root):
+        return []
+
+    busy = set(busy_files)
+    skip = set(skip_files)
+    now = time.time()
+    finalized = []
+    for station_name in (stations if stations is not None else os.listdir(root)):
+        directory = os.path.join(root, station_name)
+        if not os.path.isdir(directory):
+            continue
+
+        # Delen per uur verzamelen: eerst .part1, .part2, ... en het laatst geschreven bestand als laatste
+        hours = {}
+        for name in os.listdir(directory):
+            match = SEGMENT_RE.match(name)
+            if match:
+                date_str, hour, part = match.groups()
+                order = int(part) if part else float('inf')
+                hours.setdefault((date_str, hour), []).append((order, os.path.join(directory, name)))
+
+        for (date_str, hour), parts in sorted(hours.items()):
+            sources = [path for _, path in sorted(parts) if path not in skip]
+            if not sources or any(path in busy for path in sources):
+                continue
+            target = os.path.join(recordings_dir, station_name, date_str, f"{hour}.mp3")
+            try:
+                hour_end = datetime.strptime(f"{date_str} {hour}", '%Y-%m-%d %H') + timedelta(hours=1)
+                if datetime.now() < hour_end:
+                    continue
+                if any(now - os.path.getmtime(path) < min_age for path in sources):
+                    continue
+                _move_segment(sources, target)
+                finalized.append(target)
+            except (OSError, ValueError) as e:
+                logger.error(f"Kon segmenten voor {station_name} {date_str} {hour}:00 niet afronden: {e}")
+    return finalized
@@ -0,0 +1,112 @@
+"""
+Detectie van stilte en dode lucht in afgeronde opnames.
+
+Een stream kan bereikbaar zijn en toch niets uitzenden. Daarom wordt elk
+afgerond uur vóór de upload één keer gedecodeerd (dezelfde ffmpeg pipe als
+voor de waveform peaks). Per venster van 100 ms wordt de RMS in dBFS berekend
+(gevectoriseerd per blok van 10 seconden); vensters onder
+SILENCE_THRESHOLD_DB die samen minstens SILENCE_MIN_SECONDS aaneengesloten
+stil zijn vormen een stilte. Het resultaat is het aandeel stilte
+(silence_ratio) en de lijst stiltes als [begin, eind] in seconden vanaf het
+begin van de opname. Runs lopen gewoon door over blokgrenzen heen.
+"""
+
+import math
+import logging
+
+import numpy as np
+
+from waveform import SAMPLE_RATE, PeakAccumulator, decode_pcm
+
+logger = logging.getLogger(__name__)
+
+WINDOW_SECONDS = 0.1
+ALL_SILENT_RATIO = 0.99  # vanaf dit aandeel stilte geldt een uur als helemaal stil
+
+
+class SilenceDetector:
+    """Streaming RMS and silence-run detection over decoded PCM blocks"""
+
+    def __init__(self, threshold_db=-50.0, min_seconds=10.0, sample_rate=SAMPLE_RATE,
+                 window_seconds=WINDOW_SECONDS):
+        self.window = max(1, int(sample_rate * window_seconds))
+        self.window_seconds = self.window / sample_rate
+        self.sample_rate = sample_rate
+        # Drempel als kwadraat van de amplitude, dan is per venster geen log10 nodig
+        self.threshold_square = (10 ** (threshold_db / 20) * 32768) ** 2
+        self.min_windows = max(1, int(round(min_seconds / self.window_seconds)))
+        self.samples = 0
+        self.windows = 0
+        self._square_sum = 0.0
+        self._run_start = None  # venster waarin de lopende stille run begon
+        self._runs = []
+
+    def _close_run(self, end):
+        if self._run_start is not None and end - self._run_start >= self.min_windows:
+            self._runs.append((int(self._run_start), int(end)))
+        self._run_start = None
+
+    def add(self, samples):
+        """Process one block of int16 samples"""
+        if not len(samples):
+            return
+        values = samples.astype(np.float64)
+        squares = values * values
+        self._square_sum += float(squares.sum())
+        self.samples += len(samples)
+
+        # Gemiddeld kwadraat per venster; een kort laatste venster telt met zijn eigen lengte
+        full = len(squares) // self.window
+        means = squares[:full * self.window].reshape(-1, self.window).mean(axis=1)
+        if len(squares) > full * self.window:
+            means = np.append(means, squares[full * self.window:].mean())
+        silent = means < self.threshold_square
+
+        # Begin en eind van stille runs binnen dit blok (padding met False aan beide kanten)
+        edges = np.diff(np.concatenate(([False], silent, [False])).astype(np.int8))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        offset = self.windows
+        carried, self._run_start = self._run_start, None
+        if carried is not None and not silent[0]:
+            self._run_start = carried
+            self._close_run(offset)
+        for start, end in zip(starts, ends):
+            # Een run op positie 0 is de voortzetting van de stilte uit het vorige blok
+            self._run_start = carried if start == 0 and carried is not None else offset + start
+            if end < len(silent):
+                self._close_run(offset + end)
+        self.windows += len(silent)
+
+    def result(self):
+        """{'duration', 'rms_db', 'silence_ratio', 'gaps'}; gaps are [start, end] seconds"""
+        self._close_run(self.windows)
+        duration = self.samples / self.sample_rate
+        silent_windows = sum(end - start for start, end in self._runs)
+        rms = (self._square_sum / self.samples) ** 0.5 if self.samples else 0.0
+        return {
+            'duration': round(duration, 1),
+            'rms_db': round(20 * math.log10(rms / 32768), 1) if rms > 0 else None,
+            'silence_ratio': round(min(silent_windows / self.windows, 1.0), 4) if self.windows else 1.0,
+            'gaps': [[round(start * self.window_seconds, 1), round(min(end * self.window_seconds, duration), 1)]
+                     for start, end in self._runs]
+        }
+
+
+def analyse_recording(path, ffmpeg_path, threshold_db=-50.0, min_seconds=10.0):
+    """Decode a recording once: silence stats plus waveform peaks ('peaks'), or None on failure"""
+    detector = SilenceDetector(threshold_db, min_seconds)
+    peaks = PeakAccumulator()
+    try:
+        for samples in decode_pcm(path, ffmpeg_path):
+            detector.add(samples)
+            peaks.add(samples)
+    except Exception as e:
+        logger.error(f"Error analysing {path}: {e}")
+        return None
+    if not detector.samples:
+        logger.error(f"Error analysing {path}: no audio decoded")
+        return None
+    analysis = detector.result()
+    analysis['peaks'] = peaks.to_bytes()
+    return analysis
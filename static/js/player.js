@@ -15,6 +15,7 @@ document.addEventListener('DOMContentLoaded', function() {
     const endInput = document.getElementById('end');
     const markerDisplay = document.getElementById('markerDisplay');
     const downloadForm = document.getElementById('downloadForm');
+    const waveform = document.getElementById('waveform');
     
     // State
     let isPlaying = false;
@@ -43,11 +44,80 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
     
+    // Waveform overview
+    let peaks = null;
+    const peaksPerSecond = waveform ? parseFloat(waveform.dataset.peaksPerSecond) || 10 : 10;
+    
+    function waveformDuration() {
+        return isFinite(audio.duration) ? audio.duration : (peaks ? peaks.length / peaksPerSecond : 0);
+    }
+    
+    function drawWaveform() {
+        if (!waveform || !peaks) return;
+        
+        const ratio = window.devicePixelRatio || 1;
+        const width = waveform.clientWidth;
+        const height = waveform.clientHeight;
+        waveform.width = width * ratio;
+        waveform.height = height * ratio;
+        
+        const ctx = waveform.getContext('2d');
+        ctx.scale(ratio, ratio);
+        ctx.clearRect(0, 0, width, height);
+        
+        const duration = waveformDuration();
+        const played = duration ? audio.currentTime / duration * width : 0;
+        const perPixel = peaks.length / width;
+        const middle = height / 2;
+        
+        for (let x = 0; x < width; x++) {
+            // Hoogste piek binnen deze pixelkolom
+            let max = 0;
+            const end = Math.min(peaks.length, Math.ceil((x + 1) * perPixel));
+            for (let i = Math.floor(x * perPixel); i < end; i++) {
+                if (peaks[i] > max) max = peaks[i];
+            }
+            const barHeight = Math.max(1, max / 255 * middle);
+            ctx.fillStyle = x < played ? '#0d6efd' : '#6c757d';
+            ctx.fillRect(x, middle - barHeight, 1, barHeight * 2);
+        }
+        
+        // Playhead
+        ctx.fillStyle = '#ffffff';
+        ctx.fillRect(Math.floor(played), 0, 1, height);
+    }
+    
+    if (waveform) {
+        fetch(waveform.dataset.peaksUrl)
+            .then(response => {
+                if (!response.ok) throw new Error('Geen waveform beschikbaar');
+                return response.arrayBuffer();
+            })
+            .then(buffer => {
+                peaks = new Uint8Array(buffer);
+                drawWaveform();
+            })
+            .catch(() => {
+                waveform.style.display = 'none';
+            });
+        
+        waveform.addEventListener('click', (e) => {
+            const duration = waveformDuration();
+            if (!duration) return;
+            const rect = waveform.getBoundingClientRect();
+            audio.currentTime = Math.min(duration, (e.clientX - rect.left) / rect.width * duration);
+            drawWaveform();
+        });
+        
+        window.addEventListener('resize', drawWaveform);
+    }
+    
     // Event listeners
     audio.addEventListener('timeupdate', () => {
         let currentTime = formatTime(audio.currentTime);
         let duration = formatTime(audio.duration);
         timeIndicator.textContent = currentTime + " / " + duration;
+        drawWaveform();
     });
     
     audio.addEventListener('play', () => {
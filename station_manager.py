@@ -1,15 +1,15 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
-from app import db, app
-from models import Station, Recording
+from app import db
+from models import Station, Recording, ScheduledJob, StationDayStats, RecordingGap
 from forms import StationForm, TestStreamForm
 from auth import editor_required, admin_required
 from datetime import datetime
 from stream_utils import test_stream
 import logging
-import os
-from storage import list_s3_files, count_station_recordings
+from storage import list_s3_files, count_recordings_per_station
 from logger import start_manual_recording, stop_recording
+from disk_monitor import get_disk_monitor
 
 station_bp = Blueprint('station', __name__)
 logger = logging.getLogger(__name__)
@@ -21,10 +21,9 @@ def manage_stations():
     # Sorteer stations op display_order en dan op naam
     stations = Station.query.order_by(Station.display_order, Station.name).all()
     
-    # Get recording counts for each station
-    station_counts = {}
-    for station in stations:
-        station_counts[station.id] = count_station_recordings(station.id)
+    # Get recording counts for all stations in one query
+    counts = count_recordings_per_station()
+    station_counts = {station.id: counts.get(station.id, 0) for station in stations}
     
     return render_template('manage_stations.html',
                           title='Stations Beheer',
@@ -161,8 +160,10 @@ def delete_station(station_id):
         # Delete all scheduled jobs for this station
         ScheduledJob.query.filter_by(station_id=station_id).delete()
         
-        # Delete all recordings for this station
+        # Delete all recordings and daily totals for this station
         Recording.query.filter_by(station_id=station_id).delete()
+        StationDayStats.query.filter_by(station_id=station_id).delete()
+        RecordingGap.query.filter_by(station_id=station_id).delete()
         
         # Delete the station
         db.session.delete(station)
@@ -185,11 +186,10 @@ def start_manual(station_id):
     
     try:
         # Check disk space
-        disk_free = os.statvfs(app.config['RECORDINGS_DIR']).f_bfree * os.statvfs(app.config['RECORDINGS_DIR']).f_frsize
-        disk_free_gb = disk_free / (1024**3)
+        fits, needed_bytes, disk = get_disk_monitor().can_start()
         
-        if disk_free_gb < 2:
-            flash(f'Onvoldoende schijfruimte: {disk_free_gb:.2f} GB beschikbaar', 'danger')
+        if not fits:
+            flash(f"Onvoldoende schijfruimte: {disk['free_gb']:.2f} GB beschikbaar, {needed_bytes / (1024**3):.2f} GB nodig", 'danger')
             return redirect(url_for('station.manage_stations'))
         
         result = start_manual_recording(station_id)
@@ -1,22 +1,65 @@
 import os
+import time
 import boto3
 import logging
+import threading
+from collections import OrderedDict
+from botocore.config import Config as BotoConfig
 from app import app, db
-from models import Recording
+from models import Recording, StationDayStats, RecordingGap, Station, DennisStation
+from metrics import instrument_s3_client
+from mp3_frames import FrameIndex
 from datetime import datetime
 from botocore.exceptions import ClientError
+from sqlalchemy import func, insert, select, or_
 
 logger = logging.getLogger(__name__)
 
-def initialize_s3_client():
-    """Initialize the S3 client for Wasabi"""
-    return boto3.client(
-        's3',
-        endpoint_url=app.config['WASABI_ENDPOINT_URL'],
-        region_name=app.config['WASABI_REGION'],
-        aws_access_key_id=app.config['WASABI_ACCESS_KEY'],
-        aws_secret_access_key=app.config['WASABI_SECRET_KEY']
+# Eén S3 client per configuratie, gedeeld door alle threads van het proces
+_s3_clients = {}
+_s3_clients_lock = threading.Lock()
+
+# Presigned URLs per (key, geldigheid, tijdvak)
+PRESIGNED_CACHE_SIZE = 2048
+_presigned_cache = OrderedDict()
+_presigned_lock = threading.Lock()
+
+# Frame index sidecars (±15 KB per uur) per opname key; ontbrekende korter onthouden
+FRAME_INDEX_CACHE_SIZE = 256
+FRAME_INDEX_TTL = 3600
+FRAME_INDEX_MISS_TTL = 600
+_frame_index_cache = OrderedDict()
+_frame_index_lock = threading.Lock()
+
+def initialize_s3_client(max_pool_connections=None):
+    """Return the shared S3 client for Wasabi (created once per process)"""
+    pool_size = max(app.config.get('S3_MAX_POOL_CONNECTIONS', 50), max_pool_connections or 0)
+    cache_key = (
+        app.config['WASABI_ENDPOINT_URL'],
+        app.config['WASABI_REGION'],
+        app.config['WASABI_ACCESS_KEY'],
+        app.config['WASABI_SECRET_KEY'],
+        pool_size
     )
+    
+    with _s3_clients_lock:
+        client = _s3_clients.get(cache_key)
+        if client is None:
+            client = boto3.client(
+                's3',
+                endpoint_url=app.config['WASABI_ENDPOINT_URL'],
+                region_name=app.config['WASABI_REGION'],
+                aws_access_key_id=app.config['WASABI_ACCESS_KEY'],
+                aws_secret_access_key=app.config['WASABI_SECRET_KEY'],
+                config=BotoConfig(
+                    max_pool_connections=pool_size,
+                    retries={'max_attempts': 5, 'mode': 'standard'},
+                    tcp_keepalive=True
+                )
+            )
+            instrument_s3_client(client)
+            _s3_clients[cache_key] = client
+        return client
 
 def list_s3_files(prefix=''):
     """List files in the S3 bucket with the given prefix"""
@@ -42,23 +85,118 @@ def list_s3_files(prefix=''):
         logger.error(f"Error listing S3 files: {e}")
         return []
 
-def generate_presigned_url(s3_key, expires_in=3600):
-    """Generate a presigned URL for an S3 object"""
+def generate_presigned_url(s3_key, expires_in=3600, download_name=None):
+    """Generate a presigned URL for an S3 object (cached per time bucket), optionally as attachment"""
     try:
-        s3_client = initialize_s3_client()
+        # URLs worden per tijdvak van een kwart van de geldigheid hergebruikt. Ze worden
+        # met een tijdvak extra geldigheid getekend, zodat elke uitgegeven URL nog
+        # minimaal expires_in seconden geldig is.
+        bucket_seconds = max(60, expires_in // 4)
+        now = time.time()
+        time_bucket = int(now // bucket_seconds)
+        cache_key = (s3_key, expires_in, time_bucket, download_name)
+        
+        with _presigned_lock:
+            url = _presigned_cache.get(cache_key)
+            if url is not None:
+                _presigned_cache.move_to_end(cache_key)
+                return url
         
+        s3_client = initialize_s3_client()
+        signed_for = expires_in + ((time_bucket + 1) * bucket_seconds - int(now))
+        params = {'Bucket': app.config['WASABI_BUCKET'], 'Key': s3_key}
+        if download_name:
+            params['ResponseContentDisposition'] = f'attachment; filename="{download_name}"'
         url = s3_client.generate_presigned_url(
             'get_object',
-            Params={'Bucket': app.config['WASABI_BUCKET'], 'Key': s3_key},
-            ExpiresIn=expires_in
+            Params=params,
+            ExpiresIn=signed_for
         )
         
+        with _presigned_lock:
+            _presigned_cache[cache_key] = url
+            while len(_presigned_cache) > PRESIGNED_CACHE_SIZE:
+                _presigned_cache.popitem(last=False)
+        
         return url
     
     except Exception as e:
         logger.error(f"Error generating presigned URL for {s3_key}: {e}")
         return None
 
+def frame_index_key(s3_key):
+    """S3 key of the frame index sidecar of a recording"""
+    return f"{s3_key}.idx"
+
+def upload_frame_index(s3_client, s3_key, index):
+    """Store a recording's FrameIndex next to it on S3"""
+    s3_client.put_object(
+        Bucket=app.config['WASABI_BUCKET'],
+        Key=frame_index_key(s3_key),
+        Body=index.to_bytes(),
+        ContentType='application/octet-stream'
+    )
+
+def load_frame_index(s3_key):
+    """FrameIndex of a recording from its sidecar (cached), or None when it has none"""
+    now = time.time()
+    with _frame_index_lock:
+        entry = _frame_index_cache.get(s3_key)
+        if entry is not None and entry[0] > now:
+            _frame_index_cache.move_to_end(s3_key)
+            return entry[1]
+    
+    try:
+        s3_client = initialize_s3_client()
+        obj = s3_client.get_object(Bucket=app.config['WASABI_BUCKET'], Key=frame_index_key(s3_key))
+        index = FrameIndex.from_bytes(obj['Body'].read())
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('NoSuchKey', '404'):
+            logger.error(f"Error loading frame index for {s3_key}: {e}")
+            return None
+        index = None
+    except Exception as e:
+        logger.error(f"Error loading frame index for {s3_key}: {e}")
+        return None
+    
+    with _frame_index_lock:
+        _frame_index_cache[s3_key] = (now + (FRAME_INDEX_TTL if index else FRAME_INDEX_MISS_TTL), index)
+        while len(_frame_index_cache) > FRAME_INDEX_CACHE_SIZE:
+            _frame_index_cache.popitem(last=False)
+    return index
+
+def peaks_key(s3_key):
+    """S3 key of the waveform peaks sidecar of a recording"""
+    return f"{s3_key}.peaks"
+
+def upload_peaks(s3_client, s3_key, peaks):
+    """Store a recording's waveform peaks next to it on S3"""
+    s3_client.put_object(
+        Bucket=app.config['WASABI_BUCKET'],
+        Key=peaks_key(s3_key),
+        Body=peaks,
+        ContentType='application/octet-stream'
+    )
+
+def load_peaks(s3_key):
+    """Waveform peaks of a recording, or None when it has none"""
+    try:
+        s3_client = initialize_s3_client()
+        obj = s3_client.get_object(Bucket=app.config['WASABI_BUCKET'], Key=peaks_key(s3_key))
+        return obj['Body'].read()
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('NoSuchKey', '404'):
+            logger.error(f"Error loading waveform peaks for {s3_key}: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"Error loading waveform peaks for {s3_key}: {e}")
+        return None
+
+def forget_frame_index(s3_key):
+    """Drop a cached index, e.g. after the recording was replaced"""
+    with _frame_index_lock:
+        _frame_index_cache.pop(s3_key, None)
+
 def upload_file_to_s3(local_path, s3_key):
     """Upload a file to S3"""
     try:
@@ -113,27 +251,120 @@ def count_station_recordings(station_id):
         logger.error(f"Error counting recordings for station {station_id}: {e}")
         return 0
 
+def count_recordings_per_station():
+    """Count recordings for all stations in one grouped query"""
+    try:
+        rows = db.session.query(Recording.station_id, func.count(Recording.id)).group_by(Recording.station_id).all()
+        return dict(rows)
+    except Exception as e:
+        logger.error(f"Error counting recordings per station: {e}")
+        return {}
+
+def dashboard_counts(day):
+    """Station, recording and Dennis counts for the status page in one statement"""
+    def count(model, *criteria):
+        return select(func.count()).select_from(model).where(*criteria).scalar_subquery()
+    
+    columns = {
+        'total_recordings': count(Recording),
+        'todays_recordings': count(Recording, Recording.date == day),
+        'total_stations': count(Station),
+        'always_on_stations': count(Station, Station.always_on == True),
+        'scheduled_stations': count(Station, Station.schedule_start_date != None, Station.schedule_end_date != None),
+        'dennis_count': count(DennisStation),
+        'dennis_visible': count(DennisStation, DennisStation.visible_in_logger == True)
+    }
+    try:
+        row = db.session.execute(select(*[column.label(name) for name, column in columns.items()])).one()
+        return dict(row._mapping)
+    except Exception as e:
+        logger.error(f"Error counting dashboard statistics: {e}")
+        return dict.fromkeys(columns, 0)
+
+def lost_minutes_per_station(day):
+    """Minutes without recording per station on a given day (from RecordingGap)"""
+    try:
+        rows = db.session.query(RecordingGap.station_id, func.sum(RecordingGap.seconds)).filter(
+            RecordingGap.date == day
+        ).group_by(RecordingGap.station_id).all()
+        return {station_id: round((seconds or 0) / 60, 1) for station_id, seconds in rows}
+    except Exception as e:
+        logger.error(f"Error summing recording gaps: {e}")
+        return {}
+
+def stored_on_s3():
+    """Filter leaving out hours that were deliberately not uploaded (all silent, SKIP_SILENT_UPLOADS)"""
+    return or_(Recording.s3_uploaded.isnot(False), Recording.silence_ratio.is_(None))
+
+def refresh_station_day_stats(pairs):
+    """Recompute the per-station, per-day rollup for the given (station_id, date) pairs (no commit)"""
+    pairs = set(pairs)
+    if not pairs:
+        return
+    station_ids = {station_id for station_id, _ in pairs}
+    dates = {day for _, day in pairs}
+    
+    rows = db.session.query(
+        Recording.station_id,
+        Recording.date,
+        func.count(Recording.id),
+        func.coalesce(func.sum(Recording.size_bytes), 0)
+    ).filter(
+        Recording.station_id.in_(station_ids),
+        Recording.date.in_(dates),
+        stored_on_s3()
+    ).group_by(Recording.station_id, Recording.date).all()
+    totals = {(station_id, day): (count, total) for station_id, day, count, total in rows}
+    
+    existing = {
+        (stats.station_id, stats.date): stats
+        for stats in StationDayStats.query.filter(
+            StationDayStats.station_id.in_(station_ids),
+            StationDayStats.date.in_(dates)
+        )
+    }
+    
+    for pair in pairs:
+        count, total = totals.get(pair, (0, 0))
+        stats = existing.get(pair)
+        if stats is None:
+            if count == 0:
+                continue
+            stats = StationDayStats(station_id=pair[0], date=pair[1])
+            db.session.add(stats)
+        stats.recording_count = count
+        stats.total_bytes = int(total)
+
+def rebuild_station_day_stats():
+    """Rebuild the whole per-station, per-day rollup from the Recording table (no commit)"""
+    rows = db.session.query(
+        Recording.station_id,
+        Recording.date,
+        func.count(Recording.id),
+        func.coalesce(func.sum(Recording.size_bytes), 0)
+    ).filter(stored_on_s3()).group_by(Recording.station_id, Recording.date).all()
+    
+    StationDayStats.query.delete(synchronize_session=False)
+    if rows:
+        now = datetime.utcnow()
+        db.session.execute(insert(StationDayStats), [
+            {
+                'station_id': station_id,
+                'date': day,
+                'recording_count': count,
+                'total_bytes': int(total),
+                'updated_at': now
+            }
+            for station_id, day, count, total in rows
+        ])
+
 def get_station_recording_size(station_id):
     """Get the total size of recordings for a station"""
     try:
-        # Get all recordings for this station
-        recordings = Recording.query.filter_by(station_id=station_id).all()
-        
-        # Get file paths
-        s3_keys = [rec.filepath for rec in recordings]
-        
-        # Check size in S3
-        total_size = 0
-        s3_client = initialize_s3_client()
-        
-        for key in s3_keys:
-            try:
-                response = s3_client.head_object(Bucket=app.config['WASABI_BUCKET'], Key=key)
-                total_size += response['ContentLength']
-            except Exception:
-                pass
-        
-        return total_size
+        total = db.session.query(func.sum(StationDayStats.total_bytes)).filter(
+            StationDayStats.station_id == station_id
+        ).scalar()
+        return int(total or 0)
     
     except Exception as e:
         logger.error(f"Error getting recording size for station {station_id}: {e}")
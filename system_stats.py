@@ -0,0 +1,153 @@
+"""
+Systeemstatistieken voor de statuspagina.
+
+Het scheduler proces meet periodiek CPU, geheugen, load, schijf I/O en per
+ffmpeg recorder het RSS geheugen en CPU gebruik, en schrijft die meting
+(met een korte rollende reeks) naar SYSTEM_STATS_PATH. De web workers lezen
+alleen dat bestand; er wordt bij een paginaweergave niets geblokkeerd of
+gemeten met een wachttijd.
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+HISTORY_LENGTH = 120  # tien minuten bij een meting per 5 seconden
+
+
+class SystemStatsSampler:
+    """Rolling system and per-recorder resource samples"""
+
+    def __init__(self, pid_source, history=HISTORY_LENGTH):
+        self.pid_source = pid_source
+        self._lock = threading.Lock()
+        self._series = deque(maxlen=history)
+        self._processes = {}
+        self._last_io = None
+        self._latest = None
+        # Eerste aanroep zet alleen het referentiepunt; cpu_percent(None) blokkeert niet
+        psutil.cpu_percent(interval=None)
+
+    def _disk_io(self, now):
+        try:
+            counters = psutil.disk_io_counters()
+        except Exception:
+            counters = None
+        if counters is None:
+            return {'read_bytes_per_second': None, 'write_bytes_per_second': None}
+
+        last, self._last_io = self._last_io, (now, counters.read_bytes, counters.write_bytes)
+        if last is None or now <= last[0]:
+            return {'read_bytes_per_second': None, 'write_bytes_per_second': None}
+        elapsed = now - last[0]
+        return {
+            'read_bytes_per_second': round(max(counters.read_bytes - last[1], 0) / elapsed, 1),
+            'write_bytes_per_second': round(max(counters.write_bytes - last[2], 0) / elapsed, 1)
+        }
+
+    def _recorders(self):
+        """RSS and CPU per recorder; psutil.Process objects are kept so cpu_percent measures since the last sample"""
+        recorders = []
+        seen = set()
+        for station_name, pid in self.pid_source():
+            seen.add(pid)
+            process = self._processes.get(pid)
+            try:
+                if process is None:
+                    process = self._processes[pid] = psutil.Process(pid)
+                    process.cpu_percent(interval=None)
+                with process.oneshot():
+                    recorders.append({
+                        'station': station_name,
+                        'pid': pid,
+                        'rss_mb': round(process.memory_info().rss / (1024 * 1024), 1),
+                        'cpu_percent': process.cpu_percent(interval=None)
+                    })
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                self._processes.pop(pid, None)
+        for pid in set(self._processes) - seen:
+            del self._processes[pid]
+        return recorders
+
+    def sample(self):
+        """Take one sample (non-blocking) and return it"""
+        now = time.time()
+        memory = psutil.virtual_memory()
+        try:
+            load = [round(value, 2) for value in os.getloadavg()]
+        except OSError:
+            load = None
+
+        with self._lock:
+            recorders = self._recorders()
+            sample = {
+                'ts': round(now, 1),
+                'cpu_percent': psutil.cpu_percent(interval=None),
+                'memory_percent': memory.percent,
+                'memory_used': memory.used // (1024 * 1024),  # MB
+                'memory_total': memory.total // (1024 * 1024),  # MB
+                'load': load,
+                **self._disk_io(now),
+                'recorder_count': len(recorders),
+                'recorder_rss_mb': round(sum(r['rss_mb'] for r in recorders), 1),
+                'recorder_cpu_percent': round(sum(r['cpu_percent'] for r in recorders), 1)
+            }
+            self._series.append(sample)
+            self._latest = {**sample, 'recorders': recorders}
+            return self._latest
+
+    def snapshot(self):
+        """Latest sample with the per-recorder list, plus the rolling series (JSON serialisable)"""
+        with self._lock:
+            if self._latest is None:
+                return None
+            return {'latest': self._latest, 'series': list(self._series)}
+
+
+def _recorder_pids():
+    from app import app
+    from recorder import supervisor, read_status_file
+    from scheduler_lock import is_scheduler_process
+    if is_scheduler_process():
+        return [(recorder.station_name, recorder.pid) for recorder in supervisor.running()]
+    recorders = read_status_file(app.config['RECORDER_STATUS_PATH']) or []
+    return [(recorder['station_name'], recorder['pid']) for recorder in recorders if recorder.get('pid')]
+
+
+sampler = None
+_sampler_lock = threading.Lock()
+
+
+def get_sampler():
+    """Process-wide sampler"""
+    global sampler
+    with _sampler_lock:
+        if sampler is None:
+            sampler = SystemStatsSampler(_recorder_pids)
+        return sampler
+
+
+def get_system_stats():
+    """Latest system stats: published by the scheduler, or sampled here when that file is stale"""
+    from app import app
+    from recorder import read_status_file
+    from scheduler_lock import is_scheduler_process
+
+    if is_scheduler_process():
+        stats = get_sampler().snapshot()
+    else:
+        stats = read_status_file(app.config['SYSTEM_STATS_PATH'],
+                                 max_age=max(app.config['SYSTEM_STATS_INTERVAL'] * 4, 30), key='system')
+    if stats:
+        return stats
+
+    # Terugval (nog niets gepubliceerd): een losse meting kost alleen wat /proc reads
+    local = get_sampler()
+    local.sample()
+    return local.snapshot()
@@ -104,12 +104,12 @@ else
     # Update essentiële pakketten handmatig als fallback
     /opt/radiologger/venv/bin/pip install --upgrade flask flask-login flask-sqlalchemy flask-wtf flask-migrate
     /opt/radiologger/venv/bin/pip install --upgrade python-dotenv sqlalchemy apscheduler boto3 requests
-    /opt/radiologger/venv/bin/pip install --upgrade trafilatura psycopg2-binary werkzeug gunicorn
-    /opt/radiologger/venv/bin/pip install --upgrade email-validator wtforms psutil
+    /opt/radiologger/venv/bin/pip install --upgrade trafilatura psycopg2-binary werkzeug gunicorn gevent psycogreen
+    /opt/radiologger/venv/bin/pip install --upgrade email-validator wtforms psutil numpy
 fi
 
-# Zorg ervoor dat gunicorn ook up-to-date is
-/opt/radiologger/venv/bin/pip install --upgrade gunicorn
+# Zorg ervoor dat gunicorn (en gevent/psycogreen voor de streaming workers) ook up-to-date is
+/opt/radiologger/venv/bin/pip install --upgrade gunicorn gevent psycogreen
 
 # Zorg ervoor dat de boto3 AWS SDK up-to-date is voor Wasabi S3 connectiviteit
 /opt/radiologger/venv/bin/pip install --upgrade boto3
@@ -169,6 +169,12 @@ chown -R radiologger:radiologger /var/lib/radiologger
 
 # Herstarten van diensten
 systemctl restart radiologger
+if systemctl list-unit-files | grep -q radiologger-scheduler; then
+    systemctl restart radiologger-scheduler
+fi
+if systemctl list-unit-files | grep -q radiologger-stream; then
+    systemctl restart radiologger-stream
+fi
 systemctl restart nginx
 
 # Controleer status
@@ -0,0 +1,117 @@
+"""
+Lokaal upload journaal voor de Radiologger.
+
+Houdt per lokaal bestand bij welke versie (pad, grootte, mtime) al naar S3 is
+geüpload, samen met de ETag. De uploader raadpleegt alleen dit journaal, zodat
+een normale run geen HEAD requests naar Wasabi hoeft te doen. Het journaal is
+een SQLite bestand en overleeft dus herstarts en crashes.
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+def compute_etag(path, chunk_size):
+    """Compute the ETag S3 will report for a file uploaded with the given part size"""
+    # boto3 gebruikt multipart zodra het bestand minstens één chunk groot is
+    multipart = os.path.getsize(path) >= chunk_size
+    part_hashes = []
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            part_hashes.append(hashlib.md5(chunk).digest())
+
+    if not multipart:
+        # Enkelvoudige PUT: gewone MD5
+        return (part_hashes[0] if part_hashes else hashlib.md5(b'').digest()).hex()
+
+    combined = hashlib.md5(b''.join(part_hashes)).hexdigest()
+    return f"{combined}-{len(part_hashes)}"
+
+
+class UploadJournal:
+    """Durable record of which local file versions have been uploaded"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS uploads (
+                path TEXT PRIMARY KEY,
+                s3_key TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                etag TEXT,
+                uploaded_at REAL NOT NULL
+            )
+        ''')
+
+    def is_uploaded(self, path, size, mtime):
+        """True if exactly this version of the file has already been uploaded"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT size, mtime FROM uploads WHERE path = ?', (path,)
+            ).fetchone()
+        return row is not None and row[0] == size and row[1] == mtime
+
+    def record(self, path, s3_key, size, mtime, etag=None):
+        """Mark a file version as uploaded"""
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO uploads (path, s3_key, size, mtime, etag, uploaded_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (path, s3_key, size, mtime, etag, time.time())
+            )
+
+    def get(self, path):
+        """Return the journal entry for a path as a dict, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT path, s3_key, size, mtime, etag, uploaded_at FROM uploads WHERE path = ?', (path,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('path', 's3_key', 'size', 'mtime', 'etag', 'uploaded_at'), row))
+
+    def prune(self, existing_paths):
+        """Forget entries for local files that no longer exist; returns the number removed"""
+        existing = set(existing_paths)
+        with self._lock:
+            stale = [(p,) for (p,) in self._conn.execute('SELECT path FROM uploads') if p not in existing]
+            if stale:
+                self._conn.execute('BEGIN')
+                self._conn.executemany('DELETE FROM uploads WHERE path = ?', stale)
+                self._conn.execute('COMMIT')
+        return len(stale)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_journals = {}
+_journals_lock = threading.Lock()
+
+
+def get_journal(path):
+    """Process-wide journal instance for a given file"""
+    with _journals_lock:
+        if path not in _journals:
+            _journals[path] = UploadJournal(path)
+        return _journals[path]
@@ -0,0 +1,155 @@
+"""
+Parallelle upload pipeline voor opnames naar Wasabi S3.
+
+Bestanden worden per station in een wachtrij gezet en om-en-om (round robin)
+aan een begrensde pool van workers gegeven, zodat één station met een grote
+achterstand de andere stations niet blokkeert. Grote bestanden gaan via
+multipart uploads met een instelbare chunk grootte.
+"""
+
+import os
+import time
+import logging
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from boto3.s3.transfer import TransferConfig
+from upload_journal import compute_etag
+from metrics import UPLOAD_QUEUE, UPLOADS, UPLOADED_BYTES, UPLOAD_RATE
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+class UploadJob:
+    """A single local file that should end up in S3"""
+
+    def __init__(self, station_name, date_str, hour_file, local_path, s3_key):
+        self.station_name = station_name
+        self.date_str = date_str
+        self.hour_file = hour_file
+        self.local_path = local_path
+        self.s3_key = s3_key
+        self.size = 0
+        self.mtime = None
+        self.etag = None
+        self.analysis = None  # Stilte-analyse en waveform peaks (zie silence.analyse_recording)
+        self.status = 'pending'  # pending, uploaded, skipped, failed
+        self.error = None
+
+    def __repr__(self):
+        return f'<UploadJob {self.s3_key}>'
+
+
+class UploadStats:
+    """Throughput counters for one upload run"""
+
+    def __init__(self):
+        self.uploaded = 0
+        self.skipped = 0
+        self.failed = 0
+        self.bytes = 0
+        self.started_at = time.monotonic()
+        self.finished_at = None
+
+    @property
+    def seconds(self):
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        return max(end - self.started_at, 1e-6)
+
+    @property
+    def mb_per_second(self):
+        return (self.bytes / MB) / self.seconds
+
+    def __str__(self):
+        return (f"{self.uploaded} geüpload, {self.skipped} overgeslagen, {self.failed} mislukt, "
+                f"{self.bytes / MB:.1f} MB in {self.seconds:.1f}s ({self.mb_per_second:.2f} MB/s)")
+
+
+def fair_order(jobs):
+    """Interleave jobs per station (round robin), oldest files first within a station"""
+    queues = OrderedDict()
+    for job in sorted(jobs, key=lambda j: (j.date_str, j.hour_file)):
+        queues.setdefault(job.station_name, deque()).append(job)
+
+    ordered = []
+    while queues:
+        for station_name in list(queues):
+            queue = queues[station_name]
+            ordered.append(queue.popleft())
+            if not queue:
+                del queues[station_name]
+    return ordered
+
+
+class ParallelUploader:
+    """Bounded worker pool that uploads UploadJobs with multipart transfers"""
+
+    def __init__(self, s3_client, bucket, concurrency=4, chunk_size_mb=16, part_concurrency=4, compute_etags=False):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.concurrency = max(1, int(concurrency))
+        self.compute_etags = compute_etags
+        chunk_size = max(5, int(chunk_size_mb)) * MB  # S3 minimum part size is 5 MB
+        self.chunk_size = chunk_size
+        self.transfer_config = TransferConfig(
+            multipart_threshold=chunk_size,
+            multipart_chunksize=chunk_size,
+            max_concurrency=max(1, int(part_concurrency)),
+            use_threads=True
+        )
+
+    def _upload(self, job, should_upload):
+        """Worker: upload a single job (runs in a pool thread)"""
+        try:
+            if should_upload is not None and not should_upload(self.s3_client, job):
+                job.status = 'skipped'
+                return job
+
+            if job.mtime is None:
+                stat = os.stat(job.local_path)
+                job.size, job.mtime = stat.st_size, stat.st_mtime
+            self.s3_client.upload_file(job.local_path, self.bucket, job.s3_key, Config=self.transfer_config)
+            if self.compute_etags:
+                # Bestand staat nog in de page cache, dus dit is goedkoop
+                job.etag = compute_etag(job.local_path, self.chunk_size)
+            job.status = 'uploaded'
+        except Exception as e:
+            job.status = 'failed'
+            job.error = e
+        return job
+
+    def run(self, jobs, should_upload=None, on_complete=None):
+        """Upload all jobs; on_complete(job) is called in the calling thread"""
+        stats = UploadStats()
+        ordered = fair_order(jobs)
+        if not ordered:
+            stats.finished_at = time.monotonic()
+            return stats
+
+        UPLOAD_QUEUE.set(len(ordered))
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='upload') as pool:
+            futures = [pool.submit(self._upload, job, should_upload) for job in ordered]
+            for future in as_completed(futures):
+                job = future.result()
+                UPLOAD_QUEUE.inc(-1)
+                UPLOADS.inc(1, job.status)
+                if job.status == 'uploaded':
+                    stats.uploaded += 1
+                    stats.bytes += job.size
+                    UPLOADED_BYTES.inc(job.size)
+                elif job.status == 'skipped':
+                    stats.skipped += 1
+                else:
+                    stats.failed += 1
+                    logger.error(f"Error uploading {job.local_path}: {job.error}")
+
+                if on_complete is not None:
+                    try:
+                        on_complete(job)
+                    except Exception as e:
+                        logger.error(f"Error processing upload result for {job.local_path}: {e}")
+
+        stats.finished_at = time.monotonic()
+        UPLOAD_RATE.set(stats.bytes / stats.seconds)
+        return stats
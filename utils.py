@@ -1,28 +1,17 @@
-import os
 import re
 import logging
-import subprocess
 from datetime import datetime, date, timedelta
 from app import app
+from recorder import supervisor, read_status_file
+from scheduler_lock import is_scheduler_process
 
 logger = logging.getLogger(__name__)
 
 def check_disk_space():
-    """Check available disk space"""
+    """Check available disk space (cached sample from the disk monitor)"""
+    from disk_monitor import get_disk_monitor
     try:
-        disk_free = os.statvfs(app.config['RECORDINGS_DIR']).f_bfree * os.statvfs(app.config['RECORDINGS_DIR']).f_frsize
-        disk_total = os.statvfs(app.config['RECORDINGS_DIR']).f_blocks * os.statvfs(app.config['RECORDINGS_DIR']).f_frsize
-        
-        disk_free_gb = disk_free / (1024**3)
-        disk_total_gb = disk_total / (1024**3)
-        disk_used_percent = 100 - (disk_free / disk_total * 100)
-        
-        return {
-            'free_gb': round(disk_free_gb, 2),
-            'total_gb': round(disk_total_gb, 2),
-            'used_percent': round(disk_used_percent, 2),
-            'is_low': disk_free_gb < 2
-        }
+        return get_disk_monitor().snapshot()
     except Exception as e:
         logger.error(f"Error checking disk space: {e}")
         return None
@@ -41,57 +30,19 @@ def format_filesize(size_bytes):
 def get_running_recordings():
     """Get list of currently running recordings"""
     try:
-        output = subprocess.check_output(["pgrep", "-af", "ffmpeg"]).decode('utf-8')
-        processes = []
-        
-        for line in output.splitlines():
-            if not line.strip():
-                continue
-                
-            parts = line.split(" ", 1)
-            if len(parts) < 2:
-                continue
-                
-            pid = parts[0]
-            command = parts[1]
-            
-            # Extract stream URL
-            url_match = re.search(r'-i\s+([^\s]+)', command)
-            url = url_match.group(1) if url_match else "Unknown"
-            
-            # Extract output path
-            # Zoek naar het outputpad in het ffmpeg commando
-            recordings_dir = app.config.get('RECORDINGS_DIR', 'recordings')
-            output_match = re.search(fr'({re.escape(recordings_dir)}/[^\s]+)', command)
-            output = output_match.group(1) if output_match else "Unknown"
-            
-            # Extract station name from output path
-            # Het outputpad zou er ongeveer zo uit moeten zien: recordings/stationname/date/hour.mp3
-            parts = output.split('/')
-            station = parts[1] if len(parts) > 2 else "Unknown"
-            
-            processes.append({
-                'pid': pid,
-                'station': station,
-                'url': url,
-                'output': output
-            })
-        
-        return processes
-    
-    except subprocess.CalledProcessError:
-        # No ffmpeg processes running
-        return []
+        if is_scheduler_process():
+            return supervisor.status()
+        # De recorders draaien in het scheduler proces; lees de gepubliceerde status
+        return read_status_file(app.config['RECORDER_STATUS_PATH']) or []
     except Exception as e:
         logger.error(f"Error getting running recordings: {e}")
         return []
 
 def get_ffmpeg_version():
-    """Get ffmpeg version information"""
+    """Get ffmpeg version information (probed once, again only when the binary changes)"""
+    from health import get_ffmpeg_probe
     try:
-        output = subprocess.check_output(['ffmpeg', '-version']).decode('utf-8')
-        version_match = re.search(r'ffmpeg version\s+([^\s]+)', output)
-        return version_match.group(1) if version_match else "Unknown"
+        return get_ffmpeg_probe().info()['version']
     except Exception as e:
         logger.error(f"Error getting ffmpeg version: {e}")
         return "Error"
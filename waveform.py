@@ -0,0 +1,65 @@
+"""
+Waveform peaks voor het overzicht in de player.
+
+Elke afgeronde opname wordt bij het uploaden één keer gedecodeerd, samen met
+de stilte-analyse (silence.analyse_recording): ffmpeg levert 8 kHz mono PCM
+via een pipe, in blokken verwerkt (het uur staat nooit in zijn geheel in het
+geheugen). Per 1/PEAKS_PER_SECOND seconde wordt de hoogste amplitude bewaard
+als uint8 (0-255); een uur is dan 36 KB. Dat sidecar object (<key>.peaks) tekent de player direct, zonder audio te laden.
+"""
+
+import subprocess
+
+import numpy as np
+
+PEAKS_PER_SECOND = 10
+SAMPLE_RATE = 8000
+BLOCK_SECONDS = 10
+
+
+def decode_pcm(path, ffmpeg_path, sample_rate=SAMPLE_RATE, block_seconds=BLOCK_SECONDS):
+    """Yield blocks of mono signed 16-bit samples (NumPy int16 arrays) decoded by ffmpeg"""
+    cmd = [
+        ffmpeg_path,
+        '-nostdin',
+        '-loglevel', 'error',
+        '-i', path,
+        '-ac', '1',
+        '-ar', str(sample_rate),
+        '-f', 's16le',
+        'pipe:1'
+    ]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    block_bytes = sample_rate * 2 * block_seconds
+    try:
+        while True:
+            data = process.stdout.read(block_bytes)
+            if not data:
+                break
+            yield np.frombuffer(data[:len(data) - len(data) % 2], dtype='<i2')
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+
+
+class PeakAccumulator:
+    """Collects the peak amplitude per 1/per_second second from decoded blocks"""
+
+    def __init__(self, per_second=PEAKS_PER_SECOND, sample_rate=SAMPLE_RATE):
+        self.window = sample_rate // per_second
+        self._peaks = []
+
+    def add(self, samples):
+        # Blokken zijn een veelvoud van het venster, alleen het laatste kan korter zijn
+        padded = np.zeros(-(-len(samples) // self.window) * self.window, dtype=np.int32)
+        padded[:len(samples)] = np.abs(samples.astype(np.int32))
+        self._peaks.append(padded.reshape(-1, self.window).max(axis=1))
+
+    def to_bytes(self):
+        """Peaks as uint8 bytes (0-255), or None when nothing was added"""
+        if not self._peaks:
+            return None
+        return np.minimum(np.concatenate(self._peaks) * 255 // 32767, 255).astype(np.uint8).tobytes()
+